@@ -107,6 +107,22 @@ class AbstractBatchSystem(with_metaclass(ABCMeta, object)):
         """
         raise NotImplementedError()
 
+    def issueBatchJobs(self, jobNodes):
+        """
+        Issues a batch of jobs to the batch system. The default implementation calls
+        :meth:`issueBatchJob` for each job; batch systems that can submit many jobs at once more
+        cheaply than one at a time should override it.
+
+        The leader passes the jobs in order of decreasing priority. Batch systems that queue jobs
+        should start them in that order as far as resources allow.
+
+        :param list[toil.job.JobNode] jobNodes: the jobs to issue, highest priority first
+
+        :return: the unique jobIDs of the newly issued jobs, in the same order as jobNodes
+        :rtype: list[int]
+        """
+        return [self.issueBatchJob(jobNode) for jobNode in jobNodes]
+
     @abstractmethod
     def killBatchJobs(self, jobIDs):
         """
@@ -158,6 +174,39 @@ class AbstractBatchSystem(with_metaclass(ABCMeta, object)):
         """
         raise NotImplementedError()
 
+    def getUpdatedBatchJobs(self, maxWait, maxCount=None):
+        """
+        Returns all jobs that have updated their status, up to a given count. Blocks for at most
+        maxWait seconds waiting for the first update, then collects any further updates that are
+        already available without blocking. The default implementation repeatedly calls
+        :meth:`getUpdatedBatchJob`; batch systems with a queue of updates may drain it directly.
+
+        :param float maxWait: the number of seconds to block, waiting for the first result
+
+        :param int maxCount: the maximum number of updates to return, or None for no limit
+
+        :rtype: list(tuple(str, int, float))
+        :return: A possibly empty list of (jobID, exitValue, wallTime) tuples, as returned by
+                 :meth:`getUpdatedBatchJob`.
+        """
+        updatedJobs = []
+        updatedJob = self.getUpdatedBatchJob(maxWait=maxWait)
+        while updatedJob is not None:
+            updatedJobs.append(updatedJob)
+            if maxCount is not None and len(updatedJobs) >= maxCount:
+                break
+            updatedJob = self.getUpdatedBatchJob(maxWait=0)
+        return updatedJobs
+
+    def getCounters(self):
+        """
+        Returns running totals the batch system keeps about its own work, which are included in
+        the statistics of the leader's main loop. The default implementation keeps none.
+
+        :rtype: dict[str,float]
+        """
+        return {}
+
     @abstractmethod
     def shutdown(self):
         """
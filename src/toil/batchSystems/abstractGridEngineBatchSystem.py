@@ -15,6 +15,7 @@
 from __future__ import absolute_import
 
 from builtins import str
+from collections import deque
 from datetime import datetime
 import logging
 import time
@@ -41,6 +42,16 @@ class AbstractGridEngineBatchSystem(BatchSystemLocalSupport):
 
     class Worker(with_metaclass(ABCMeta, Thread)):
 
+        # The environment variable holding the index of the task of an array job, starting at 1,
+        # or None if the batch system does not submit array jobs, see submitJobs()
+        arrayTaskVariable = None
+
+        # The most tasks to submit in a single array job
+        maxArrayTasks = 1000
+
+        # Separates the task from the batch system ID of its array job, see getBatchSystemID()
+        taskSeparator = '.'
+
         def __init__(self, newJobsQueue, updatedJobsQueue, killQueue, killedJobsQueue, boss):
             """
             Abstract worker interface class. All instances are created with five
@@ -58,7 +69,7 @@ class AbstractGridEngineBatchSystem(BatchSystemLocalSupport):
             self.updatedJobsQueue = updatedJobsQueue
             self.killQueue = killQueue
             self.killedJobsQueue = killedJobsQueue
-            self.waitingJobs = list()
+            self.waitingJobs = deque()
             self.runningJobs = set()
             self.runningJobsLock = Lock()
             self.boss = boss
@@ -83,7 +94,7 @@ class AbstractGridEngineBatchSystem(BatchSystemLocalSupport):
             if task is None:
                 return str(job)
             else:
-                return str(job) + "." + str(task)
+                return str(job) + self.taskSeparator + str(task)
 
         def forgetJob(self, jobID):
             """
@@ -96,36 +107,33 @@ class AbstractGridEngineBatchSystem(BatchSystemLocalSupport):
             del self.allocatedCpus[jobID]
             del self.batchJobIDs[jobID]
 
-        def createJobs(self, newJob):
+        def createJobs(self, newJobs):
             """
-            Create a new job with the Toil job ID. Implementation-specific; called
+            Create new jobs with the Toil job IDs. Implementation-specific; called
             by AbstractGridEngineWorker.run()
 
-            :param string newJob: Toil job ID
+            :param list newJobs: tuples of (Toil job ID, cpu, memory, command) for
+                                 jobs that have been issued since the last call
             """
-            activity = False
-            # Load new job id if present:
-            if newJob is not None:
-                self.waitingJobs.append(newJob)
-            # Launch jobs as necessary:
-            while (len(self.waitingJobs) > 0
-                   and sum(self.allocatedCpus.values()) < int(self.boss.maxCores)):
-                activity = True
-                jobID, cpu, memory, command = self.waitingJobs.pop(0)
-
-                # prepare job submission command
-                subLine = self.prepareSubmission(cpu, memory, jobID, command)
-                logger.debug("Running %r", subLine)
-
-                # submit job and get batch system ID
-                batchJobID = self.submitJob(subLine)
-                logger.debug("Submitted job %s", str(batchJobID))
-
-                # Store dict for mapping Toil job ID to batch job ID
-                # TODO: Note that this currently stores a tuple of (batch system
-                # ID, Task), but the second value is None by default and doesn't
-                # seem to be used
-                self.batchJobIDs[jobID] = (batchJobID, None)
+            # Load new jobs if present:
+            self.waitingJobs.extend(newJobs)
+            # Pick as many waiting jobs as fit into the cores available to us
+            jobsToSubmit = []
+            allocatedCpus = sum(self.allocatedCpus.values())
+            while len(self.waitingJobs) > 0 and allocatedCpus < int(self.boss.maxCores):
+                job = self.waitingJobs.popleft()
+                jobsToSubmit.append(job)
+                allocatedCpus += job[1]
+            if not jobsToSubmit:
+                return False
+
+            # submit jobs and get their batch system IDs
+            batchJobIDs = self.submitJobs(jobsToSubmit)
+            for (jobID, cpu, memory, command), batchJobID in zip(jobsToSubmit, batchJobIDs):
+                # Store dict for mapping Toil job ID to batch job ID, a tuple of
+                # (batch system ID, Task). The task is None unless the job was
+                # submitted as part of an array job.
+                self.batchJobIDs[jobID] = batchJobID
 
                 # Add to queue of running jobs
                 with self.runningJobsLock:
@@ -133,7 +141,93 @@ class AbstractGridEngineBatchSystem(BatchSystemLocalSupport):
 
                 # Add to allocated resources
                 self.allocatedCpus[jobID] = cpu
-            return activity
+            return True
+
+        def submitJobs(self, jobs):
+            """
+            Submit a batch of jobs to the batch system. If the implementation
+            sets arrayTaskVariable, jobs with the same requirements are submitted
+            together as an array job via prepareArraySubmission() and
+            submitArrayJob(). Other jobs are submitted separately via
+            prepareSubmission() and submitJob().
+
+            :param list jobs: tuples of (Toil job ID, cpu, memory, command)
+
+            :rtype: list: a (batch system job ID, task) tuple for each job, in
+                    the same order as jobs. Task is None for non-array jobs.
+            """
+            batchJobIDs = [None] * len(jobs)
+            if self.arrayTaskVariable is None:
+                groups = [[i] for i in range(len(jobs))]
+            else:
+                groups = {}
+                for i, (jobID, cpu, memory, command) in enumerate(jobs):
+                    groups.setdefault((cpu, memory), []).append(i)
+                groups = [indices[start:start + self.maxArrayTasks]
+                          for _, indices in sorted(groups.items(), key=lambda item: item[1][0])
+                          for start in range(0, len(indices), self.maxArrayTasks)]
+            for indices in groups:
+                if len(indices) == 1:
+                    jobID, cpu, memory, command = jobs[indices[0]]
+                    # prepare job submission command
+                    subLine = self.prepareSubmission(cpu, memory, jobID, command)
+                    logger.debug("Running %r", subLine)
+
+                    # submit job and get batch system ID
+                    batchJobID = self.submitJob(subLine)
+                    logger.debug("Submitted job %s", str(batchJobID))
+                    batchJobIDs[indices[0]] = (batchJobID, None)
+                else:
+                    jobID, cpu, memory, _ = jobs[indices[0]]
+                    subLine = self.prepareArraySubmission(cpu, memory, jobID, len(indices))
+                    script = self.arrayJobScript([jobs[i][3] for i in indices])
+                    logger.debug("Running %r for %i jobs", subLine, len(indices))
+                    batchJobID = self.submitArrayJob(subLine, script)
+                    logger.debug("Submitted array job %s", str(batchJobID))
+                    for task, i in enumerate(indices, 1):
+                        batchJobIDs[i] = (batchJobID, task)
+            return batchJobIDs
+
+        def arrayJobScript(self, commands):
+            """
+            Returns the shell script of an array job, which runs the command of
+            the task given by arrayTaskVariable.
+
+            :param list commands: the command of each task, starting with task 1
+            :rtype: str
+            """
+            lines = ['#!/bin/sh', 'case "$%s" in' % self.arrayTaskVariable]
+            lines.extend('%i) %s ;;' % (task, command)
+                         for task, command in enumerate(commands, 1))
+            lines.extend(['*) exit 1 ;;', 'esac'])
+            return '\n'.join(lines) + '\n'
+
+        def prepareArraySubmission(self, cpu, memory, jobID, numTasks):
+            """
+            Preparation in putting together a command line for submitting an
+            array job to the batch system (via submitArrayJob().) Must be
+            implemented if arrayTaskVariable is set.
+
+            :param: string cpu
+            :param: string memory
+            :param: string jobID  : Toil job ID of the first task
+            :param: int numTasks  : the number of tasks, numbered from 1
+
+            :rtype: list
+            """
+            raise NotImplementedError()
+
+        def submitArrayJob(self, subLine, script):
+            """
+            Submits an array job running the given script, see arrayJobScript().
+            Must be implemented if arrayTaskVariable is set.
+
+            :param: list subLine: the command line to be called
+            :param: string script: the job script
+
+            :rtype: int: batch system job ID of the array job
+            """
+            raise NotImplementedError()
 
         def killJobs(self):
             """
@@ -208,15 +302,22 @@ class AbstractGridEngineBatchSystem(BatchSystemLocalSupport):
 
             while True:
                 activity = False
-                newJob = None
-                if not self.newJobsQueue.empty():
+                # Take everything issued since the last iteration, so that a batch of
+                # jobs is submitted together rather than one job per iteration
+                newJobs = []
+                while not self.newJobsQueue.empty():
                     activity = True
                     newJob = self.newJobsQueue.get()
                     if newJob is None:
                         logger.debug('Received queue sentinel.')
-                        break
+                        return
+                    # Jobs issued with issueBatchJobs() arrive as a single list
+                    if isinstance(newJob, list):
+                        newJobs.extend(newJob)
+                    else:
+                        newJobs.append(newJob)
                 activity |= self.killJobs()
-                activity |= self.createJobs(newJob)
+                activity |= self.createJobs(newJobs)
                 activity |= self.checkOnJobs()
                 if not activity:
                     logger.debug('No activity, sleeping for %is', self.boss.sleepSeconds())
@@ -309,17 +410,39 @@ class AbstractGridEngineBatchSystem(BatchSystemLocalSupport):
         return False
 
     def issueBatchJob(self, jobNode):
-        # Avoid submitting internal jobs to the batch queue, handle locally
-        localID = self.handleLocalJob(jobNode)
-        if localID:
-            return localID
-        else:
-            self.checkResourceRequest(jobNode.memory, jobNode.cores, jobNode.disk)
-            jobID = self.getNextJobID()
-            self.currentJobs.add(jobID)
-            self.newJobsQueue.put((jobID, jobNode.cores, jobNode.memory, jobNode.command))
-            logger.debug("Issued the job command: %s with job id: %s ", jobNode.command, str(jobID))
-        return jobID
+        return self.issueBatchJobs([jobNode])[0]
+
+    def issueBatchJobs(self, jobNodes):
+        """
+        Issues the given jobs with a single insertion into the worker's queue, so that the worker
+        submits them together rather than one per iteration.
+        """
+        jobIDs = []
+        newJobs = []
+        for jobNode in jobNodes:
+            # Avoid submitting internal jobs to the batch queue, handle locally
+            localID = self.handleLocalJob(jobNode)
+            if localID:
+                jobIDs.append(localID)
+            else:
+                self.checkResourceRequest(jobNode.memory, jobNode.cores, jobNode.disk)
+                jobID = self.getNextJobID()
+                self.currentJobs.add(jobID)
+                newJobs.append(self.prepareJobTuple(jobID, jobNode))
+                logger.debug("Issued the job command: %s with job id: %s ", jobNode.command, str(jobID))
+                jobIDs.append(jobID)
+        if newJobs:
+            self.newJobsQueue.put(newJobs)
+        return jobIDs
+
+    def prepareJobTuple(self, jobID, jobNode):
+        """
+        Returns the tuple describing a newly issued job to the worker's createJobs().
+
+        :param int jobID: Toil job ID
+        :param toil.job.JobNode jobNode: the job being issued
+        """
+        return (jobID, jobNode.cores, jobNode.memory, jobNode.command)
 
     def killBatchJobs(self, jobIDs):
         """
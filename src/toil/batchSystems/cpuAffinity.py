@@ -0,0 +1,166 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Placement of jobs on specific CPUs of the local machine, keeping each job on a single NUMA node
+where possible.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+from builtins import object
+from glob import glob
+import logging
+import math
+import multiprocessing
+import os
+import re
+
+log = logging.getLogger(__name__)
+
+
+def isSupported():
+    """
+    :return: whether this platform lets processes be pinned to CPUs
+    :rtype: bool
+    """
+    return hasattr(os, 'sched_setaffinity')
+
+
+def parseCpuList(s):
+    """
+    Parses a list of CPUs in the format of the Linux kernel.
+
+    >>> sorted(parseCpuList('0-3,8,10-11\\n'))
+    [0, 1, 2, 3, 8, 10, 11]
+
+    :rtype: set[int]
+    """
+    cpus = set()
+    for part in s.strip().split(','):
+        if part:
+            first, _, last = part.partition('-')
+            cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def readNumaNodes():
+    """
+    Finds the CPUs of each NUMA node that this process may run on, from /sys or, failing that,
+    from the physical packages listed in /proc/cpuinfo.
+
+    :return: the CPUs of each NUMA node
+    :rtype: list[set[int]]
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        available = set(os.sched_getaffinity(0))
+    else:
+        available = set(range(multiprocessing.cpu_count()))
+    nodes = []
+    for path in sorted(glob('/sys/devices/system/node/node*/cpulist')):
+        with open(path) as f:
+            nodes.append(parseCpuList(f.read()) & available)
+    if not nodes:
+        packages = {}
+        try:
+            with open('/proc/cpuinfo') as f:
+                cpu = None
+                for line in f:
+                    match = re.match(r'(processor|physical id)\s*:\s*(\d+)', line)
+                    if match and match.group(1) == 'processor':
+                        cpu = int(match.group(2))
+                    elif match and cpu is not None:
+                        packages.setdefault(int(match.group(2)), set()).add(cpu)
+        except IOError:
+            pass
+        nodes = [cpus & available for _, cpus in sorted(packages.items())]
+    nodes = [cpus for cpus in nodes if cpus]
+    return nodes or [available]
+
+
+class CpuAllocator(object):
+    """
+    Hands out CPUs to jobs. Capacity is accounted for in units of a fraction of a CPU, so that
+    jobs needing less than a CPU can share one. Jobs needing a CPU or more get whole CPUs to
+    themselves, all from the NUMA node with the fewest idle CPUs that can hold the job, or from
+    several nodes if no single node can.
+    """
+    def __init__(self, numaNodes, unitsPerCpu):
+        """
+        :param list[set[int]] numaNodes: the CPUs of each NUMA node
+        :param int unitsPerCpu: the number of units that make up a CPU
+        """
+        self.numaNodes = [sorted(cpus) for cpus in numaNodes]
+        self.unitsPerCpu = unitsPerCpu
+        self.freeUnits = {cpu: unitsPerCpu for cpus in self.numaNodes for cpu in cpus}
+        self.nodeOfCpu = {cpu: node for node, cpus in enumerate(self.numaNodes) for cpu in cpus}
+
+    @property
+    def numCpus(self):
+        return len(self.freeUnits)
+
+    def fits(self, units):
+        """
+        :param int units: a job's requirement in units of a fraction of a CPU
+        :return: whether the job can be placed once every CPU is idle
+        :rtype: bool
+        """
+        return int(math.ceil(units / self.unitsPerCpu)) <= self.numCpus
+
+    def allocate(self, units):
+        """
+        Reserves CPUs for a job.
+
+        :param int units: the job's requirement in units of a fraction of a CPU
+        :return: the units taken from each CPU, or None if the job doesn't fit
+        :rtype: dict[int,int]|None
+        """
+        if units < self.unitsPerCpu:
+            # The fullest CPU the job fits on, to leave whole CPUs to larger jobs
+            candidates = [(free, cpu) for cpu, free in self.freeUnits.items() if free >= units]
+            if not candidates:
+                return None
+            cpus = [min(candidates)[1]]
+            allocation = {cpus[0]: units}
+        else:
+            numCpus = int(math.ceil(units / self.unitsPerCpu))
+            idleCpus = [[cpu for cpu in cpus if self.freeUnits[cpu] == self.unitsPerCpu]
+                        for cpus in self.numaNodes]
+            fitting = [cpus for cpus in idleCpus if len(cpus) >= numCpus]
+            if fitting:
+                cpus = min(fitting, key=len)[:numCpus]
+            else:
+                cpus = [cpu for cpus in sorted(idleCpus, key=len, reverse=True) for cpu in cpus]
+                if len(cpus) < numCpus:
+                    return None
+                cpus = cpus[:numCpus]
+            allocation = {cpu: self.unitsPerCpu for cpu in cpus}
+        for cpu, cpuUnits in allocation.items():
+            self.freeUnits[cpu] -= cpuUnits
+        return allocation
+
+    def release(self, allocation):
+        """
+        Returns the CPUs reserved by :meth:`allocate`.
+        """
+        for cpu, units in allocation.items():
+            self.freeUnits[cpu] += units
+
+    def numNumaNodes(self, allocation):
+        """
+        :return: the number of NUMA nodes the given allocation spans
+        :rtype: int
+        """
+        return len(set(self.nodeOfCpu[cpu] for cpu in allocation))
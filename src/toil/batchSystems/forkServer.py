@@ -0,0 +1,272 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A template process that has imported the worker and forks a child for every worker command it
+is sent, so that launching a worker neither starts a shell nor a Python interpreter, nor
+imports Toil.
+
+The batch system sends requests over the template's standard input and receives replies on
+its standard output. Each message is a pickle prefixed by its length. A request is a tuple of
+a request ID, the worker's argument vector, its environment and the CPUs to pin it to or None.
+The template replies with ('started', requestID, pid) once it has forked the child, and with
+('exited', pid, returnCode) once the child has exited, where the return code follows the
+conventions of subprocess.Popen.returncode. The template exits when its standard input is closed and all of
+its children have exited.
+"""
+
+from __future__ import absolute_import
+
+from builtins import object
+import errno
+import fcntl
+import logging
+import os
+import select
+import signal
+import struct
+import sys
+from threading import Event, Lock, Thread
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from toil import subprocess
+
+log = logging.getLogger(__name__)
+
+
+class ForkedProcess(object):
+    """
+    A child of the fork server, with the parts of the subprocess.Popen interface the batch
+    system uses.
+    """
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+        self._exited = Event()
+
+    def wait(self):
+        self._exited.wait()
+        return self.returncode
+
+    def _setReturnCode(self, returnCode):
+        self.returncode = returnCode
+        self._exited.set()
+
+
+class ForkServer(object):
+    """
+    The batch system's handle on the fork server. Any number of threads may launch workers
+    concurrently; only the write of each request is serialised.
+    """
+    def __init__(self):
+        self.popen = subprocess.Popen([sys.executable, '-c',
+                                       'from toil.batchSystems.forkServer import main; main()'],
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._requestLock = Lock()
+        self._nextRequestID = 0
+        # Events and processes of requests awaiting a reply, by request ID
+        self._pendingRequests = {}
+        # Running children by PID
+        self._processes = {}
+        self._dead = False
+        self._replyThread = Thread(target=self._readReplies)
+        self._replyThread.daemon = True
+        self._replyThread.start()
+
+    def spawn(self, argv, environment, cpus=None):
+        """
+        Forks a worker with the given arguments and environment.
+
+        :param list[str] argv: the argument vector of the worker, starting with _toil_worker
+        :param dict environment: the complete environment of the worker
+        :param set[int] cpus: the CPUs to pin the worker to, or None to leave it unpinned
+        :rtype: ForkedProcess
+        """
+        started = Event()
+        request = [started, None]
+        with self._requestLock:
+            if self._dead:
+                raise RuntimeError('The fork server has died')
+            requestID = self._nextRequestID
+            self._nextRequestID += 1
+            self._pendingRequests[requestID] = request
+            _send(self.popen.stdin.fileno(), (requestID, list(argv), environment, cpus))
+        started.wait()
+        if request[1] is None:
+            raise RuntimeError('The fork server has died')
+        return request[1]
+
+    def _readReplies(self):
+        fd = self.popen.stdout.fileno()
+        while True:
+            reply = _receive(fd)
+            if reply is None:
+                break
+            if reply[0] == 'started':
+                _, requestID, pid = reply
+                process = ForkedProcess(pid)
+                with self._requestLock:
+                    self._processes[pid] = process
+                    request = self._pendingRequests.pop(requestID)
+                request[1] = process
+                request[0].set()
+            else:
+                _, pid, returnCode = reply
+                with self._requestLock:
+                    process = self._processes.pop(pid)
+                process._setReturnCode(returnCode)
+        with self._requestLock:
+            self._dead = True
+            requests, self._pendingRequests = self._pendingRequests, {}
+            processes, self._processes = self._processes, {}
+        if requests or processes:
+            log.error('The fork server died with %i workers running.', len(processes))
+        for request in requests.values():
+            request[0].set()
+        for process in processes.values():
+            process._setReturnCode(1)
+
+    def shutdown(self):
+        """
+        Waits for the workers to exit and stops the fork server.
+        """
+        self.popen.stdin.close()
+        self._replyThread.join()
+        self.popen.stdout.close()
+        self.popen.wait()
+
+
+def _send(fd, message):
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    data = struct.pack('!I', len(data)) + data
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _readExactly(fd, size):
+    chunks = []
+    while size > 0:
+        chunk = os.read(fd, size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _receive(fd):
+    """
+    :return: the next message from the given file descriptor, or None at the end of the stream
+    """
+    header = _readExactly(fd, 4)
+    if header is None:
+        return None
+    data = _readExactly(fd, struct.unpack('!I', header)[0])
+    if data is None:
+        return None
+    return pickle.loads(data)
+
+
+def _returnCode(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def main():
+    # Move the requests and replies off the standard streams, so that the children can't write
+    # to the batch system
+    requests, replies = os.dup(0), os.dup(1)
+    devNull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devNull, 0)
+    os.close(devNull)
+    os.dup2(2, 1)
+
+    # This is what the children would otherwise spend most of their start-up time on
+    from toil.worker import main as workerMain
+
+    # A SIGCHLD interrupts select() by writing to the wakeup pipe
+    wakeupRead, wakeupWrite = os.pipe()
+    for fd in wakeupRead, wakeupWrite:
+        fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    signal.set_wakeup_fd(wakeupWrite)
+
+    children = set()
+    accepting = True
+    while accepting or children:
+        try:
+            readable = select.select([requests, wakeupRead] if accepting else [wakeupRead],
+                                     [], [])[0]
+        except (select.error, OSError) as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        if wakeupRead in readable:
+            try:
+                os.read(wakeupRead, 4096)
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+        while children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            children.discard(pid)
+            _send(replies, ('exited', pid, _returnCode(status)))
+        if accepting and requests in readable:
+            request = _receive(requests)
+            if request is None:
+                accepting = False
+                continue
+            requestID, argv, environment, cpus = request
+            pid = os.fork()
+            if pid == 0:
+                signal.set_wakeup_fd(-1)
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                for fd in requests, replies, wakeupRead, wakeupWrite:
+                    os.close(fd)
+                _runChild(workerMain, argv, environment, cpus)
+            children.add(pid)
+            _send(replies, ('started', requestID, pid))
+
+
+def _runChild(workerMain, argv, environment, cpus):
+    """
+    Runs the worker in a freshly forked child and exits.
+    """
+    status = 1
+    try:
+        import random
+        # Don't share the random state of the fork server with every other child
+        random.seed()
+        os.environ.clear()
+        os.environ.update(environment)
+        if cpus is not None:
+            os.sched_setaffinity(0, cpus)
+        workerMain(argv)
+        status = 0
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except:
+        import traceback
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
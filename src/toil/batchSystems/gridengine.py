@@ -41,20 +41,24 @@ class GridEngineBatchSystem(AbstractGridEngineBatchSystem):
         """
         Grid Engine-specific AbstractGridEngineWorker methods
         """
+        arrayTaskVariable = 'SGE_TASK_ID'
+
         def getRunningJobIDs(self):
             times = {}
             with self.runningJobsLock:
-                currentjobs = dict((str(self.batchJobIDs[x][0]), x) for x in self.runningJobs)
+                currentjobs = dict((self.getBatchSystemID(x), x) for x in self.runningJobs)
             process = subprocess.Popen(["qstat"], stdout=subprocess.PIPE)
             stdout, stderr = process.communicate()
 
             for currline in stdout.split('\n'):
                 items = currline.strip().split()
                 if items:
-                    if items[0] in currentjobs and items[4] == 'r':
+                    # The tasks of array jobs are listed with their task ID in the last column
+                    sgeJobID = items[0] if len(items) < 10 else items[0] + '.' + items[9]
+                    if sgeJobID in currentjobs and items[4] == 'r':
                         jobstart = " ".join(items[5:7])
                         jobstart = time.mktime(time.strptime(jobstart, "%m/%d/%Y %H:%M:%S"))
-                        times[currentjobs[items[0]]] = time.time() - jobstart
+                        times[currentjobs[sgeJobID]] = time.time() - jobstart
 
             return times
 
@@ -69,6 +73,17 @@ class GridEngineBatchSystem(AbstractGridEngineBatchSystem):
             result = int(process.stdout.readline().strip())
             return result
 
+        def prepareArraySubmission(self, cpu, memory, jobID, numTasks):
+            return self.prepareQsub(cpu, memory, jobID, numTasks=numTasks)
+
+        def submitArrayJob(self, subLine, script):
+            process = subprocess.Popen(subLine, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            stdout, _ = process.communicate(script.encode('utf-8'))
+            if process.returncode != 0:
+                raise RuntimeError("qsub failed with code %d" % process.returncode)
+            # qsub -terse prints the ID and tasks of an array job like '2954103.1-10:1'
+            return int(stdout.strip().split(b'.')[0])
+
         def getJobExitCode(self, sgeJobID):
             # the task is set as part of the job ID if using getBatchSystemID()
             job, task = (sgeJobID, None)
@@ -93,9 +108,11 @@ class GridEngineBatchSystem(AbstractGridEngineBatchSystem):
         """
         Implementation-specific helper methods
         """
-        def prepareQsub(self, cpu, mem, jobID):
-            qsubline = ['qsub', '-V', '-b', 'y', '-terse', '-j', 'y', '-cwd',
-                        '-N', 'toil_job_' + str(jobID)]
+        def prepareQsub(self, cpu, mem, jobID, numTasks=None):
+            # The job script of an array job is read from standard input
+            qsubline = ['qsub', '-V'] + (['-b', 'y'] if numTasks is None else
+                                         ['-t', '1-%d' % numTasks])
+            qsubline += ['-terse', '-j', 'y', '-cwd', '-N', 'toil_job_' + str(jobID)]
 
             if self.boss.environment:
                 qsubline.append('-v')
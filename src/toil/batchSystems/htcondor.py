@@ -36,16 +36,15 @@ class HTCondorBatchSystem(AbstractGridEngineBatchSystem):
 
         # Override the createJobs method so that we can use htcondor.Submit objects
         # and so that we can get disk allocation requests and ceil the CPU request.
-        def createJobs(self, newJob):
+        def createJobs(self, newJobs):
             activity = False
 
-            if newJob is not None:
-                self.waitingJobs.append(newJob)
+            self.waitingJobs.extend(newJobs)
 
             # Queue jobs as necessary:
             while len(self.waitingJobs) > 0:
                 activity = True
-                jobID, cpu, memory, disk, jobName, command = self.waitingJobs.pop(0)
+                jobID, cpu, memory, disk, jobName, command = self.waitingJobs.popleft()
 
                 # Prepare the htcondor.Submit object
                 submitObj = self.prepareSubmission(cpu, memory, disk, jobID, jobName, command)
@@ -279,21 +278,10 @@ class HTCondorBatchSystem(AbstractGridEngineBatchSystem):
             # Each variable should be separated by a single space
             return '"' + ' '.join(env_items) + '"'
 
-    # Override the issueBatchJob method so HTCondor can be given the disk request
-    def issueBatchJob(self, jobNode):
-        # Avoid submitting internal jobs to the batch queue, handle locally
-        localID = self.handleLocalJob(jobNode)
-        if localID:
-            return localID
-        else:
-            self.checkResourceRequest(jobNode.memory, jobNode.cores, jobNode.disk)
-            jobID = self.getNextJobID()
-            self.currentJobs.add(jobID)
-
-            # Add the jobNode.disk and jobNode.jobName to the job tuple
-            self.newJobsQueue.put((jobID, jobNode.cores, jobNode.memory, jobNode.disk, jobNode.jobName, jobNode.command))
-            logger.debug("Issued the job command: %s with job id: %s ", jobNode.command, str(jobID))
-        return jobID
+    # Override the prepareJobTuple method so HTCondor can be given the disk request
+    def prepareJobTuple(self, jobID, jobNode):
+        # Add the jobNode.disk and jobNode.jobName to the job tuple
+        return (jobID, jobNode.cores, jobNode.memory, jobNode.disk, jobNode.jobName, jobNode.command)
 
     @classmethod
     def obtainSystemConstants(cls):
@@ -47,12 +47,21 @@ class JobQueue(object):
         self.jobLock = Lock()
 
     def insertJob(self, job, jobType):
+        self.insertJobs([(job, jobType)])
+
+    def insertJobs(self, jobsAndTypes):
+        """
+        Insert several jobs while acquiring the lock only once.
+
+        :param jobsAndTypes: an iterable of (job, jobType) tuples
+        """
         with self.jobLock:
-            if jobType not in self.queues:
-                index = bisect(self.sortedTypes, jobType)
-                self.sortedTypes.insert(index, jobType)
-                self.queues[jobType] = Queue()
-            self.queues[jobType].put(job)
+            for job, jobType in jobsAndTypes:
+                if jobType not in self.queues:
+                    index = bisect(self.sortedTypes, jobType)
+                    self.sortedTypes.insert(index, jobType)
+                    self.queues[jobType] = Queue()
+                self.queues[jobType].put(job)
 
     def sorted(self):
         return list(self.sortedTypes)
@@ -173,27 +173,40 @@ class MesosBatchSystem(BatchSystemLocalSupport,
         is an int giving the number of bytes the job needs to run in and cores is the number of cpus
         needed for the job and error-file is the path of the file to place any std-err/std-out in.
         """
-        localID = self.handleLocalJob(jobNode)
-        if localID:
-            return localID
-        self.checkResourceRequest(jobNode.memory, jobNode.cores, jobNode.disk)
-        jobID = self.getNextJobID()
-        job = ToilJob(jobID=jobID,
-                      name=str(jobNode),
-                      resources=ResourceRequirement(**jobNode._requirements),
-                      command=jobNode.command,
-                      userScript=self.userScript,
-                      environment=self.environment.copy(),
-                      workerCleanupInfo=self.workerCleanupInfo)
-        jobType = job.resources
-        log.debug("Queueing the job command: %s with job id: %s ...", jobNode.command, str(jobID))
-
-        # TODO: round all elements of resources
-
-        self.taskResources[jobID] = job.resources
-        self.jobQueues.insertJob(job, jobType)
+        return self.issueBatchJobs([jobNode])[0]
+
+    def issueBatchJobs(self, jobNodes):
+        """
+        Issues the given jobs, inserting them into the job queues while holding the queue lock
+        only once.
+        """
+        jobIDs = []
+        jobsAndTypes = []
+        for jobNode in jobNodes:
+            localID = self.handleLocalJob(jobNode)
+            if localID:
+                jobIDs.append(localID)
+                continue
+            self.checkResourceRequest(jobNode.memory, jobNode.cores, jobNode.disk)
+            jobID = self.getNextJobID()
+            job = ToilJob(jobID=jobID,
+                          name=str(jobNode),
+                          resources=ResourceRequirement(**jobNode._requirements),
+                          command=jobNode.command,
+                          userScript=self.userScript,
+                          environment=self.environment.copy(),
+                          workerCleanupInfo=self.workerCleanupInfo)
+            jobType = job.resources
+            log.debug("Queueing the job command: %s with job id: %s ...", jobNode.command, str(jobID))
+
+            # TODO: round all elements of resources
+
+            self.taskResources[jobID] = job.resources
+            jobsAndTypes.append((job, jobType))
+            jobIDs.append(jobID)
+        self.jobQueues.insertJobs(jobsAndTypes)
         log.debug("... queued")
-        return jobID
+        return jobIDs
 
     def killBatchJobs(self, jobIDs):
         self.killLocalJobs(jobIDs)
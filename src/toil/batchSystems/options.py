@@ -55,6 +55,24 @@ def _singleMachineOptions(addOptionFn, config):
                 help=("A scaling factor to change the value of all submitted "
                       "tasks's submitted cores. Used in singleMachine batch "
                       "system. default=%s" % 1))
+    addOptionFn("--warmWorkers", dest="warmWorkers", default=None, action="store_true",
+                help=("Run jobs in long-lived worker processes that are reused from one job to "
+                      "the next, instead of starting a new process for every job. Used in "
+                      "singleMachine batch system. default=%s" % False))
+    addOptionFn("--warmWorkerMaxJobs", dest="warmWorkerMaxJobs", default=None,
+                help=("The number of jobs after which a warm worker process is replaced by a "
+                      "new one. default=%s" % 100))
+    addOptionFn("--warmWorkerMaxMemory", dest="warmWorkerMaxMemory", default=None,
+                help=("The peak memory usage above which a warm worker process is replaced by "
+                      "a new one after its current job, 0 for no limit. default=%s" % 0))
+    addOptionFn("--forkServer", dest="forkServer", default=None, action="store_true",
+                help=("Fork workers from a template process that has already imported Toil, "
+                      "instead of starting each one through a shell. Used in singleMachine "
+                      "batch system. default=%s" % False))
+    addOptionFn("--cpuAffinity", dest="cpuAffinity", default=None, action="store_true",
+                help=("Pin each job to as many CPUs as it requires, taken from a single NUMA node "
+                      "where possible. Used in singleMachine batch system on Linux. "
+                      "default=%s" % False))
     if config.cwl:
         addOptionFn(
             "--noLinkImports", dest="linkImports", default=True,
@@ -140,6 +158,11 @@ def setDefaultOptions(config):
 
     # single machine
     config.scale = 1
+    config.warmWorkers = False
+    config.warmWorkerMaxJobs = 100
+    config.warmWorkerMaxMemory = 0
+    config.forkServer = False
+    config.cpuAffinity = False
     config.linkImports = False
 
     # mesos
@@ -16,25 +16,27 @@ from __future__ import absolute_import
 from __future__ import division
 from future import standard_library
 standard_library.install_aliases()
-from builtins import str
-from builtins import range
 from builtins import object
 from past.utils import old_div
-from contextlib import contextmanager
 import logging
 import multiprocessing
 import os
 from toil import subprocess
 import time
 import math
+from collections import deque
 from threading import Thread
-from threading import Lock, Condition
+from threading import Lock
 
 # Python 3 compatibility imports
 from six.moves.queue import Empty, Queue
 
 import toil
-from toil.batchSystems.abstractBatchSystem import BatchSystemSupport
+from toil.batchSystems import cpuAffinity
+from toil.batchSystems.abstractBatchSystem import (BatchSystemSupport,
+                                                   InsufficientSystemResources)
+from toil.batchSystems.forkServer import ForkServer
+from toil.batchSystems.warmWorker import WarmWorker
 from toil import worker as toil_worker
 from toil.common import Toil
 
@@ -60,16 +62,35 @@ class SingleMachineBatchSystem(BatchSystemSupport):
     minCores = 0.1
     """
     The minimal fractional CPU. Tasks with a smaller core requirement will be rounded up to this
-    value. One important invariant of this class is that each worker thread represents a CPU
-    requirement of minCores, meaning that we can never run more than numCores / minCores jobs
-    concurrently.
+    value. Cores are accounted for in units of minCores, meaning that we can never run more than
+    numCores / minCores jobs concurrently.
+    """
+    maxBackfillDelay = 60
+    """
+    The number of seconds a job that doesn't fit into the free resources may wait while smaller
+    jobs issued after it are started in its place. After that, jobs issued after it wait until it
+    has been started, so that large jobs aren't starved by a stream of small ones.
     """
     physicalMemory = toil.physicalMemory()
 
     def __init__(self, config, maxCores, maxMemory, maxDisk):
+        # The CPUs of each NUMA node that jobs may be pinned to, if they are to be pinned
+        numaNodes = None
+        if config.cpuAffinity:
+            if cpuAffinity.isSupported():
+                numaNodes = cpuAffinity.readNumaNodes()
+            else:
+                log.warning('Jobs cannot be pinned to CPUs on this platform.')
         if maxCores > self.numCores:
             log.warn('Limiting maxCores to CPU count of system (%i).', self.numCores)
             maxCores = self.numCores
+        if numaNodes is not None:
+            # This process may be confined to fewer CPUs than the system has, e.g. by a cpuset
+            numCpus = sum(len(cpus) for cpus in numaNodes)
+            if maxCores > numCpus:
+                log.warn('Limiting maxCores to the number of CPUs jobs can be pinned to (%i).',
+                         numCpus)
+                maxCores = numCpus
         if maxMemory > self.physicalMemory:
             log.warn('Limiting maxMemory to physically available memory (%i).', self.physicalMemory)
             maxMemory = self.physicalMemory
@@ -85,9 +106,9 @@ class SingleMachineBatchSystem(BatchSystemSupport):
         # squeezing more tasks onto each core (scale < 1) or stretching tasks over more cores
         # (scale > 1).
         self.scale = config.scale
-        # Number of worker threads that will be started
         self.debugWorker = config.debugWorker
-        self.numWorkers = int(old_div(self.maxCores, self.minCores))
+        # The number of units of minCores available in total
+        self.numCoreFractions = int(old_div(self.maxCores, self.minCores))
         # A counter to generate job IDs and a lock to guard it
         self.jobIndex = 0
         self.jobIndexLock = Lock()
@@ -96,55 +117,75 @@ class SingleMachineBatchSystem(BatchSystemSupport):
         """
         :type: dict[str,toil.job.JobNode]
         """
-        # A queue of jobs waiting to be executed. Consumed by the workers.
-        self.inputQueue = Queue()
-        # A queue of finished jobs. Produced by the workers.
+        # A queue of finished jobs. Produced by the threads running the jobs.
         self.outputQueue = Queue()
         # A dictionary mapping IDs of currently running jobs to their Info objects
         self.runningJobs = {}
         """
         :type: dict[str,Info]
         """
-        # The list of worker threads
-        self.workerThreads = []
+        # The threads running jobs, by job ID
+        self.jobThreads = {}
         """
-        :type list[Thread]
+        :type dict[int,Thread]
         """
-        # Variables involved with non-blocking resource acquisition
-        self.acquisitionTimeout = 5
-        self.acquisitionRetryDelay = 10
-        self.aquisitionCondition = Condition()
-
-        # A pool representing available CPU in units of minCores
-        self.coreFractions = ResourcePool(self.numWorkers, 'cores', self.acquisitionTimeout)
+        # Jobs waiting for resources in the order they were issued
+        self.readyJobs = deque()
+        """
+        :type: deque[ReadyJob]
+        """
+        # The resources not used by running jobs, in units of minCores for cores and in bytes
+        # for memory and disk
+        self.freeCoreFractions = self.numCoreFractions
+        self.freeMemory = self.maxMemory
+        self.freeDisk = self.maxDisk
+        # Guards the ready jobs, the free resources and the job threads
+        self.schedulingLock = Lock()
         # A lock to work around the lack of thread-safety in Python's subprocess module
         self.popenLock = Lock()
-        # A pool representing available memory in bytes
-        self.memory = ResourcePool(self.maxMemory, 'memory', self.acquisitionTimeout)
-        # A pool representing the available space in bytes
-        self.disk = ResourcePool(self.maxDisk, 'disk', self.acquisitionTimeout)
 
-        if not self.debugWorker:
-            log.debug('Setting up the thread pool with %i workers, '
-                     'given a minimum CPU fraction of %f '
-                     'and a maximum CPU value of %i.', self.numWorkers, self.minCores, maxCores)
-            for i in range(self.numWorkers):
-                worker = Thread(target=self.worker, args=(self.inputQueue,))
-                self.workerThreads.append(worker)
-                worker.start()
-        else:
+        # Idle warm worker processes, or None if every job runs in a fresh process
+        self.idleWarmWorkers = [] if config.warmWorkers else None
+        """
+        :type: list[WarmWorker]|None
+        """
+        self.warmWorkerMaxJobs = config.warmWorkerMaxJobs
+        self.warmWorkerMaxMemory = config.warmWorkerMaxMemory
+        self.warmWorkersLock = Lock()
+
+        # The template process workers are forked from, or None if they are started by a shell
+        self.forkServer = ForkServer() if config.forkServer and not self.debugWorker else None
+        # The number of processes started for jobs and the total seconds it took to start them
+        self.jobsLaunched = 0
+        self.launchTime = 0.0
+        self.launchCountersLock = Lock()
+
+        # Hands out specific CPUs to jobs if they are to be pinned, guarded by the scheduling lock
+        self.cpuAllocator = None
+        if numaNodes is not None:
+            log.debug('Pinning jobs to the CPUs of %i NUMA nodes: %s', len(numaNodes), numaNodes)
+            self.cpuAllocator = cpuAffinity.CpuAllocator(numaNodes, int(round(1 / self.minCores)))
+        # The number of jobs pinned to CPUs and how many of them span several NUMA nodes
+        self.jobsPinned = 0
+        self.jobsPinnedAcrossNumaNodes = 0
+
+        if self.debugWorker:
             log.debug('Started in worker debug mode.')
 
-    def _runWorker(self, jobCommand, jobID, environment):
+    def _runWorker(self, jobCommand, jobID, environment, cpus=None):
         """
         Run the jobCommand using the worker and wait for it to finish.
         The worker is forked unless it is a '_toil_worker' job and
-        debugWorker is True.
+        debugWorker is True. With warm workers enabled, '_toil_worker'
+        jobs run in an idle warm worker process, which is started if
+        there is none. With the fork server enabled, other '_toil_worker'
+        jobs are forked from it rather than started through a shell. If
+        cpus is given, the job is pinned to those CPUs.
         """
         startTime = time.time()  # Time job is started
         if self.debugWorker and "_toil_worker" in jobCommand:
             # Run the worker without forking
-            jobName, jobStoreLocator, jobStoreID = jobCommand.split()[1:] # Parse command
+            jobStoreLocator, jobs, resources = toil_worker.parseArguments(jobCommand.split()) # Parse command
             jobStore = Toil.resumeJobStore(jobStoreLocator)
             # TODO: The following does not yet properly populate self.runningJobs so it is not possible to kill
             # running jobs in forkless mode - see the "None" value in place of popen
@@ -152,18 +193,54 @@ class SingleMachineBatchSystem(BatchSystemSupport):
             try:
                 self.runningJobs[jobID] = info
                 try:
-                    toil_worker.workerScript(jobStore, jobStore.config, jobName, jobStoreID, 
-                                             redirectOutputToLogFile=not self.debugWorker) # Call the worker
+                    toil_worker.runJobs(jobStore, jobStore.config, jobs,
+                                        redirectOutputToLogFile=not self.debugWorker,
+                                        resources=resources) # Call the worker
                 finally:
                     self.runningJobs.pop(jobID)
             finally:
                 if not info.killIntended:
                     self.outputQueue.put((jobID, 0, time.time() - startTime))
+        elif self.idleWarmWorkers is not None and jobCommand.startswith("_toil_worker "):
+            with self.warmWorkersLock:
+                warmWorker = self.idleWarmWorkers.pop() if self.idleWarmWorkers else None
+            if warmWorker is None:
+                with self.popenLock:
+                    warmWorker = WarmWorker(dict(os.environ, **environment),
+                                            self.warmWorkerMaxJobs, self.warmWorkerMaxMemory)
+            info = Info(time.time(), warmWorker.popen, killIntended=False)
+            # The job counts as failed if the worker can't tell how it ended
+            statusCode, reusable = 1, False
+            try:
+                self.runningJobs[jobID] = info
+                try:
+                    statusCode, reusable = warmWorker.runJob(jobCommand, environment, cpus)
+                    if statusCode != 0 and not info.killIntended:
+                        log.error("Got exit code %i (indicating failure) "
+                                  "from job %s.", statusCode, self.jobs[jobID])
+                finally:
+                    self.runningJobs.pop(jobID)
+                if reusable:
+                    with self.warmWorkersLock:
+                        self.idleWarmWorkers.append(warmWorker)
+            finally:
+                if not info.killIntended:
+                    self.outputQueue.put((jobID, statusCode, time.time() - startTime))
         else:
-            with self.popenLock:
-                popen = subprocess.Popen(jobCommand,
-                                         shell=True,
-                                         env=dict(os.environ, **environment))
+            launchStart = time.time()
+            if self.forkServer is not None and jobCommand.startswith("_toil_worker "):
+                popen = self.forkServer.spawn(jobCommand.split(),
+                                              dict(os.environ, **environment), cpus)
+            else:
+                with self.popenLock:
+                    popen = subprocess.Popen(jobCommand,
+                                             shell=True,
+                                             env=dict(os.environ, **environment),
+                                             preexec_fn=(None if cpus is None else
+                                                         lambda: os.sched_setaffinity(0, cpus)))
+            with self.launchCountersLock:
+                self.jobsLaunched += 1
+                self.launchTime += time.time() - launchStart
             info = Info(time.time(), popen, killIntended=False)
             try:
                 self.runningJobs[jobID] = info
@@ -178,79 +255,139 @@ class SingleMachineBatchSystem(BatchSystemSupport):
                 if not info.killIntended:
                     self.outputQueue.put((jobID, statusCode, time.time() - startTime))
         
-    # Note: The input queue is passed as an argument because the corresponding attribute is reset
-    # to None in shutdown()
-
-    def worker(self, inputQueue):
-        while True:
-            if self.debugWorker and inputQueue.empty():
-                return
-            args = inputQueue.get()
-            if args is None:
-                break
-            jobCommand, jobID, jobCores, jobMemory, jobDisk, environment = args
-            while True:
-                try:
-                    coreFractions = int(old_div(jobCores, self.minCores))
-                    log.debug('Acquiring %i bytes of memory from a pool of %s.', jobMemory,
-                              self.memory)
-                    with self.memory.acquisitionOf(jobMemory):
-                        log.debug('Acquiring %i fractional cores from a pool of %s to satisfy a '
-                                  'request of %f cores', coreFractions, self.coreFractions,
-                                  jobCores)
-                        with self.coreFractions.acquisitionOf(coreFractions):
-                            with self.disk.acquisitionOf(jobDisk):
-                                self._runWorker(jobCommand, jobID, environment)
-
-                except ResourcePool.AcquisitionTimeoutException as e:
-                    log.debug('Could not acquire enough (%s) to run job (%s). Requested: (%s), '
-                              'Avaliable: %s. Sleeping for 10s.', e.resource, jobID, e.requested,
-                              e.available)
-                    with self.aquisitionCondition:
-                        # Make threads sleep for the given delay, or until another job finishes.
-                        # Whichever is sooner.
-                        self.aquisitionCondition.wait(timeout=self.acquisitionRetryDelay)
-                    continue
-                else:
-                    log.debug('Finished job. self.coreFractions ~ %s and self.memory ~ %s',
-                              self.coreFractions.value, self.memory.value)
-                    with self.aquisitionCondition:
-                        # Wake up sleeping threads
-                        self.aquisitionCondition.notifyAll()
+    def _schedule(self):
+        """
+        Starts the ready jobs that fit into the free resources, in the order they were issued.
+        A job that doesn't fit doesn't hold up smaller jobs behind it, unless it has waited for
+        longer than maxBackfillDelay. Must be called with the scheduling lock held whenever jobs
+        are issued or resources are freed.
+        """
+        now = time.time()
+        waitingJobs = deque()
+        while self.readyJobs:
+            job = self.readyJobs.popleft()
+            if (job.coreFractions <= self.freeCoreFractions and job.memory <= self.freeMemory
+                    and job.disk <= self.freeDisk and self._place(job)):
+                self.freeCoreFractions -= job.coreFractions
+                self.freeMemory -= job.memory
+                self.freeDisk -= job.disk
+                thread = Thread(target=self._runJob, args=(job,))
+                self.jobThreads[job.jobID] = thread
+                thread.start()
+            else:
+                waitingJobs.append(job)
+                if now - job.issueTime > self.maxBackfillDelay or self.freeCoreFractions == 0:
+                    # Nothing behind this job may start before it does, or nothing could
                     break
+        waitingJobs.extend(self.readyJobs)
+        self.readyJobs = waitingJobs
+
+    def _place(self, job):
+        """
+        Allocates CPUs to the job if jobs are pinned.
+
+        :return: False if the job must wait for CPUs to be released
+        :rtype: bool
+        """
+        if self.cpuAllocator is not None:
+            job.cpus = self.cpuAllocator.allocate(job.coreFractions)
+            if job.cpus is None:
+                return False
+            self.jobsPinned += 1
+            numaNodes = self.cpuAllocator.numNumaNodes(job.cpus)
+            if numaNodes > 1:
+                self.jobsPinnedAcrossNumaNodes += 1
+            log.debug('Pinning job %s to CPUs %s on %i NUMA node(s).', job.jobID,
+                      sorted(job.cpus), numaNodes)
+        return True
+
+    def _runJob(self, job):
+        """
+        Runs a job whose resources have been allocated, then frees them and starts any jobs
+        that fit into them.
+        """
+        log.debug('Starting job %s with %i fractional cores, %i bytes of memory and %i bytes of '
+                  'disk.', job.jobID, job.coreFractions, job.memory, job.disk)
+        try:
+            self._runWorker(job.jobCommand, job.jobID, job.environment,
+                            None if job.cpus is None else set(job.cpus))
+        finally:
+            with self.schedulingLock:
+                del self.jobThreads[job.jobID]
+                if job.cpus is not None:
+                    self.cpuAllocator.release(job.cpus)
+                self.freeCoreFractions += job.coreFractions
+                self.freeMemory += job.memory
+                self.freeDisk += job.disk
+                self._schedule()
 
     def issueBatchJob(self, jobNode):
         """
         Adds the command and resources to a queue to be run.
         """
-        # Round cores to minCores and apply scale
-        cores = math.ceil(jobNode.cores * self.scale / self.minCores) * self.minCores
-        assert cores <= self.maxCores, ('The job {} is requesting {} cores, more than the maximum of '
-                                        '{} cores this batch system was configured with. Scale is '
-                                        'set to {}.'.format(jobNode.jobName, cores, self.maxCores, self.scale))
-        assert cores >= self.minCores
-        assert jobNode.memory <= self.maxMemory, ('The job {} is requesting {} bytes of memory, more than '
-                                          'the maximum of {} this batch system was configured '
-                                          'with.'.format(jobNode.jobName, jobNode.memory, self.maxMemory))
-
-        self.checkResourceRequest(jobNode.memory, cores, jobNode.disk)
-        log.debug("Issuing the command: %s with memory: %i, cores: %i, disk: %i" % (
-            jobNode.command, jobNode.memory, cores, jobNode.disk))
+        return self.issueBatchJobs([jobNode])[0]
+
+    def issueBatchJobs(self, jobNodes):
+        """
+        Adds the commands and resources of all given jobs to the queue to be run, allocating their
+        job IDs in one go.
+        """
+        jobs = []
+        for jobNode in jobNodes:
+            # Round cores to minCores and apply scale
+            cores = math.ceil(jobNode.cores * self.scale / self.minCores) * self.minCores
+            if (self.cpuAllocator is not None
+                    and not self.cpuAllocator.fits(int(round(cores / self.minCores)))):
+                # The job would wait for CPUs forever
+                raise InsufficientSystemResources('cores', cores, self.cpuAllocator.numCpus)
+            assert cores <= self.maxCores, ('The job {} is requesting {} cores, more than the maximum of '
+                                            '{} cores this batch system was configured with. Scale is '
+                                            'set to {}.'.format(jobNode.jobName, cores, self.maxCores, self.scale))
+            assert cores >= self.minCores
+            assert jobNode.memory <= self.maxMemory, ('The job {} is requesting {} bytes of memory, more than '
+                                              'the maximum of {} this batch system was configured '
+                                              'with.'.format(jobNode.jobName, jobNode.memory, self.maxMemory))
+
+            self.checkResourceRequest(jobNode.memory, cores, jobNode.disk)
+            log.debug("Issuing the command: %s with memory: %i, cores: %i, disk: %i" % (
+                jobNode.command, jobNode.memory, cores, jobNode.disk))
+            jobs.append((jobNode, cores))
         with self.jobIndexLock:
-            jobID = self.jobIndex
-            self.jobIndex += 1
-        self.jobs[jobID] = jobNode.command
-        self.inputQueue.put((jobNode.command, jobID, cores, jobNode.memory,
-                             jobNode.disk, self.environment.copy()))
-        if self.debugWorker:  # then run immediately, blocking for return
-            self.worker(self.inputQueue)
-        return jobID
+            firstJobID = self.jobIndex
+            self.jobIndex += len(jobs)
+        jobIDs = []
+        now = time.time()
+        for jobID, (jobNode, cores) in enumerate(jobs, firstJobID):
+            self.jobs[jobID] = jobNode.command
+            jobIDs.append(jobID)
+            if self.debugWorker:  # then run immediately, blocking for return
+                self._runWorker(jobNode.command, jobID, self.environment.copy())
+        if not self.debugWorker:
+            with self.schedulingLock:
+                for jobID, (jobNode, cores) in enumerate(jobs, firstJobID):
+                    self.readyJobs.append(ReadyJob(jobID=jobID,
+                                                   jobCommand=jobNode.command,
+                                                   coreFractions=int(round(cores / self.minCores)),
+                                                   memory=jobNode.memory,
+                                                   disk=jobNode.disk,
+                                                   environment=self.environment.copy(),
+                                                   issueTime=now))
+                self._schedule()
+        return jobIDs
 
     def killBatchJobs(self, jobIDs):
         """
         Kills jobs by ID
         """
         log.debug('Killing jobs: {}'.format(jobIDs))
+        killed = set(jobIDs)
+        with self.schedulingLock:
+            # Jobs that haven't started yet never will
+            ready = [job for job in self.readyJobs if job.jobID in killed]
+            if ready:
+                self.readyJobs = deque(job for job in self.readyJobs if job.jobID not in killed)
+                for job in ready:
+                    self.jobs.pop(job.jobID, None)
         for jobID in jobIDs:
             if jobID in self.runningJobs:
                 info = self.runningJobs[jobID]
@@ -276,18 +413,30 @@ class SingleMachineBatchSystem(BatchSystemSupport):
 
     def shutdown(self):
         """
-        Cleanly terminate worker threads. Add sentinels to inputQueue equal to maxThreads. Join
-        all worker threads.
+        Drop the jobs that haven't started yet and wait for the running jobs to finish.
         """
-        # Remove reference to inputQueue (raises exception if inputQueue is used after method call)
-        inputQueue = self.inputQueue
-        self.inputQueue = None
-        for i in range(self.numWorkers):
-            inputQueue.put(None)
-        for thread in self.workerThreads:
+        with self.schedulingLock:
+            self.readyJobs = deque()
+            # No more jobs will be started, as only running jobs free resources
+            jobThreads = list(self.jobThreads.values())
+        for thread in jobThreads:
             thread.join()
+        if self.idleWarmWorkers is not None:
+            for warmWorker in self.idleWarmWorkers:
+                warmWorker.close()
+        if self.forkServer is not None:
+            self.forkServer.shutdown()
         BatchSystemSupport.workerCleanup(self.workerCleanupInfo)
 
+    def getCounters(self):
+        with self.launchCountersLock:
+            counters = dict(jobsLaunched=self.jobsLaunched, launchTime=self.launchTime)
+        if self.cpuAllocator is not None:
+            with self.schedulingLock:
+                counters.update(jobsPinned=self.jobsPinned,
+                                jobsPinnedAcrossNumaNodes=self.jobsPinnedAcrossNumaNodes)
+        return counters
+
     def getUpdatedBatchJob(self, maxWait):
         """
         Returns a map of the run jobs and the return value of their processes.
@@ -303,7 +452,13 @@ class SingleMachineBatchSystem(BatchSystemSupport):
 
     @classmethod
     def setOptions(cls, setOption):
+        from toil.common import iC
         setOption("scale", default=1)
+        setOption("warmWorkers", default=False)
+        setOption("warmWorkerMaxJobs", int, iC(1), 100)
+        setOption("warmWorkerMaxMemory", default=0)
+        setOption("forkServer", default=False)
+        setOption("cpuAffinity", default=False)
 
 class Info(object):
     # Can't use namedtuple here since killIntended needs to be mutable
@@ -313,74 +468,18 @@ class Info(object):
         self.killIntended = killIntended
 
 
-class ResourcePool(object):
-    def __init__(self, initial_value, resourceType, timeout):
-        super(ResourcePool, self).__init__()
-        self.condition = Condition()
-        self.value = initial_value
-        self.resourceType = resourceType
-        self.timeout = timeout
-
-    def acquire(self, amount):
-        with self.condition:
-            startTime = time.time()
-            while amount > self.value:
-                if time.time() - startTime >= self.timeout:
-                    # This means the thread timed out waiting for the resource.  We exit the nested
-                    # context managers in worker to prevent blocking of a resource due to
-                    # unavailability of a nested resource request.
-                    raise self.AcquisitionTimeoutException(resource=self.resourceType,
-                                                           requested=amount, available=self.value)
-                # Allow 5 seconds to get the resource, else quit through the above if condition.
-                # This wait + timeout is the last thing in the loop such that a request that takes
-                # longer than 5s due to multiple wakes under the 5 second threshold are still
-                # honored.
-                self.condition.wait(timeout=self.timeout)
-            self.value -= amount
-            self.__validate()
-
-    def release(self, amount):
-        with self.condition:
-            self.value += amount
-            self.__validate()
-            self.condition.notifyAll()
-
-    def __validate(self):
-        assert 0 <= self.value
-
-    def __str__(self):
-        return str(self.value)
-
-    def __repr__(self):
-        return "ResourcePool(%i)" % self.value
-
-    @contextmanager
-    def acquisitionOf(self, amount):
-        self.acquire(amount)
-        try:
-            yield
-        finally:
-            self.release(amount)
-
-    class AcquisitionTimeoutException(Exception):
-        """
-        To be raised when a resource request times out.
-        """
-
-        def __init__(self, resource, requested, available):
-            """
-            Creates an instance of this exception that indicates which resource is insufficient for
-            current demands, as well as the amount requested and amount actually available.
-
-            :param str resource: string representing the resource type
-
-            :param int|float requested: the amount of the particular resource requested that resulted
-                   in this exception
-
-            :param int|float available: amount of the particular resource actually available
-            """
-            self.requested = requested
-            self.available = available
-            self.resource = resource
-
-
+class ReadyJob(object):
+    """
+    A job that has been issued but not started, with its requirements rounded to the units the
+    batch system accounts for.
+    """
+    def __init__(self, jobID, jobCommand, coreFractions, memory, disk, environment, issueTime):
+        self.jobID = jobID
+        self.jobCommand = jobCommand
+        self.coreFractions = coreFractions
+        self.memory = memory
+        self.disk = disk
+        self.environment = environment
+        self.issueTime = issueTime
+        # The units of minCores taken from each CPU the job is pinned to, if it is
+        self.cpus = None
@@ -36,11 +36,16 @@ class SlurmBatchSystem(AbstractGridEngineBatchSystem):
 
     class Worker(AbstractGridEngineBatchSystem.Worker):
 
+        arrayTaskVariable = 'SLURM_ARRAY_TASK_ID'
+
+        # squeue, sacct, scontrol and scancel refer to the tasks of array jobs like '2954103_1'
+        taskSeparator = '_'
+
         def getRunningJobIDs(self):
             # Should return a dictionary of Job IDs and number of seconds
             times = {}
             with self.runningJobsLock:
-                currentjobs = dict((str(self.batchJobIDs[x][0]), x) for x in self.runningJobs)
+                currentjobs = dict((self.getBatchSystemID(x), x) for x in self.runningJobs)
             # currentjobs is a dictionary that maps a slurm job id (string) to our own internal job id
             # squeue arguments:
             # -h for no header
@@ -78,8 +83,23 @@ class SlurmBatchSystem(AbstractGridEngineBatchSystem):
                 logger.error("sbatch command failed")
                 raise e
 
+        def prepareArraySubmission(self, cpu, memory, jobID, numTasks):
+            return self.prepareSbatch(cpu, memory, jobID) + ['--array=1-%d' % numTasks]
+
+        def submitArrayJob(self, subLine, script):
+            # sbatch reads the job script from standard input
+            process = subprocess.Popen(subLine, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT)
+            output, _ = process.communicate(script.encode('utf-8'))
+            if process.returncode != 0:
+                logger.error("sbatch command failed with code %d: %s", process.returncode, output)
+                raise subprocess.CalledProcessError(process.returncode, subLine, output)
+            result = int(output.strip().split()[-1])
+            logger.debug("sbatch submitted array job %d", result)
+            return result
+
         def getJobExitCode(self, slurmJobID):
-            logger.debug("Getting exit code for slurm job %d", int(slurmJobID))
+            logger.debug("Getting exit code for slurm job %s", slurmJobID)
             
             state, rc = self._getJobDetailsFromSacct(slurmJobID)
             
@@ -0,0 +1,170 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Long-lived worker processes that run one job after another, so that jobs don't pay for starting
+a Python interpreter, importing Toil and resuming the job store.
+
+The batch system talks to a warm worker over the worker's standard input and output. Each
+request is a pickled tuple of the arguments of the worker command, the environment and the CPUs
+to pin the job to or None. Once the job is done, the worker replies with a pickled boolean that
+is True if the worker is about to exit rather than take another job. A worker that dies while running a job sends no
+reply and its exit code is the exit code of the job.
+"""
+
+from __future__ import absolute_import
+
+from builtins import object
+import logging
+import os
+import resource
+import sys
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from toil import subprocess
+
+log = logging.getLogger(__name__)
+
+
+class WarmWorker(object):
+    """
+    The batch system's handle on a warm worker process.
+    """
+    def __init__(self, environment, maxJobs, maxMemory):
+        """
+        Starts a warm worker process.
+
+        :param dict environment: the environment to start the process in
+        :param int maxJobs: the number of jobs after which the process exits
+        :param int maxMemory: the peak resident set size in bytes above which the process exits
+               after finishing its current job, zero for no limit
+        """
+        self.popen = subprocess.Popen([sys.executable, '-c',
+                                       'from toil.batchSystems.warmWorker import main; main()',
+                                       str(maxJobs), str(maxMemory)],
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      env=environment)
+
+    def runJob(self, jobCommand, environment, cpus=None):
+        """
+        Runs a worker command in the process and waits for it to finish.
+
+        :param str jobCommand: a worker command, see :func:`toil.worker.parseArguments`
+        :param dict environment: variables to set in the process' environment for the job
+        :param set[int] cpus: the CPUs to pin the job to, or None to leave it unpinned
+        :return: the exit code of the job and whether the process can run another job
+        :rtype: tuple(int,bool)
+        """
+        try:
+            pickle.dump((jobCommand.split(), environment, cpus),
+                        self.popen.stdin, pickle.HIGHEST_PROTOCOL)
+            self.popen.stdin.flush()
+            retiring = pickle.load(self.popen.stdout)
+        except (EOFError, IOError, OSError):
+            # The process died, possibly because the job was killed
+            self.close()
+            return self.popen.returncode, False
+        except pickle.PickleError:
+            # The request couldn't be sent or the reply is garbled, so the state of the process
+            # is unknown
+            log.exception('Failed to run a job in warm worker process %i.', self.popen.pid)
+            self.close()
+            return self.popen.returncode or 1, False
+        if retiring:
+            self.close()
+            return 0, False
+        return 0, True
+
+    def close(self):
+        """
+        Asks the process to exit once it is idle and waits for it to do so.
+        """
+        for pipe in (self.popen.stdin, self.popen.stdout):
+            try:
+                pipe.close()
+            except (IOError, OSError):
+                pass
+        self.popen.wait()
+
+
+def peakMemoryUsage():
+    """
+    :return: the peak resident set size of this process in bytes
+    :rtype: int
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def main(argv=None):
+    """
+    Runs the jobs sent by the batch system until it closes standard input, the maximum number of
+    jobs has been run, the peak memory usage exceeds the limit or a job fails.
+    """
+    if argv is None:
+        argv = sys.argv
+    maxJobs, maxMemory = int(argv[1]), int(argv[2])
+
+    # Move the requests and replies off the standard streams, so that nothing but replies can
+    # be written to the batch system
+    requests = os.fdopen(os.dup(0), 'rb')
+    replies = os.fdopen(os.dup(1), 'wb')
+    devNull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devNull, 0)
+    os.close(devNull)
+    os.dup2(2, 1)
+
+    from toil.common import Toil
+    from toil.fileStore import FileStore
+    from toil.worker import parseArguments, runJobs
+
+    initialCpus = os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity') else None
+    # Jobs change the environment and the module search path, see toil.worker.workerScript,
+    # so each job starts from those of the process
+    initialEnvironment = dict(os.environ)
+    initialPath = list(sys.path)
+    jobStores = {}
+    jobsRun = 0
+    while True:
+        try:
+            argv, environment, cpus = pickle.load(requests)
+        except EOFError:
+            break
+        os.environ.clear()
+        os.environ.update(initialEnvironment)
+        os.environ.update(environment)
+        sys.path[:] = initialPath
+        if initialCpus is not None:
+            os.sched_setaffinity(0, initialCpus if cpus is None else cpus)
+        jobStoreLocator, jobs, resources = parseArguments(argv)
+        try:
+            jobStore = jobStores[jobStoreLocator]
+        except KeyError:
+            jobStore = jobStores[jobStoreLocator] = Toil.resumeJobStore(jobStoreLocator)
+        runJobs(jobStore, jobStore.config, jobs, resources=resources)
+        jobsRun += 1
+        # A failed job leaves the termination flag of the file store set, so the process is
+        # only reused after successful jobs
+        retiring = (jobsRun >= maxJobs
+                    or 0 < maxMemory < peakMemoryUsage()
+                    or FileStore._terminateEvent.isSet())
+        pickle.dump(retiring, replies, pickle.HIGHEST_PROTOCOL)
+        replies.flush()
+        if retiring:
+            break
@@ -0,0 +1,215 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from builtins import object
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from io import BytesIO
+
+from toil.fileStore import FileID
+
+logger = logging.getLogger(__name__)
+
+
+class UncacheableValue(ValueError):
+    pass
+
+
+class CallCache(object):
+    """
+    A cache of the return values of memoised jobs that is kept across workflows, see the memoise
+    parameter of :class:`toil.job.Job`.
+
+    A job's entry is keyed by a hash of the code and attributes of the job, as returned by
+    :meth:`toil.job.Job._getCallSignature`, in which each :class:`toil.fileStore.FileID` is
+    replaced by a hash of the content of the file. The return value is pickled with each FileID
+    it holds replaced by the hash of the file's content, and the file is copied into the cache.
+    On a hit, the files are copied into the job store of the current workflow and the return
+    value refers to the copies.
+
+    The cache is a directory that must be shared by the workers. Entries and files are written
+    to temporary files that are renamed into place, so that workers can share it safely.
+    """
+
+    # The size of the chunks in which files are copied
+    _bufferSize = 1024 * 1024
+
+    def __init__(self, cacheDir):
+        """
+        :param str cacheDir: the directory holding the cache, which is created if necessary
+        """
+        self.cacheDir = cacheDir
+        self.entriesDir = os.path.join(cacheDir, 'entries')
+        self.filesDir = os.path.join(cacheDir, 'files')
+        for dirPath in self.entriesDir, self.filesDir:
+            try:
+                os.makedirs(dirPath)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        # The content hashes of the files hashed by this process, by their FileIDs
+        self._contentHashes = {}
+
+    def getKey(self, job, fileStore):
+        """
+        Computes the key of the given job's entry.
+
+        :param toil.job.Job job: the job
+        :param toil.fileStore.FileStore fileStore: the file store to read the job's input files from
+        :return: the key, or None if the job's attributes can't be pickled
+        :rtype: str|None
+        """
+        def persistentID(obj):
+            if isinstance(obj, FileID):
+                return 'file:' + self._getContentHash(obj, fileStore)
+            return None
+
+        try:
+            signature = self._pickle(job._getCallSignature(), persistentID)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.debug('Not memoising job %s whose attributes cannot be pickled: %s', job, e)
+            return None
+        return hashlib.sha256(signature).hexdigest()
+
+    def load(self, key, fileStore):
+        """
+        Looks up an entry, copying the files its return value refers to into the job store.
+
+        :param str key: the key of the entry, see :meth:`getKey`
+        :param toil.fileStore.FileStore fileStore: the file store to write the files to
+        :return: whether the entry was found, and the cached return value if so
+        :rtype: tuple
+        """
+        try:
+            with open(os.path.join(self.entriesDir, key), 'rb') as f:
+                data = f.read()
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return False, None
+
+        def persistentLoad(pid):
+            if isinstance(pid, bytes):
+                pid = pid.decode('ascii')
+            contentHash = pid.split(':', 1)[1]
+            with open(os.path.join(self.filesDir, contentHash), 'rb') as readable:
+                with fileStore.writeGlobalFileStream() as (writable, fileStoreID):
+                    shutil.copyfileobj(readable, writable)
+                size = os.fstat(readable.fileno()).st_size
+            fileID = FileID(fileStoreID, size)
+            self._contentHashes[fileID] = contentHash
+            return fileID
+
+        unpickler = pickle.Unpickler(BytesIO(data))
+        unpickler.persistent_load = persistentLoad
+        return True, unpickler.load()
+
+    def store(self, key, returnValue, fileStore):
+        """
+        Stores an entry, copying the files its return value refers to into the cache.
+
+        :param str key: the key of the entry, see :meth:`getKey`
+        :param returnValue: the return value of the job
+        :param toil.fileStore.FileStore fileStore: the file store to read the files from
+        :return: whether the entry was stored. Return values holding promises are not.
+        :rtype: bool
+        """
+        # Imported here to avoid a circular import
+        from toil.job import Promise
+
+        def persistentID(obj):
+            if isinstance(obj, FileID):
+                return 'file:' + self._getContentHash(obj, fileStore, keep=True)
+            elif isinstance(obj, Promise):
+                raise UncacheableValue('The return value holds a promise')
+            return None
+
+        try:
+            data = self._pickle(returnValue, persistentID)
+        except (UncacheableValue, pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.debug('Not caching the return value of entry %s: %s', key, e)
+            return False
+        self._writeAtomically(os.path.join(self.entriesDir, key), BytesIO(data))
+        return True
+
+    def _getContentHash(self, fileID, fileStore, keep=False):
+        """
+        Hashes the content of a file in the job store.
+
+        :param bool keep: whether to copy the file into the cache, if it isn't in it yet
+        """
+        contentHash = self._contentHashes.get(fileID)
+        if contentHash is not None and (not keep or
+                                        os.path.exists(os.path.join(self.filesDir, contentHash))):
+            return contentHash
+        digest = hashlib.sha256()
+        if keep:
+            fd, tempPath = tempfile.mkstemp(dir=self.filesDir)
+            writable = os.fdopen(fd, 'wb')
+        try:
+            with fileStore.readGlobalFileStream(fileID) as readable:
+                while True:
+                    buf = readable.read(self._bufferSize)
+                    if not buf:
+                        break
+                    digest.update(buf)
+                    if keep:
+                        writable.write(buf)
+            contentHash = digest.hexdigest()
+            if keep:
+                writable.close()
+                path = os.path.join(self.filesDir, contentHash)
+                if os.path.exists(path):
+                    os.unlink(tempPath)
+                else:
+                    os.rename(tempPath, path)
+        except:
+            if keep:
+                writable.close()
+                if os.path.exists(tempPath):
+                    os.unlink(tempPath)
+            raise
+        self._contentHashes[fileID] = contentHash
+        return contentHash
+
+    @staticmethod
+    def _pickle(obj, persistentID):
+        buf = BytesIO()
+        pickler = pickle.Pickler(buf, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = persistentID
+        pickler.dump(obj)
+        return buf.getvalue()
+
+    @staticmethod
+    def _writeAtomically(path, readable):
+        fd, tempPath = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as writable:
+                shutil.copyfileobj(readable, writable)
+            os.rename(tempPath, path)
+        except:
+            os.unlink(tempPath)
+            raise
@@ -75,6 +75,7 @@ class Config(object):
         self.logLevel = getLogLevelString()
         self.workDir = None
         self.stats = False
+        self.statsSampleInterval = 0
 
         # Because the stats option needs the jobStore to persist past the end of the run,
         # the clean default value depends the specified stats option and is determined in setOptions
@@ -106,6 +107,7 @@ class Config(object):
         self.maxPreemptableServiceJobs = sys.maxsize
         self.maxServiceJobs = sys.maxsize
         self.deadlockWait = 60  # Number of seconds to wait before declaring a deadlock
+        self.deadlockCheckInterval = 10  # Number of seconds between checks for a deadlock
         self.statePollingWait = 1  # Number of seconds to wait before querying job state
 
         # Resource requirements
@@ -117,6 +119,10 @@ class Config(object):
         self.maxCores = sys.maxsize
         self.maxMemory = sys.maxsize
         self.maxDisk = sys.maxsize
+        self.rightSizeResources = False
+        self.rightSizePercentile = 95.0
+        self.rightSizeHeadroom = 1.2
+        self.resourceProfile = None
 
         # Retrying/rescuing jobs
         self.retryCount = 1
@@ -126,6 +132,13 @@ class Config(object):
         # Misc
         self.disableCaching = True
         self.disableChaining = False
+        self.maxChainedSuccessors = 0
+        self.prefetchChainedJobs = False
+        self.maxJobsPerBundle = 1
+        self.maxBundleRuntime = 60
+        self.maxInlineJobSize = 0
+        self.promiseRecords = False
+        self.callCache = None
         self.maxLogFileSize = 64000
         self.writeLogs = None
         self.writeLogsGzip = None
@@ -134,6 +147,11 @@ class Config(object):
         self.servicePollingInterval = 60
         self.useAsync = True
         self.forceDockerAppliance = False
+        self.maxUpdatedJobsPerLoop = 1000
+        self.jobGraphCacheSize = 10000
+        self.statePrefetchThreads = 8
+        self.stateSnapshotInterval = 0
+        self.jobStoreIOThreads = 8
 
         # Debug options
         self.debugWorker = False
@@ -199,6 +217,7 @@ class Config(object):
                 raise RuntimeError("The path provided to --workDir (%s) does not exist."
                                    % self.workDir)
         setOption("stats")
+        setOption("statsSampleInterval", float, fC(0.0))
         setOption("cleanWorkDir")
         setOption("clean")
         if self.stats:
@@ -218,6 +237,11 @@ class Config(object):
         setBatchOptions(self, setOption)
         setOption("disableAutoDeployment")
         setOption("scale", float, fC(0.0))
+        setOption("warmWorkers")
+        setOption("warmWorkerMaxJobs", int, iC(1))
+        setOption("warmWorkerMaxMemory", h2b, iC(0))
+        setOption("forkServer")
+        setOption("cpuAffinity")
         setOption("mesosMasterAddress")
         setOption("parasolCommand")
         setOption("parasolMaxBatches", int, iC(1))
@@ -250,6 +274,7 @@ class Config(object):
         setOption("maxServiceJobs", int)
         setOption("maxPreemptableServiceJobs", int)
         setOption("deadlockWait", int)
+        setOption("deadlockCheckInterval", int, iC(0))
         setOption("statePollingWait", int)
 
         # Resource requirements
@@ -260,6 +285,10 @@ class Config(object):
         setOption("maxCores", int, iC(1))
         setOption("maxMemory", h2b, iC(1))
         setOption("maxDisk", h2b, iC(1))
+        setOption("rightSizeResources")
+        setOption("rightSizePercentile", float, fC(0.0, 100.01))
+        setOption("rightSizeHeadroom", float, fC(1.0))
+        setOption("resourceProfile", os.path.abspath)
         setOption("defaultPreemptable")
 
         # Retrying/rescuing jobs
@@ -271,6 +300,13 @@ class Config(object):
         setOption("maxLocalJobs", int)
         setOption("disableCaching")
         setOption("disableChaining")
+        setOption("maxChainedSuccessors", int, iC(0))
+        setOption("prefetchChainedJobs")
+        setOption("maxJobsPerBundle", int, iC(1))
+        setOption("maxBundleRuntime", float, fC(0.0))
+        setOption("maxInlineJobSize", h2b, iC(0))
+        setOption("promiseRecords")
+        setOption("callCache", os.path.abspath)
         setOption("maxLogFileSize", h2b, iC(1))
         setOption("writeLogs")
         setOption("writeLogsGzip")
@@ -283,6 +319,11 @@ class Config(object):
         setOption("cseKey", checkFn=checkSse)
         setOption("servicePollingInterval", float, fC(0.0))
         setOption("forceDockerAppliance")
+        setOption("maxUpdatedJobsPerLoop", int, iC(1))
+        setOption("jobGraphCacheSize", int, iC(0))
+        setOption("statePrefetchThreads", int, iC(1))
+        setOption("stateSnapshotInterval", int, iC(0))
+        setOption("jobStoreIOThreads", int, iC(0))
 
         # Debug options
         setOption("debugWorker")
@@ -329,6 +370,11 @@ def _addOptions(addGroupFn, config):
                      "all machines running jobs.")
     addOptionFn("--stats", dest="stats", action="store_true", default=None,
                 help="Records statistics about the toil workflow to be used by 'toil stats'.")
+    addOptionFn("--statsSampleInterval", dest="statsSampleInterval", default=None,
+                help=("With --stats, the number of seconds between samples of the memory, CPU "
+                      "and local disk used by each job, which 'toil stats' compares to what the "
+                      "jobs requested. Zero disables sampling. default=%s" %
+                      config.statsSampleInterval))
     addOptionFn("--clean", dest="clean", choices=['always', 'onError', 'never', 'onSuccess'],
                 default=None,
                 help=("Determines the deletion of the jobStore upon completion of the program. "
@@ -461,6 +507,9 @@ def _addOptions(addGroupFn, config):
         addOptionFn("--deadlockWait", dest="deadlockWait", default=None,
                     help=(
                     "The minimum number of seconds to observe the cluster stuck running only the same service jobs before throwing a deadlock exception. default=%s" % config.deadlockWait))
+        addOptionFn("--deadlockCheckInterval", dest="deadlockCheckInterval", default=None,
+                    help=(
+                    "The minimum number of seconds between asking the batch system which jobs are running while checking for a deadlock of service jobs. default=%s" % config.deadlockCheckInterval))
         addOptionFn("--statePollingWait", dest="statePollingWait", default=1,
                     help=("Time, in seconds, to wait before doing a scheduler query for job state. "
                           "Return cached results if within the waiting period."))
@@ -501,6 +550,24 @@ def _addOptions(addGroupFn, config):
                 help='The maximum amount of disk space to request from the batch system at any '
                      'one time. Standard suffixes like K, Ki, M, Mi, G or Gi are supported. '
                      'Default is %s' % bytes2human(config.maxDisk, symbols='iec'))
+    addOptionFn('--rightSizeResources', dest='rightSizeResources', action='store_true',
+                default=None,
+                help='Issue jobs with the memory, cores and disk that previous jobs of the same '
+                     'name used rather than what they requested, if that is less, and double '
+                     'the memory of jobs that ran out of it on every retry. A job that ran out of '
+                     'memory while issued with less than it requested is retried without using '
+                     'up a retry. default=%s' % config.rightSizeResources)
+    addOptionFn('--rightSizePercentile', dest='rightSizePercentile', default=None,
+                metavar='FLOAT',
+                help='The percentile of the usage of previous jobs of the same name that jobs are '
+                     'sized to with --rightSizeResources. default=%s' % config.rightSizePercentile)
+    addOptionFn('--rightSizeHeadroom', dest='rightSizeHeadroom', default=None, metavar='FLOAT',
+                help='The factor by which that percentile is increased to size jobs with '
+                     '--rightSizeResources. default=%s' % config.rightSizeHeadroom)
+    addOptionFn('--resourceProfile', dest='resourceProfile', default=None,
+                help='A file in which the usage of jobs is kept across workflows for '
+                     '--rightSizeResources. It is read on startup, if it exists, and written at '
+                     'the end of the workflow. default=%s' % config.resourceProfile)
 
     #
     # Retrying/rescuing jobs
@@ -531,6 +598,43 @@ def _addOptions(addGroupFn, config):
     addOptionFn('--disableChaining', dest='disableChaining', action='store_true', default=False,
                 help="Disables chaining of jobs (chaining uses one job's resource allocation "
                 "for its successor job if possible).")
+    addOptionFn("--maxChainedSuccessors", dest="maxChainedSuccessors", default=None,
+                help=("The maximum number of successors of a job that its worker may run itself, "
+                      "one after another, when they all fit into the job's resources. Successors "
+                      "that add successors of their own are returned to the leader. Zero "
+                      "disables this. default=%s" % config.maxChainedSuccessors))
+    addOptionFn("--prefetchChainedJobs", dest="prefetchChainedJobs", action='store_true',
+                default=None,
+                help=("Load the job that would be chained after a job in the background while the "
+                      "job runs. The loaded job is discarded if the job adds successors of its "
+                      "own. default=%s" % config.prefetchChainedJobs))
+    addOptionFn("--maxJobsPerBundle", dest="maxJobsPerBundle", default=None,
+                help=("The maximum number of short jobs with the same requirements that the "
+                      "leader issues to the batch system as one job, which runs them one after "
+                      "another in a single worker. One disables bundling. default=%s" %
+                      config.maxJobsPerBundle))
+    addOptionFn("--maxBundleRuntime", dest="maxBundleRuntime", default=None,
+                help=("The maximum number of seconds a bundle of jobs is expected to run for, "
+                      "estimated from the wall times of previous jobs of the same names. Jobs "
+                      "whose names have not been seen yet are not bundled. default=%s" %
+                      config.maxBundleRuntime))
+    addOptionFn("--maxInlineJobSize", dest="maxInlineJobSize", default=None,
+                help=("Jobs whose pickle is smaller than this many bytes are stored in their "
+                      "record in the job store instead of in a file of their own, which saves "
+                      "writing and reading the file. Promised values that small are kept in "
+                      "memory for the successors a worker chains. Zero disables this. "
+                      "default=%s" % config.maxInlineJobSize))
+    addOptionFn("--promiseRecords", dest="promiseRecords", action='store_true', default=None,
+                help=("Keep all values promised by a job in one record in the job store, which "
+                      "is written once when the job has run, instead of in a file per promise. "
+                      "A job reads the records of all the values promised to it at once. "
+                      "default=%s" % config.promiseRecords))
+    addOptionFn("--callCache", dest="callCache", default=None,
+                help=("A directory, shared by the workers and kept across workflows, in which "
+                      "the return values and output files of memoised jobs are cached. A "
+                      "memoised job is skipped if a job with the same code, attributes and input "
+                      "files has run before, and its promises are fulfilled from the cache. "
+                      "default=%s" % config.callCache))
     addOptionFn("--maxLogFileSize", dest="maxLogFileSize", default=None,
                 help=("The maximum size of a job log file to keep (in bytes), log files "
                       "larger than this will be truncated to the last X bytes. Setting "
@@ -571,6 +675,29 @@ def _addOptions(addGroupFn, config):
                 default=False,
                 help='Disables sanity checking the existence of the docker image specified by '
                 'TOIL_APPLIANCE_SELF, which Toil uses to provision mesos for autoscaling.')
+    addOptionFn('--maxUpdatedJobsPerLoop', dest='maxUpdatedJobsPerLoop', default=None,
+                help="The maximum number of finished jobs the leader collects from the batch "
+                     "system in a single iteration of its main loop before issuing their "
+                     "successors. default=%s" % config.maxUpdatedJobsPerLoop)
+    addOptionFn('--jobGraphCacheSize', dest='jobGraphCacheSize', default=None,
+                help="The maximum number of job graphs the leader keeps in memory to avoid "
+                     "reloading them from the job store. Set to 0 to disable the cache. "
+                     "default=%s" % config.jobGraphCacheSize)
+    addOptionFn('--statePrefetchThreads', dest='statePrefetchThreads', default=None,
+                help="The number of threads the leader uses to load jobs from the job store while "
+                     "building the state of the workflow on startup and restart. "
+                     "default=%s" % config.statePrefetchThreads)
+    addOptionFn('--stateSnapshotInterval', dest='stateSnapshotInterval', default=None,
+                help="The number of jobs the leader records in its journal of the workflow's "
+                     "state before folding the journal into a new snapshot. On restart the "
+                     "snapshot and journal are used instead of downloading every job. The journal "
+                     "is disabled by 0, e.g. 10000 enables it. default=%s"
+                     % config.stateSnapshotInterval)
+    addOptionFn('--jobStoreIOThreads', dest='jobStoreIOThreads', default=None,
+                help="The number of threads the leader uses to load and update jobs in the job "
+                     "store while it goes on scheduling. Operations on the same job are always "
+                     "done in order. Set to 0 to access the job store synchronously. "
+                     "default=%s" % config.jobStoreIOThreads)
     #
     # Debug options
     #
@@ -808,9 +935,20 @@ class Toil(object):
         try:
             self._setBatchSystemEnvVars()
             self._serialiseEnv()
-            self._cacheAllJobs()
+            # The job store need only be scanned if the leader didn't leave a usable journal. The
+            # journal doesn't know about orphaned jobs, which clean() then leaves in place, see
+            # StateJournal.
+            from toil.stateJournal import StateJournal
+            recovered = StateJournal(self._jobStore, self.config.stateSnapshotInterval).recover()
+            if recovered is None:
+                touchedJobStoreIDs = None
+                self._cacheAllJobs()
+            else:
+                self._jobCache, touchedJobStoreIDs = recovered
             self._setProvisioner()
-            rootJobGraph = self._jobStore.clean(jobCache=self._jobCache)
+            rootJobGraph = self._jobStore.clean(jobCache=self._jobCache,
+                                                jobCacheIsComplete=recovered is not None,
+                                                touchedJobStoreIDs=touchedJobStoreIDs)
             return self._runMainLoop(rootJobGraph)
         finally:
             self._shutdownBatchSystem()
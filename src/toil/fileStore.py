@@ -117,6 +117,10 @@ class FileStore(with_metaclass(ABCMeta, object)):
         self.loggingMessages = []
         self.filesToDelete = set()
         self.jobsToDelete = set()
+        # The number of bytes of the files read from and written to the job store by
+        # readGlobalFile and writeGlobalFile. Streams are not counted.
+        self.jobStoreBytesRead = 0
+        self.jobStoreBytesWritten = 0
 
     @staticmethod
     def createFileStore(jobStore, jobGraph, localTempDir, inputBlockFn, caching):
@@ -589,7 +593,9 @@ class CachingFileStore(FileStore):
             # Non local files are NOT cached by default, but they are tracked as local files.
             self._JobState.updateJobSpecificFiles(self, jobStoreFileID, None,
                                                   0.0, False)
-        return FileID.forPath(jobStoreFileID, absLocalFileName)
+        fileID = FileID.forPath(jobStoreFileID, absLocalFileName)
+        self.jobStoreBytesWritten += fileID.size
+        return fileID
 
     def writeGlobalFileStream(self, cleanup=False):
         # TODO: Make this work with caching
@@ -690,6 +696,8 @@ class CachingFileStore(FileStore):
                         # If the download succeded, officially add the file to cache (by
                         # recording it in the cache lock file) if possible.
                         if os.path.exists('/.'.join(os.path.split(cachedFileName))):
+                            self.jobStoreBytesRead += os.path.getsize(
+                                '/.'.join(os.path.split(cachedFileName)))
                             os.rename('/.'.join(os.path.split(cachedFileName)), cachedFileName)
                             self.addToCache(localFilePath, fileStoreID, 'read', mutable)
                             # We don't need to return the file size here because addToCache
@@ -701,6 +709,7 @@ class CachingFileStore(FileStore):
                     # Release the cache lock since the remaining stuff is not cache related.
                     flock(lockFileHandle, LOCK_UN)
                     self.jobStore.readFile(fileStoreID, localFilePath)
+                    self.jobStoreBytesRead += os.path.getsize(localFilePath)
                     os.chmod(localFilePath, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
                     # Now that we have the file, we have 2 options. It's modifiable or not.
                     # Either way, we need to account for FileJobStore making links instead of
@@ -1648,7 +1657,9 @@ class NonCachingFileStore(FileStore):
         cleanupID = None if not cleanup else self.jobGraph.jobStoreID
         fileStoreID = self.jobStore.writeFile(absLocalFileName, cleanupID)
         self.localFileMap[fileStoreID].append(absLocalFileName)
-        return FileID.forPath(fileStoreID, absLocalFileName)
+        fileID = FileID.forPath(fileStoreID, absLocalFileName)
+        self.jobStoreBytesWritten += fileID.size
+        return fileID
 
     def readGlobalFile(self, fileStoreID, userPath=None, cache=True, mutable=False, symlink=False):
         if userPath is not None:
@@ -1659,6 +1670,7 @@ class NonCachingFileStore(FileStore):
             localFilePath = self.getLocalTempFileName()
 
         self.jobStore.readFile(fileStoreID, localFilePath, symlink=symlink)
+        self.jobStoreBytesRead += os.path.getsize(localFilePath)
         self.localFileMap[fileStoreID].append(localFilePath)
         return localFilePath
 
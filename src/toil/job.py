@@ -24,7 +24,9 @@ from builtins import super
 import collections
 import importlib
 import inspect
+import itertools
 import logging
+import marshal
 import os
 import time
 import dill
@@ -41,12 +43,15 @@ from contextlib import contextmanager
 from io import BytesIO
 
 # Python 3 compatibility imports
-from six import iteritems, string_types
+from six import get_function_code, get_unbound_function, iteritems, string_types
+from six.moves import intern
 
 from toil.lib.expando import Expando
 from toil.lib.humanize import human2bytes
+from toil.lib.resourceSampler import ResourceSampler
 
 from toil.common import Toil, addOptions, safeUnpickleFromStream
+from toil.callCache import CallCache
 from toil.fileStore import DeferredFunction
 from toil.lib.bioio import (setLoggingFromOptions,
                             getTotalCpuTimeAndMemoryUsage,
@@ -57,6 +62,18 @@ from future.utils import with_metaclass
 logger = logging.getLogger( __name__ )
 
 
+def _intern(name):
+    """
+    Returns the canonical copy of a job or unit name, so that the many job nodes and job graphs
+    of jobs with the same name held by the leader share one string.
+    """
+    try:
+        return intern(name)
+    except TypeError:
+        # None, or a unicode string on Python 2
+        return name
+
+
 class BaseJob(object):
     """
     Inherit from this class to add job properties to an object.
@@ -64,6 +81,9 @@ class BaseJob(object):
     If the object doesn't specify explicit requirements, these properties will fall back
     to the configured defaults. If the value cannot be determined, an AttributeError is raised.
     """
+    # The attributes are stored in the slots of JobNode, or the __dict__ of Job
+    __slots__ = ()
+
     def __init__(self, requirements, unitName, displayName=None, jobName=None):
         cores = requirements.get('cores')
         memory = requirements.get('memory')
@@ -73,9 +93,9 @@ class BaseJob(object):
             assert isinstance(unitName, (str, bytes))
         if jobName:
             assert isinstance(jobName, (str, bytes))
-        self.unitName = unitName
-        self.displayName = displayName if displayName else self.__class__.__name__
-        self.jobName = jobName if jobName else self.__class__.__name__
+        self.unitName = _intern(unitName)
+        self.displayName = _intern(displayName if displayName else self.__class__.__name__)
+        self.jobName = _intern(jobName if jobName else self.__class__.__name__)
         self._cores = self._parseResource('cores', cores)
         self._memory = self._parseResource('memory', memory)
         self._disk = self._parseResource('disk', disk)
@@ -191,16 +211,29 @@ class BaseJob(object):
         return printedName
 
 
+# The names of the slots of each subclass of JobNode, see JobNode._slotNames
+_slotNamesByClass = {}
+
+
 class JobNode(BaseJob):
     """
     This object bridges the job graph, job, and batchsystem classes
+
+    The leader holds a job node or job graph for every job in the workflow, so job nodes and
+    their subclasses keep their attributes in slots rather than a __dict__. Subclasses must
+    declare __slots__ for any attributes they add.
     """
+    __slots__ = ('unitName', 'displayName', 'jobName', '_cores', '_memory', '_disk',
+                 '_preemptable', '_config', 'jobStoreID', 'predecessorNumber', 'command',
+                 'criticalPathHint')
+
     def __init__(self, requirements, jobName, unitName, jobStoreID,
-                 command, displayName=None, predecessorNumber=1):
+                 command, displayName=None, predecessorNumber=1, criticalPathHint=None):
         super().__init__(requirements=requirements, displayName=displayName, unitName=unitName, jobName=jobName)
         self.jobStoreID = jobStoreID
         self.predecessorNumber = predecessorNumber
         self.command = command
+        self.criticalPathHint = criticalPathHint
 
     def __str__(self):
         return super().__str__() + ' ' + self.jobStoreID
@@ -210,7 +243,7 @@ class JobNode(BaseJob):
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return self.__getstate__() == other.__getstate__()
         return NotImplemented
 
     def __ne__(self, other):
@@ -219,7 +252,35 @@ class JobNode(BaseJob):
         return NotImplemented
 
     def __repr__(self):
-        return '%s( **%r )' % (self.__class__.__name__, self.__dict__)
+        return '%s( **%r )' % (self.__class__.__name__, self.__getstate__())
+
+    @classmethod
+    def _slotNames(cls):
+        """
+        :return: the names of the slots of this class and its bases
+        :rtype: tuple[str]
+        """
+        try:
+            return _slotNamesByClass[cls]
+        except KeyError:
+            names = tuple(name for c in reversed(cls.__mro__)
+                          for name in c.__dict__.get('__slots__', ()))
+            _slotNamesByClass[cls] = names
+            return names
+
+    def __getstate__(self):
+        # A dict like the state of the dict-backed job nodes of earlier versions, so that job
+        # graphs pickled by either version can be loaded by the other
+        return {name: getattr(self, name) for name in self._slotNames() if hasattr(self, name)}
+
+    def __setstate__(self, state):
+        for name in self._slotNames():
+            # Attributes added since the state was pickled, like criticalPathHint, default to
+            # None. Attributes since removed are dropped.
+            setattr(self, name, state.get(name))
+        self.unitName = _intern(self.unitName)
+        self.displayName = _intern(self.displayName)
+        self.jobName = _intern(self.jobName)
 
     @classmethod
     def fromJobGraph(cls, jobGraph):
@@ -235,7 +296,8 @@ class JobNode(BaseJob):
                    jobName=jobGraph.jobName,
                    unitName=jobGraph.unitName,
                    displayName=jobGraph.displayName,
-                   predecessorNumber=jobGraph.predecessorNumber)
+                   predecessorNumber=jobGraph.predecessorNumber,
+                   criticalPathHint=jobGraph.criticalPathHint)
 
     @classmethod
     def fromJob(cls, job, command, predecessorNumber):
@@ -254,14 +316,16 @@ class JobNode(BaseJob):
                    jobName=job.jobName,
                    unitName=job.unitName,
                    displayName=job.displayName,
-                   predecessorNumber=predecessorNumber)
+                   predecessorNumber=predecessorNumber,
+                   criticalPathHint=job.criticalPathHint)
 
 class Job(BaseJob):
     """
     Class represents a unit of work in toil.
     """
     def __init__(self, memory=None, cores=None, disk=None, preemptable=None,
-                       unitName=None, checkpoint=False, displayName=None):
+                       unitName=None, checkpoint=False, displayName=None, criticalPathHint=None,
+                       memoise=False):
         """
         This method must be called by any overriding constructor.
 
@@ -273,6 +337,15 @@ class Job(BaseJob):
             exhausting all their retries, remove any successor jobs and rerun this job to restart the
             subtree. Job must be a leaf vertex in the job graph when initially defined, see
             :func:`toil.job.Job.checkNewCheckpointsAreCutVertices`.
+        :param criticalPathHint: an estimate of the number of seconds it takes to run this job
+            and all of its successors. The leader issues ready jobs with the longest estimated
+            remaining path first. If not given, the estimate is derived from the runtimes of
+            previously completed jobs of the same name.
+        :param memoise: if the workflow keeps a call cache (see the ``--callCache`` option), skip
+            running the job if a job of the same class, with the same code and the same
+            attributes and input files, has already run, and fulfil its promises from the return
+            value cached then. See :func:`toil.job.Job._getCallSignature`. Only jobs that return
+            a value and create no successors should be memoised.
         :type cores: int or string convertable by toil.lib.humanize.human2bytes to an int
         :type disk: int or string convertable by toil.lib.humanize.human2bytes to an int
         :type preemptable: bool
@@ -283,12 +356,16 @@ class Job(BaseJob):
                         'preemptable': preemptable}
         super().__init__(requirements=requirements, unitName=unitName, displayName=displayName)
         self.checkpoint = checkpoint
+        self.memoise = memoise
         self.displayName = displayName if displayName is not None else self.__class__.__name__
+        self.criticalPathHint = criticalPathHint
 
         #Private class variables
 
         #See Job.addChild
         self._children = []
+        #See Job.addChildrenFrom
+        self._lazyChildren = []
         #See Job.addFollowOn
         self._followOns = []
         #See Job.addService
@@ -307,6 +384,9 @@ class Job(BaseJob):
         # entire return value.
         self._rvs = collections.defaultdict(list)
         self._promiseJobStore = None
+        # The ID of the record holding all values promised by this job, if the job store keeps
+        # promised values in records, see registerPromise.
+        self._promiseRecordID = None
         self._fileStore = None
         self._tempDir = None
 
@@ -335,6 +415,23 @@ class Job(BaseJob):
         childJob._addPredecessor(self)
         return childJob
 
+    def addChildrenFrom(self, jobs, chunkSize=1000):
+        """
+        Adds the jobs produced by an iterable, such as a generator, as children of this job,
+        without holding them all in memory. The iterable is consumed when this job's successors
+        are serialised, chunkSize jobs at a time. Each chunk is written to the job store in a
+        batch before the next one is produced.
+
+        Each job must not have a predecessor yet, and its successors must not be connected to any
+        job outside of them. The jobs are not returned by :func:`toil.job.Job.hasChild`.
+
+        :param jobs: the iterable of child jobs
+        :param int chunkSize: the number of jobs to serialise together
+        """
+        if chunkSize < 1:
+            raise ValueError('The chunk size must be positive, not %s' % chunkSize)
+        self._lazyChildren.append((iter(jobs), chunkSize))
+
     def hasChild(self, childJob):
         """
         Check if childJob is already a child of this job.
@@ -564,9 +661,27 @@ class Job(BaseJob):
         return Promise(self, path)
 
     def registerPromise(self, path):
+        """
+        Registers a promise of the value at the given path of this job's return value.
+
+        Unless promise records are enabled, each promise gets a file of its own in the job store.
+        Otherwise all values promised by the job are kept in a single record, which is created
+        when the first promise is registered and written once when the job has run. Like the
+        files of promises, records are kept until the workflow is cleaned up, as promises can be
+        passed on to successors of jobs that are deleted before them.
+
+        :return: the arguments with which :class:`Promise` resolves the promise once unpickled
+        :rtype: tuple
+        """
         if self._promiseJobStore is None:
             raise RuntimeError('Trying to pass a promise from a promising job that is not a ' +
                                'predecessor of the job receiving the promise')
+        if self._promiseJobStore.config.promiseRecords:
+            if self._promiseRecordID is None:
+                self._promiseRecordID = self._promiseJobStore.createPromiseRecord()
+            # The record holds the value at the path for all promisees
+            self._rvs.setdefault(path, [])
+            return self._promiseJobStore.config.jobStore, self._promiseRecordID, path
         with self._promiseJobStore.writeFileStream() as (fileHandle, jobStoreFileID):
             promise = UnfulfilledPromiseSentinel(str(self), False)
             pickle.dump(promise, fileHandle, pickle.HIGHEST_PROTOCOL)
@@ -599,9 +714,11 @@ class Job(BaseJob):
             is cyclic, contains multiple roots or contains checkpoint jobs that are
             not leaf vertices when defined (see :func:`toil.job.Job.checkNewCheckpointsAreLeaves`).
         """
-        self.checkJobGraphConnected()
-        self.checkJobGraphAcylic()
-        self.checkNewCheckpointsAreLeafVertices()
+        # The roots are shared by the checks
+        roots = self.getRootJobs()
+        self.checkJobGraphConnected(roots)
+        self.checkJobGraphAcylic(roots)
+        self.checkNewCheckpointsAreLeafVertices(roots)
 
     def getRootJobs(self):
         """
@@ -611,36 +728,41 @@ class Job(BaseJob):
         :rtype : set of toil.job.Job instances
         """
         roots = set()
-        visited = set()
-        #Function to get the roots of a job
-        def getRoots(job):
-            if job not in visited:
-                visited.add(job)
-                if len(job._directPredecessors) > 0:
-                    list(map(lambda p : getRoots(p), job._directPredecessors))
-                else:
-                    roots.add(job)
-                #The following call ensures we explore all successor edges.
-                list(map(lambda c : getRoots(c), job._children +
-                    job._followOns))
-        getRoots(self)
+        visited = {self}
+        # The graph is traversed iteratively so that large graphs don't exceed the recursion limit
+        pending = [self]
+        while pending:
+            job = pending.pop()
+            if len(job._directPredecessors) == 0:
+                roots.add(job)
+            # Explore all predecessor and successor edges
+            for other in itertools.chain(job._directPredecessors, job._children, job._followOns):
+                if other not in visited:
+                    visited.add(other)
+                    pending.append(other)
         return roots
 
-    def checkJobGraphConnected(self):
+    def checkJobGraphConnected(self, roots=None):
         """
+        :param set roots: the roots of the job graph, if already known, see
+               :func:`toil.job.Job.getRootJobs`
+
         :raises toil.job.JobGraphDeadlockException: if :func:`toil.job.Job.getRootJobs` does \
         not contain exactly one root job.
 
         As execution always starts from one root job, having multiple root jobs will \
         cause a deadlock to occur.
         """
-        rootJobs = self.getRootJobs()
+        rootJobs = self.getRootJobs() if roots is None else roots
         if len(rootJobs) != 1:
             raise JobGraphDeadlockException("Graph does not contain exactly one"
                                             " root job: %s" % rootJobs)
 
-    def checkJobGraphAcylic(self):
+    def checkJobGraphAcylic(self, roots=None):
         """
+        :param set roots: the roots of the job graph, if already known, see
+               :func:`toil.job.Job.getRootJobs`
+
         :raises toil.job.JobGraphDeadlockException: if the connected component \
         of jobs containing this job contains any cycles of child/followOn dependencies \
         in the *augmented job graph* (see below). Such cycles are not allowed \
@@ -652,23 +774,68 @@ class Job(BaseJob):
         an edge an "implied" edge. The augmented job graph is a job graph including \
         all the implied edges.
 
-        For a job graph G = (V, E) the algorithm is ``O(|V|^2)``. It is ``O(|V| + |E|)`` for \
-        a graph with no follow-ons. The former follow-on case could be improved!
+        The implied edges are not enumerated, there may be ``O(|V|^2)`` of them. Instead, two
+        vertices are added for each job A: one that is reached from A and from the corresponding
+        vertex of each of A's successors, and is thereby reachable from all of A's descendants,
+        and one that is reached from that vertex of each child of A and leads to each follow-on
+        of A. A path through them is a path through implied edges, so the augmented job graph is
+        acyclic if and only if this graph is. For a job graph G = (V, E) the algorithm is
+        ``O(|V| + |E|)``.
         """
         #Get the root jobs
-        roots = self.getRootJobs()
+        if roots is None:
+            roots = self.getRootJobs()
         if len(roots) == 0:
             raise JobGraphDeadlockException("Graph contains no root jobs due to cycles")
 
-        #Get implied edges
-        extraEdges = self._getImpliedEdges(roots)
-
-        #Check for directed cycles in the augmented graph
-        visited = set()
+        # Number the jobs reachable from the roots. Vertex i is the i-th job, vertex n + i is
+        # reached from the descendants of job i and vertex 2n + i leads to its follow-ons.
+        jobs = set()
         for root in roots:
-            root._checkJobGraphAcylicDFS([], visited, extraEdges)
+            root._dfs(jobs)
+        jobs = list(jobs)
+        n = len(jobs)
+        index = {job: i for i, job in enumerate(jobs)}
+        edges = [[] for _ in range(3 * n)]
+        for i, job in enumerate(jobs):
+            successors = edges[i]
+            for successor in itertools.chain(job._children, job._followOns):
+                j = index[successor]
+                successors.append(j)
+                edges[n + j].append(n + i)
+            successors.append(n + i)
+            for child in job._children:
+                edges[n + index[child]].append(2 * n + i)
+            edges[2 * n + i].extend(index[followOn] for followOn in job._followOns)
+
+        # Check for directed cycles with an iterative depth first search, so that large graphs
+        # don't exceed the recursion limit
+        unvisited, onStack, done = 0, 1, 2
+        state = [unvisited] * (3 * n)
+        for start in range(n):
+            if state[start] != unvisited:
+                continue
+            state[start] = onStack
+            stack = [(start, iter(edges[start]))]
+            while stack:
+                vertex, successors = stack[-1]
+                for successor in successors:
+                    if state[successor] == unvisited:
+                        state[successor] = onStack
+                        stack.append((successor, iter(edges[successor])))
+                        break
+                    elif state[successor] == onStack:
+                        # Report the jobs on the cycle
+                        cycle = [v for v, _ in stack[[v for v, _ in stack].index(successor):]]
+                        cycle.append(successor)
+                        raise JobGraphDeadlockException(
+                            "A cycle of job dependencies has been detected '%s'"
+                            % [jobs[v] for v in cycle if v < n])
+                else:
+                    state[vertex] = done
+                    stack.pop()
 
-    def checkNewCheckpointsAreLeafVertices(self):
+    def checkNewCheckpointsAreLeafVertices(self, roots=None):
         """
         A checkpoint job is a job that is restarted if either it fails, or if any of \
         its successors completely fails, exhausting their retries.
@@ -679,14 +846,20 @@ class Job(BaseJob):
         run method is invoked it can then create direct successors. This restriction is made
         to simplify implementation.
 
+        :param set roots: the roots of the job graph, if already known, see
+               :func:`toil.job.Job.getRootJobs`
+
         :raises toil.job.JobGraphDeadlockException: if there exists a job being added to the graph for which \
         checkpoint=True and which is not a leaf.
         """
-        roots = self.getRootJobs() # Roots jobs of component, these are preexisting jobs in the graph
+        # Roots jobs of component, these are preexisting jobs in the graph
+        if roots is None:
+            roots = self.getRootJobs()
 
         # All jobs in the component of the job graph containing self
         jobs = set()
-        list(map(lambda x : x._dfs(jobs), roots))
+        for root in roots:
+            root._dfs(jobs)
 
         # Check for each job for which checkpoint is true that it is a cut vertex or leaf
         for y in [x for x in jobs if x.checkpoint]:
@@ -872,6 +1045,7 @@ class Job(BaseJob):
     @staticmethod
     def _isLeafVertex(job):
         return len(job._children) == 0 \
+               and len(job._lazyChildren) == 0 \
                and len(job._followOns) == 0 \
                and len(job._services) == 0
 
@@ -885,7 +1059,7 @@ class Job(BaseJob):
         return userModule.load()
 
     @classmethod
-    def _loadJob(cls, command, jobStore):
+    def _loadJob(cls, command, jobStore, pickledJob=None):
         """
         Unpickles a :class:`toil.job.Job` instance by decoding command.
 
@@ -894,10 +1068,14 @@ class Job(BaseJob):
         the Job can be successfully unpickled. \
         See :func:`toil.job.Job._serialiseFirstJob` and \
         :func:`toil.job.Job._makeJobGraphs` to see precisely how the Job is encoded \
-        in the command.
+        in the command. Small jobs are stored in the pickledJob of their job graph \
+        instead, in which case the reference is "inline", see :func:`toil.job.Job._serialiseJob`.
 
         :param string command: encoding of the job in the job store.
         :param toil.jobStores.abstractJobStore.AbstractJobStore jobStore: The job store.
+        :param bytes pickledJob: the pickle file of the job if it has already been read, see
+               :func:`toil.job.Job._readPickledJob`, or the pickledJob of the job graph. Required
+               if the job is stored in its job graph.
         :returns: The job referenced by the command.
         :rtype: toil.job.Job
         """
@@ -906,7 +1084,11 @@ class Job(BaseJob):
         userModule = ModuleDescriptor.fromCommand(commandTokens[2:])
         logger.debug('Loading user module %s.', userModule)
         userModule = cls._loadUserModule(userModule)
+        if pickledJob is not None:
+            return cls._unpickle(userModule, BytesIO(pickledJob), jobStore.config)
         pickleFile = commandTokens[1]
+        if pickleFile == "inline":
+            raise RuntimeError("Job %s is stored in its job graph, which wasn't given" % command)
         with tempfile.NamedTemporaryFile() as f:
             filename = f.name
             if pickleFile == "firstJob":
@@ -916,6 +1098,24 @@ class Job(BaseJob):
             with open(filename, 'rb') as fileHandle:
                 return cls._unpickle(userModule, fileHandle, jobStore.config)
 
+    @staticmethod
+    def _readPickledJob(jobGraph, jobStore):
+        """
+        Reads the pickle file of the job referenced by the command of the job graph, without
+        unpickling it, so that it can be read ahead of time. Any promises the job depends on are
+        only resolved once the job is unpickled by :func:`toil.job.Job._loadJob`.
+
+        :rtype: bytes
+        """
+        if jobGraph.pickledJob is not None:
+            return jobGraph.pickledJob
+        pickleFile = jobGraph.command.split()[1]
+        if pickleFile == "firstJob":
+            with jobStore.readSharedFileStream(pickleFile) as fileHandle:
+                return fileHandle.read()
+        with jobStore.readFileStream(pickleFile) as fileHandle:
+            return fileHandle.read()
+
     @classmethod
     def _unpickle(cls, userModule, fileHandle, config):
         """
@@ -940,22 +1140,28 @@ class Job(BaseJob):
                     logger.debug('Failed getting %s from module %s.', class_name, module_name)
                 raise
 
-        try:
-            unpickler = pickle.Unpickler(fileHandle)
-            # In Python 2 with cPickle we set "find_global"
-            unpickler.find_global = filter_main
-        except AttributeError:
-            # In Python 3 find_global isn't real and we are supposed to
-            # subclass unpickler and override find_class. We can't just replace
-            # it. But with cPickle in Pyhton 2 we can't subclass Unpickler.
-            
-            class FilteredUnpickler(pickle.Unpickler):
-                def find_class(self, module, name):
-                    return filter_main(module, name)
-                    
-            unpickler = FilteredUnpickler(fileHandle)
-            
-        runnable = unpickler.load()
+        def load():
+            try:
+                unpickler = pickle.Unpickler(fileHandle)
+                # In Python 2 with cPickle we set "find_global"
+                unpickler.find_global = filter_main
+            except AttributeError:
+                # In Python 3 find_global isn't real and we are supposed to
+                # subclass unpickler and override find_class. We can't just replace
+                # it. But with cPickle in Pyhton 2 we can't subclass Unpickler.
+
+                class FilteredUnpickler(pickle.Unpickler):
+                    def find_class(self, module, name):
+                        return filter_main(module, name)
+
+                unpickler = FilteredUnpickler(fileHandle)
+            return unpickler.load()
+
+        runnable = load()
+        if isinstance(runnable, PromiseRecordIDs):
+            Promise.fetchRecords(config.jobStore, runnable)
+            # The job is pickled on its own after the IDs
+            runnable = load()
         assert isinstance(runnable, BaseJob)
         runnable._config = config
         return runnable
@@ -967,6 +1173,8 @@ class Job(BaseJob):
         """
         Sets the values for promises using the return values from this job's run() function.
         """
+        # The pickled value at each path, for the record of promised values
+        record = {}
         for path, promiseFileStoreIDs in iteritems(self._rvs):
             if not path:
                 # Note that its possible for returnValues to be a promise, not an actual return
@@ -984,12 +1192,22 @@ class Job(BaseJob):
                     promisedValue = returnValues
                     for index in path:
                         promisedValue = promisedValue[index]
+            pickledValue = pickle.dumps(promisedValue, pickle.HIGHEST_PROTOCOL)
+            record[path] = pickledValue
+            if len(pickledValue) < jobStore.config.maxInlineJobSize:
+                # Successors chained in this worker resolve the promises without reading them
+                Promise.fulfilledValues.update(dict.fromkeys(promiseFileStoreIDs, pickledValue))
             for promiseFileStoreID in promiseFileStoreIDs:
                 # File may be gone if the job is a service being re-run and the accessing job is
                 # already complete.
                 if jobStore.fileExists(promiseFileStoreID):
                     with jobStore.updateFileStream(promiseFileStoreID) as fileHandle:
-                        pickle.dump(promisedValue, fileHandle, pickle.HIGHEST_PROTOCOL)
+                        fileHandle.write(pickledValue)
+        if self._promiseRecordID is not None:
+            jobStore.writePromiseRecord(self._promiseRecordID,
+                                        pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+            # Successors chained in this worker needn't read the record
+            Promise.records[self._promiseRecordID] = record
 
     # Functions associated with Job.checkJobGraphAcyclic to establish that the job graph does not
     # contain any cycles of dependencies:
@@ -998,50 +1216,16 @@ class Job(BaseJob):
         """
         Adds the job and all jobs reachable on a directed path from current node to the given set.
         """
-        if self not in visited:
-            visited.add(self)
-            for successor in self._children + self._followOns:
-                successor._dfs(visited)
-
-    def _checkJobGraphAcylicDFS(self, stack, visited, extraEdges):
-        """
-        DFS traversal to detect cycles in augmented job graph.
-        """
-        if self not in visited:
-            visited.add(self)
-            stack.append(self)
-            for successor in self._children + self._followOns + extraEdges[self]:
-                successor._checkJobGraphAcylicDFS(stack, visited, extraEdges)
-            assert stack.pop() == self
-        if self in stack:
-            stack.append(self)
-            raise JobGraphDeadlockException("A cycle of job dependencies has been detected '%s'" % stack)
-
-    @staticmethod
-    def _getImpliedEdges(roots):
-        """
-        Gets the set of implied edges. See Job.checkJobGraphAcylic
-        """
-        #Get nodes in job graph
-        nodes = set()
-        for root in roots:
-            root._dfs(nodes)
-
-        ##For each follow-on edge calculate the extra implied edges
-        #Adjacency list of implied edges, i.e. map of jobs to lists of jobs
-        #connected by an implied edge
-        extraEdges = dict([(n, []) for n in nodes])
-        for job in nodes:
-            if len(job._followOns) > 0:
-                #Get set of jobs connected by a directed path to job, starting
-                #with a child edge
-                reacheable = set()
-                for child in job._children:
-                    child._dfs(reacheable)
-                #Now add extra edges
-                for descendant in reacheable:
-                    extraEdges[descendant] += job._followOns[:]
-        return extraEdges
+        if self in visited:
+            return
+        visited.add(self)
+        pending = [self]
+        while pending:
+            job = pending.pop()
+            for successor in itertools.chain(job._children, job._followOns):
+                if successor not in visited:
+                    visited.add(successor)
+                    pending.append(successor)
 
     ####################################################
     #The following functions are used to serialise
@@ -1059,7 +1243,7 @@ class Job(BaseJob):
 
     def _makeJobGraphs(self, jobGraph, jobStore):
         """
-        Creates a jobGraph for each job in the job graph, recursively.
+        Creates a jobGraph for each job in the job graph.
         """
         jobsToJobGraphs = {self:jobGraph}
         for successors in (self._followOns, self._children):
@@ -1068,22 +1252,37 @@ class Job(BaseJob):
         return jobsToJobGraphs
 
     def _makeJobGraphs2(self, jobStore, jobsToJobGraphs):
-        #Make the jobGraph for the job, if necessary
-        if self not in jobsToJobGraphs:
-            jobGraph = self._createEmptyJobGraphForJob(jobStore, predecessorNumber=len(self._directPredecessors))
-            jobsToJobGraphs[self] = jobGraph
+        """
+        Creates a jobGraph for the job and for each of its successors that has none yet, depth
+        first. Iterative rather than recursive, so that long chains of jobs can't exhaust the
+        stack.
+        """
+        def makeJobGraph(job):
+            #Make the jobGraph for the job and return its successors still to be added
+            jobGraph = job._createEmptyJobGraphForJob(jobStore, predecessorNumber=len(job._directPredecessors))
+            jobsToJobGraphs[job] = jobGraph
             #Add followOns/children to be run after the current job.
-            for successors in (self._followOns, self._children):
-                jobs = [successor._makeJobGraphs2(jobStore, jobsToJobGraphs) for successor in successors]
-                jobGraph.stack.append(jobs)
-        else:
-            jobGraph = jobsToJobGraphs[self]
-        #The return is a tuple stored within a job.stack
-        #The tuple is jobStoreID, memory, cores, disk,
-        #The predecessorID is used to establish which predecessors have been
-        #completed before running the given Job - it is just a unique ID
-        #per predecessor
-        return JobNode.fromJobGraph(jobGraph)
+            jobNodeLists = ([], [])
+            jobGraph.stack.extend(jobNodeLists)
+            return iter([(jobNodes, successor)
+                         for jobNodes, successors in zip(jobNodeLists, (job._followOns, job._children))
+                         for successor in successors])
+
+        if self not in jobsToJobGraphs:
+            # The successors still to be added for each job on the path being created
+            pending = [makeJobGraph(self)]
+            while pending:
+                for jobNodes, successor in pending[-1]:
+                    if successor not in jobsToJobGraphs:
+                        pending.append(makeJobGraph(successor))
+                    #The node stored within a job.stack holds the jobStoreID and requirements of
+                    #the successor. The predecessorNumber is used to establish when all
+                    #predecessors have been completed before running the successor
+                    jobNodes.append(JobNode.fromJobGraph(jobsToJobGraphs[successor]))
+                    break
+                else:
+                    pending.pop()
+        return JobNode.fromJobGraph(jobsToJobGraphs[self])
 
     def getTopologicalOrderingOfJobs(self):
         """
@@ -1093,19 +1292,72 @@ class Job(BaseJob):
         """
         ordering = []
         visited = set()
-        def getRunOrder(job):
+        # Iterative rather than recursive, so that long chains of jobs can't exhaust the stack
+        pending = [self]
+        while pending:
+            job = pending.pop()
             #Do not add the job to the ordering until all its predecessors have been
             #added to the ordering
-            for p in job._directPredecessors:
-                if p not in visited:
-                    return
-            if job not in visited:
-                visited.add(job)
-                ordering.append(job)
-                list(map(getRunOrder, job._children + job._followOns))
-        getRunOrder(self)
+            if job in visited or any(p not in visited for p in job._directPredecessors):
+                continue
+            visited.add(job)
+            ordering.append(job)
+            # Visit the children before the followOns, in the order they were added
+            pending.extend(reversed(job._children + job._followOns))
         return ordering
 
+    def _serialiseLazyChildren(self, jobGraph, jobStore, rootJobGraph):
+        """
+        Serialises the children added with addChildrenFrom, chunk by chunk, adding them to the
+        children of the job's jobGraph.
+        """
+        children = jobGraph.stack[-1]
+        for jobs, chunkSize in self._lazyChildren:
+            while True:
+                chunk = list(itertools.islice(jobs, chunkSize))
+                if not chunk:
+                    break
+                # Create the jobGraphs of the chunk together, as _serialiseJobGraph does
+                with jobStore.batch():
+                    graphs = [self._makeLazyChildJobGraphs(child, jobStore) for child in chunk]
+                # Drop each child once it is serialised
+                del chunk
+                graphs.reverse()
+                while graphs:
+                    jobNode, ordering, jobsToJobGraphs = graphs.pop()
+                    Job._prepareJobsForPromiseRegistration(ordering, jobStore)
+                    for job in ordering:
+                        if job._lazyChildren:
+                            job._serialiseLazyChildren(jobsToJobGraphs[job], jobStore,
+                                                       rootJobGraph)
+                    for job in reversed(ordering):
+                        job._serialiseServices(jobStore, jobsToJobGraphs[job], rootJobGraph)
+                        job._serialiseJob(jobStore, jobsToJobGraphs, rootJobGraph)
+                    children.append(jobNode)
+        self._lazyChildren = []
+
+    def _makeLazyChildJobGraphs(self, child, jobStore):
+        """
+        Creates a jobGraph for a child added with addChildrenFrom and for each of its successors.
+
+        :return: the job node of the child, an ordering of the child and its successors as
+                 returned by getTopologicalOrderingOfJobs and their jobGraphs by job
+        :rtype: tuple
+        """
+        if len(child._directPredecessors) > 0:
+            raise JobGraphDeadlockException('Job %s added by addChildrenFrom already has a '
+                                            'predecessor' % child)
+        if child.checkpoint and not Job._isLeafVertex(child):
+            raise JobGraphDeadlockException('New checkpoint job %s is not a leaf in the job '
+                                            'graph' % child)
+        child.checkJobGraphForDeadlocks()
+        ordering = child.getTopologicalOrderingOfJobs()
+        child._addPredecessor(self)
+        jobsToJobGraphs = {}
+        jobNode = child._makeJobGraphs2(jobStore, jobsToJobGraphs)
+        assert len(ordering) == len(jobsToJobGraphs)
+        return jobNode, ordering, jobsToJobGraphs
+
     def _serialiseJob(self, jobStore, jobsToJobGraphs, rootJobGraph):
         """
         Pickle a job and its jobGraph to disk.
@@ -1119,8 +1371,25 @@ class Job(BaseJob):
         # The pickled job is "run" as the command of the job, see worker
         # for the mechanism which unpickles the job and executes the Job.run
         # method.
-        with jobStore.writeFileStream(rootJobGraph.jobStoreID) as (fileHandle, fileStoreID):
-            pickle.dump(self, fileHandle, pickle.HIGHEST_PROTOCOL)
+        jobGraph = jobsToJobGraphs[self]
+        Promise.pickledRecordIDs = set()
+        try:
+            pickledJob = pickle.dumps(self, pickle.HIGHEST_PROTOCOL)
+            recordIDs = Promise.pickledRecordIDs
+        finally:
+            Promise.pickledRecordIDs = None
+        if recordIDs:
+            # The records of the values promised to the job are fetched together before the job
+            # is unpickled, see _unpickle
+            pickledJob = pickle.dumps(PromiseRecordIDs(sorted(recordIDs)),
+                                      pickle.HIGHEST_PROTOCOL) + pickledJob
+        if len(pickledJob) < jobStore.config.maxInlineJobSize:
+            # Small jobs are stored in their job graph, which saves writing and reading a file
+            jobGraph.pickledJob = pickledJob
+            fileStoreID = "inline"
+        else:
+            with jobStore.writeFileStream(rootJobGraph.jobStoreID) as (fileHandle, fileStoreID):
+                fileHandle.write(pickledJob)
         # Note that getUserScript() may have been overridden. This is intended. If we used
         # self.userModule directly, we'd be getting a reference to job.py if the job was
         # specified as a function (as opposed to a class) since that is where FunctionWrappingJob
@@ -1128,9 +1397,9 @@ class Job(BaseJob):
         # and FunctionWrappingJob overrides getUserScript() to give us just that. Only then can
         # filter_main() in _unpickle( ) do its job of resolving any user-defined type or function.
         userScript = self.getUserScript().globalize()
-        jobsToJobGraphs[self].command = ' '.join(('_toil', fileStoreID) + userScript.toCommand())
+        jobGraph.command = ' '.join(('_toil', fileStoreID) + userScript.toCommand())
         #Update the status of the jobGraph on disk
-        jobStore.update(jobsToJobGraphs[self])
+        jobStore.update(jobGraph)
 
     def _serialiseServices(self, jobStore, jobGraph, rootJobGraph):
         """
@@ -1210,17 +1479,16 @@ class Job(BaseJob):
         ordering = self.getTopologicalOrderingOfJobs()
         assert len(ordering) == len(jobsToJobGraphs)
 
-        with jobStore.batch():
-            # Temporarily set the jobStore locators for the promise call back functions
-            for job in ordering:
-                job.prepareForPromiseRegistration(jobStore)
-                def setForServices(serviceJob):
-                    serviceJob.prepareForPromiseRegistration(jobStore)
-                    for childServiceJob in serviceJob.service._childServices:
-                        setForServices(childServiceJob)
-                for serviceJob in job._services:
-                    setForServices(serviceJob)
+        # Temporarily set the jobStore locators for the promise call back functions
+        Job._prepareJobsForPromiseRegistration(ordering, jobStore)
+
+        # Children added with addChildrenFrom are serialised in batches of their own, before the
+        # promises of their predecessors are fulfilled
+        for job in ordering:
+            if job._lazyChildren:
+                job._serialiseLazyChildren(jobsToJobGraphs[job], jobStore, jobGraph)
 
+        with jobStore.batch():
             ordering.reverse()
             assert self == ordering[-1]
             if firstJob:
@@ -1244,6 +1512,20 @@ class Job(BaseJob):
                 # Pickle any services for the job
                 self._serialiseServices(jobStore, jobGraph, jobGraph)
 
+    @staticmethod
+    def _prepareJobsForPromiseRegistration(jobs, jobStore):
+        """
+        Calls prepareForPromiseRegistration on the given jobs and their services.
+        """
+        def setForServices(serviceJob):
+            serviceJob.prepareForPromiseRegistration(jobStore)
+            for childServiceJob in serviceJob.service._childServices:
+                setForServices(childServiceJob)
+        for job in jobs:
+            job.prepareForPromiseRegistration(jobStore)
+            for serviceJob in job._services:
+                setForServices(serviceJob)
+
     def _serialiseFirstJob(self, jobStore):
         """
         Serialises the root job. Returns the wrapping job.
@@ -1274,11 +1556,14 @@ class Job(BaseJob):
         self._serialiseJobGraph(jobGraph, jobStore, returnValues, False)
         #Drop the completed command, if not dropped already
         jobGraph.command = None
+        if jobGraph.checkpoint is None:
+            # A checkpoint is restarted from its job
+            jobGraph.pickledJob = None
         #Merge any children (follow-ons) created in the initial serialisation
         #with children (follow-ons) created in the subsequent scale-up.
         assert len(jobGraph.stack) >= 4
-        combinedChildren = jobGraph.stack[-1] + jobGraph.stack[-3]
-        combinedFollowOns = jobGraph.stack[-2] + jobGraph.stack[-4]
+        combinedChildren = list(jobGraph.stack[-1]) + list(jobGraph.stack[-3])
+        combinedFollowOns = list(jobGraph.stack[-2]) + list(jobGraph.stack[-4])
         jobGraph.stack = jobGraph.stack[:-4]
         if len(combinedFollowOns) > 0:
             jobGraph.stack.append(combinedFollowOns)
@@ -1301,12 +1586,23 @@ class Job(BaseJob):
         and logging before yielding. After completion of the body, the function will finish up the
         stats and logging, and starts the async update process for the job.
         """
+        sampler = None
         if stats is not None:
             startTime = time.time()
             startClock = getTotalCpuTime()
+            sampleInterval = fileStore.jobStore.config.statsSampleInterval
+            if sampleInterval > 0:
+                # The job's own directory is only created once the file store is opened
+                sampler = ResourceSampler(sampleInterval,
+                                          lambda: fileStore.localTempDir).start()
         baseDir = os.getcwd()
 
-        yield
+        try:
+            yield
+        finally:
+            # The sampler's thread must not outlive a failed job
+            if sampler is not None:
+                sampler.stop()
 
         # If the job is not a checkpoint job, add the promise files to delete
         # to the list of jobStoreFileIDs to delete
@@ -1325,14 +1621,21 @@ class Job(BaseJob):
         # Finish up the stats
         if stats is not None:
             totalCpuTime, totalMemoryUsage = getTotalCpuTimeAndMemoryUsage()
-            stats.jobs.append(
-                Expando(
-                    time=str(time.time() - startTime),
-                    clock=str(totalCpuTime - startClock),
-                    class_name=self._jobName(),
-                    memory=str(totalMemoryUsage)
-                )
+            jobStats = Expando(
+                time=str(time.time() - startTime),
+                clock=str(totalCpuTime - startClock),
+                class_name=self._jobName(),
+                job_name=jobGraph.jobName,
+                memory=str(totalMemoryUsage),
+                requested_memory=jobGraph.memory,
+                requested_cores=jobGraph.cores,
+                requested_disk=jobGraph.disk,
+                jobstore_read=fileStore.jobStoreBytesRead,
+                jobstore_written=fileStore.jobStoreBytesWritten
             )
+            if sampler is not None:
+                jobStats.update(sampler.summary())
+            stats.jobs.append(jobStats)
 
     def _runner(self, jobGraph, jobStore, fileStore):
         """
@@ -1346,8 +1649,25 @@ class Job(BaseJob):
         """
         # Make fileStore available as an attribute during run() ...
         self._fileStore = fileStore
-        # ... but also pass it to run() as an argument for backwards compatibility.
-        returnValues = self._run(jobGraph, fileStore)
+        callCache, key = None, None
+        if self.memoise and jobStore.config.callCache is not None:
+            callCache = CallCache(jobStore.config.callCache)
+            key = callCache.getKey(self, fileStore)
+        if key is not None:
+            cached, returnValues = callCache.load(key, fileStore)
+        else:
+            cached = False
+        if cached:
+            logger.info('Skipped running job %s, its return value was cached', self)
+        else:
+            # ... but also pass it to run() as an argument for backwards compatibility.
+            returnValues = self._run(jobGraph, fileStore)
+            if key is not None:
+                if self._children or self._followOns or self._services or self._lazyChildren:
+                    logger.debug('Not caching the return value of job %s, which created '
+                                 'successors', self)
+                else:
+                    callCache.store(key, returnValues, fileStore)
         # Serialize the new jobs defined by the run method to the jobStore
         self._serialiseExistingJob(jobGraph, jobStore, returnValues)
 
@@ -1357,6 +1677,25 @@ class Job(BaseJob):
         """
         return self.displayName
 
+    # The names of the attributes set by Job itself, see _getCallSignature
+    _jobAttributeNames = None
+
+    def _getCallSignature(self):
+        """
+        Returns what the return value of a memoised job is determined by: its class, the code of
+        its run method and its attributes other than those set by Job itself. Subclasses whose
+        return value depends on more, e.g. on other methods, should override this.
+
+        :rtype: tuple
+        """
+        if Job._jobAttributeNames is None:
+            Job._jobAttributeNames = frozenset(vars(Job())) | {'_config'}
+        run = get_unbound_function(type(self).run)
+        attributes = sorted((name, value) for name, value in iteritems(vars(self))
+                            if name not in Job._jobAttributeNames)
+        return (self.userModule.name, type(self).__name__, marshal.dumps(get_function_code(run)),
+                attributes)
+
 
 class JobException(Exception):
     """
@@ -1384,9 +1723,9 @@ class FunctionWrappingJob(Job):
         :param callable userFunction: The function to wrap. It will be called with ``*args`` and
                ``**kwargs`` as arguments.
 
-        The keywords ``memory``, ``cores``, ``disk``, ``preemptable`` and ``checkpoint`` are
-        reserved keyword arguments that if specified will be used to determine the resources
-        required for the job, as :func:`toil.job.Job.__init__`. If they are keyword arguments to
+        The keywords ``memory``, ``cores``, ``disk``, ``preemptable``, ``checkpoint``,
+        ``criticalPathHint`` and ``memoise`` are reserved keyword arguments that if specified will be used to
+        determine the resources required for the job, as :func:`toil.job.Job.__init__`. If they are keyword arguments to
         the function they will be extracted from the function definition, but may be overridden
         by the user (as you would expect).
         """
@@ -1420,7 +1759,9 @@ class FunctionWrappingJob(Job):
                      disk=resolve('disk', dehumanize=True),
                      preemptable=resolve('preemptable'),
                      checkpoint=resolve('checkpoint', default=False),
-                     unitName=resolve('name', default=None))
+                     unitName=resolve('name', default=None),
+                     criticalPathHint=resolve('criticalPathHint'),
+                     memoise=resolve('memoise', default=False))
 
         self.userFunctionModule = ModuleDescriptor.forModule(userFunction.__module__).globalize()
         self.userFunctionName = str(userFunction.__name__)
@@ -1445,6 +1786,12 @@ class FunctionWrappingJob(Job):
     def _jobName(self):
         return ".".join((self.__class__.__name__,self.userFunctionModule.name,self.userFunctionName))
 
+    def _getCallSignature(self):
+        userFunction = self._getUserFunction()
+        return (self.userFunctionModule.name, type(self).__name__, self.userFunctionName,
+                marshal.dumps(get_function_code(userFunction)), self._args,
+                sorted(iteritems(self._kwargs)))
+
 
 class JobFunctionWrappingJob(FunctionWrappingJob):
     """
@@ -1594,6 +1941,8 @@ class EncapsulatedJob(Job):
 
 
 class ServiceJobNode(JobNode):
+    __slots__ = ('startJobStoreID', 'terminateJobStoreID', 'errorJobStoreID')
+
     def __init__(self, jobStoreID, memory, cores, disk, preemptable, startJobStoreID, terminateJobStoreID,
                  errorJobStoreID, unitName, jobName, command, predecessorNumber):
         requirements = dict(memory=memory, cores=cores, disk=disk, preemptable=preemptable)
@@ -1607,6 +1956,30 @@ class ServiceJobNode(JobNode):
         self.errorJobStoreID = errorJobStoreID
 
 
+class JobBundle(JobNode):
+    """
+    Jobs with the same requirements that the leader issues to the batch system as a single job,
+    which runs them one after another in one worker. The bundle has the requirements of its
+    jobs and takes its name and job store ID from the first.
+    """
+    __slots__ = ('jobNodes',)
+
+    def __init__(self, jobNodes):
+        """
+        :param list[JobNode] jobNodes: the jobs, in the order they are to run
+        """
+        firstJobNode = jobNodes[0]
+        super().__init__(requirements=firstJobNode._requirements,
+                         jobName=firstJobNode.jobName,
+                         unitName=firstJobNode.unitName,
+                         jobStoreID=firstJobNode.jobStoreID,
+                         command=None)
+        self.jobNodes = jobNodes
+
+    def __str__(self):
+        return 'bundle of %i jobs starting with %s' % (len(self.jobNodes), self.jobNodes[0])
+
+
 class ServiceJob(Job):
     """
     Job used to wrap a :class:`toil.job.Job.Service` instance.
@@ -1727,6 +2100,24 @@ class Promise(object):
     """
     A set of IDs of files containing promised values when we know we won't need them anymore
     """
+
+    fulfilledValues = {}
+    """
+    The pickled values of small promises fulfilled in the current worker, by the IDs of the files
+    containing them, so that successors chained in the worker needn't read the files
+    """
+
+    records = {}
+    """
+    The records of promised values read or written by the current worker, by their IDs. A record
+    maps the paths promised by a job to their pickled values. Records that haven't been written
+    yet are None.
+    """
+
+    pickledRecordIDs = None
+    """
+    The IDs of the records referenced by the promises pickled while a job is serialised, or None
+    """
     def __init__(self, job, path):
         """
         :param Job job: the job whose return value this promise references
@@ -1746,35 +2137,81 @@ class Promise(object):
         # The allocation of the file in the job store is intentionally lazy, we only allocate an
         # empty file in the job store if the promise is actually being pickled. This is done so
         # that we do not allocate files for promises that are never used.
-        jobStoreLocator, jobStoreFileID = self.job.registerPromise(self.path)
+        args = self.job.registerPromise(self.path)
+        if len(args) == 3 and Promise.pickledRecordIDs is not None:
+            Promise.pickledRecordIDs.add(args[1])
         # Returning a class object here causes the pickling machinery to attempt to instantiate
         # the class. We will catch that with __new__ and return an the actual return value instead.
-        return self.__class__, (jobStoreLocator, jobStoreFileID)
+        return self.__class__, args
 
     @staticmethod
     def __new__(cls, *args):
-        assert len(args) == 2
         if isinstance(args[0], Job):
+            assert len(args) == 2
             # Regular instantiation when promise is created, before it is being pickled
             return super().__new__(cls)
-        else:
+        elif len(args) == 2:
             # Attempted instantiation during unpickling, return promised value instead
             return cls._resolve(*args)
+        else:
+            return cls._resolveFromRecord(*args)
 
     @classmethod
-    def _resolve(cls, jobStoreLocator, jobStoreFileID):
+    def _getJobStore(cls, jobStoreLocator):
         # Initialize the cached job store if it was never initialized in the current process or
         # if it belongs to a different workflow that was run earlier in the current process.
         if cls._jobstore is None or cls._jobstore.config.jobStore != jobStoreLocator:
             cls._jobstore = Toil.resumeJobStore(jobStoreLocator)
+        return cls._jobstore
+
+    @classmethod
+    def fetchRecords(cls, jobStoreLocator, recordIDs):
+        """
+        Reads the given records of promised values that haven't been read yet, all at once.
+
+        :param str jobStoreLocator: the locator of the job store holding the records
+        :param list[str] recordIDs: the IDs of the records
+        """
+        recordIDs = [recordID for recordID in recordIDs if cls.records.get(recordID) is None]
+        if not recordIDs:
+            return
+        records = cls._getJobStore(jobStoreLocator).readPromiseRecords(recordIDs)
+        for recordID, record in iteritems(records):
+            cls.records[recordID] = pickle.loads(record) if record else None
+
+    @classmethod
+    def _resolveFromRecord(cls, jobStoreLocator, recordID, path):
+        if cls.records.get(recordID) is None:
+            cls.fetchRecords(jobStoreLocator, [recordID])
+        record = cls.records[recordID]
+        if record is None:
+            raise RuntimeError("This job was passed a promise that wasn't yet resolved when it "
+                               "ran. The job that fulfills this promise hasn't yet finished. "
+                               "This means that there aren't enough constraints to ensure the "
+                               "current job always runs after it.")
+        return pickle.loads(record[path])
+
+    @classmethod
+    def _resolve(cls, jobStoreLocator, jobStoreFileID):
         cls.filesToDelete.add(jobStoreFileID)
-        with cls._jobstore.readFileStream(jobStoreFileID) as fileHandle:
+        pickledValue = cls.fulfilledValues.get(jobStoreFileID)
+        if pickledValue is not None:
+            return pickle.loads(pickledValue)
+        with cls._getJobStore(jobStoreLocator).readFileStream(jobStoreFileID) as fileHandle:
             # If this doesn't work then the file containing the promise may not exist or be
             # corrupted
             value = safeUnpickleFromStream(fileHandle)
             return value
 
 
+class PromiseRecordIDs(tuple):
+    """
+    The IDs of the records of the values promised to a job, which are pickled ahead of the job so
+    that the records can be read together before the job is unpickled.
+    """
+    __slots__ = ()
+
+
 class PromisedRequirement(object):
     def __init__(self, valueOrCallable, *args):
         """
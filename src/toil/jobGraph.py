@@ -25,7 +25,15 @@ class JobGraph(JobNode):
     in the job store and held in memory by the master. The actual state of job objects in user
     scripts is persisted separately since it may be much bigger than the state managed by this
     class and should therefore only be held in memory for brief periods of time.
+
+    The levels of the stack and services of a job graph loaded from the job store are tuples,
+    which take less memory than lists. They must be replaced rather than modified in place.
     """
+    __slots__ = ('remainingRetryCount', 'filesToDelete', 'predecessorsFinished', 'stack',
+                 'logJobStoreFileID', 'services', 'terminateJobStoreID', 'startJobStoreID',
+                 'errorJobStoreID', 'checkpoint', 'checkpointFilesToDelete', 'chainedJobs',
+                 'pickledJob')
+
     def __init__(self, command, memory, cores, disk, unitName, jobName, preemptable,
                  jobStoreID,
                  remainingRetryCount,
@@ -40,14 +48,17 @@ class JobGraph(JobNode):
                  logJobStoreFileID=None,
                  checkpoint=None,
                  checkpointFilesToDelete=None,
-                 chainedJobs=None):
+                 chainedJobs=None,
+                 criticalPathHint=None,
+                 pickledJob=None):
         requirements = {'memory': memory, 'cores': cores, 'disk': disk,
                         'preemptable': preemptable}
         super(JobGraph, self).__init__(command=command,
                                        requirements=requirements,
                                        unitName=unitName, jobName=jobName,
                                        jobStoreID=jobStoreID,
-                                       predecessorNumber=predecessorNumber)
+                                       predecessorNumber=predecessorNumber,
+                                       criticalPathHint=criticalPathHint)
 
         # The number of times the job should be retried if it fails This number is reduced by
         # retries until it is zero and then no further retries are made
@@ -100,6 +111,10 @@ class JobGraph(JobNode):
         # this job
         self.chainedJobs = chainedJobs
 
+        # None, or the pickled job if it is small enough to be stored in the job graph rather
+        # than in a file of its own, see toil.job.Job._serialiseJob
+        self.pickledJob = pickledJob
+
     def setupJobAfterFailure(self, config):
         """
         Reduce the remainingRetryCount if greater than zero and set the memory
@@ -189,15 +204,22 @@ class JobGraph(JobNode):
                    remainingRetryCount=tryCount,
                    predecessorNumber=jobNode.predecessorNumber,
                    unitName=jobNode.unitName, jobName=jobNode.jobName,
+                   criticalPathHint=jobNode.criticalPathHint,
                    **jobNode._requirements)
 
+    def __setstate__(self, state):
+        super(JobGraph, self).__setstate__(state)
+        self.stack = [tuple(jobNodes) for jobNodes in self.stack or ()]
+        self.services = [tuple(jobNodes) for jobNodes in self.services or ()]
+
     def __eq__(self, other):
         return (
             isinstance(other, self.__class__)
             and self.remainingRetryCount == other.remainingRetryCount
             and self.jobStoreID == other.jobStoreID
             and self.filesToDelete == other.filesToDelete
-            and self.stack == other.stack
+            and ([tuple(jobNodes) for jobNodes in self.stack] ==
+                 [tuple(jobNodes) for jobNodes in other.stack])
             and self.predecessorNumber == other.predecessorNumber
             and self.predecessorsFinished == other.predecessorsFinished
             and self.logJobStoreFileID == other.logJobStoreFileID)
@@ -0,0 +1,233 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from builtins import object
+from collections import OrderedDict
+from threading import RLock
+from timeit import default_timer
+import logging
+
+from toil.jobStores.abstractJobStore import NoSuchJobException
+from toil.lib.threading import KeyedThreadPool
+
+logger = logging.getLogger(__name__)
+
+
+class JobGraphCache(object):
+    """
+    A size-bounded, least-recently-used cache of the job graphs in a job store, as seen by the
+    leader.
+
+    Updates are written through to the job store. A job graph may only be cached while the leader
+    owns the job, i.e. while no worker can rewrite it, so the leader must call :meth:`jobIssued`
+    whenever it issues a job and :meth:`jobFinished` once the batch system reports it done. The
+    next lookup then fetches the rewritten job graph from the job store once and serves repeated
+    lookups from memory.
+
+    Each job has a version that is bumped whenever it is issued and whenever it finishes, so an
+    odd version means that a worker owns the job. A job graph is only cached if its version is
+    even and did not change while it was being fetched from the job store.
+
+    Job store operations run on a pool of threads. Operations on the same job run in the order
+    they were requested, so that the leader can go on scheduling while job graphs are prefetched,
+    see :meth:`prefetch`, and while updates are written to the job store. An update is only
+    guaranteed to have been written once the job has been issued, see :meth:`jobIssued`, or the
+    cache has been shut down. Failed writes are re-raised by :meth:`check`.
+    """
+    def __init__(self, jobStore, maxSize, numIOThreads=0):
+        """
+        :param toil.jobStores.abstractJobStore.AbstractJobStore jobStore: the backing job store
+        :param int maxSize: the maximum number of job graphs to hold, zero disables caching
+        :param int numIOThreads: the number of threads accessing the job store, zero accesses
+               the job store synchronously
+        """
+        self.jobStore = jobStore
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        # The total number of seconds callers have waited for the job store
+        self.waitTime = 0.0
+        self._jobGraphs = OrderedDict()
+        self._versions = {}
+        self._lock = RLock()
+        self._io = KeyedThreadPool(numIOThreads)
+        # Futures of job graphs being fetched, or None for deleted jobs, by jobStoreID
+        self._fetches = {}
+        # Futures of the last write to each job
+        self._writes = {}
+
+    def __len__(self):
+        return len(self._jobGraphs)
+
+    def __contains__(self, jobStoreID):
+        return jobStoreID in self._jobGraphs
+
+    def _get(self, jobStoreID):
+        """
+        Returns the cached job graph, marking it as most recently used, or None on a miss.
+        """
+        with self._lock:
+            try:
+                jobGraph = self._jobGraphs.pop(jobStoreID)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._jobGraphs[jobStoreID] = jobGraph
+            self.hits += 1
+            return jobGraph
+
+    def _put(self, jobGraph, version=None):
+        with self._lock:
+            currentVersion = self._versions.get(jobGraph.jobStoreID, 0)
+            if currentVersion % 2 or version is not None and version != currentVersion:
+                return
+            self._jobGraphs.pop(jobGraph.jobStoreID, None)
+            if self.maxSize > 0:
+                self._jobGraphs[jobGraph.jobStoreID] = jobGraph
+                while len(self._jobGraphs) > self.maxSize:
+                    self._jobGraphs.popitem(last=False)
+
+    def add(self, jobGraph):
+        """
+        Caches a job graph known to be identical to the one in the job store.
+        """
+        self._put(jobGraph)
+
+    def _wait(self, future):
+        start = default_timer()
+        try:
+            return future.result()
+        finally:
+            self.waitTime += default_timer() - start
+
+    def _fetch(self, jobStoreID, version):
+        try:
+            jobGraph = self.jobStore.load(jobStoreID)
+        except NoSuchJobException:
+            return None
+        self._put(jobGraph, version=version)
+        return jobGraph
+
+    def prefetch(self, jobStoreIDs):
+        """
+        Starts fetching the job graphs with the given IDs that are not cached, without waiting
+        for them.
+        """
+        for jobStoreID in jobStoreIDs:
+            if jobStoreID not in self._jobGraphs and jobStoreID not in self._fetches:
+                version = self._versions.get(jobStoreID, 0)
+                self._fetches[jobStoreID] = self._io.submit(jobStoreID, self._fetch,
+                                                            jobStoreID, version)
+
+    def load(self, jobStoreID):
+        """
+        Returns the job graph with the given ID, loading it from the job store on a miss.
+
+        :rtype: toil.jobGraph.JobGraph
+        """
+        fetch = self._fetches.pop(jobStoreID, None)
+        jobGraph = self._get(jobStoreID)
+        if jobGraph is None:
+            if fetch is None:
+                fetch = self._io.submit(jobStoreID, self._fetch,
+                                        jobStoreID, self._versions.get(jobStoreID, 0))
+            jobGraph = self._wait(fetch)
+            if jobGraph is None:
+                raise NoSuchJobException(jobStoreID)
+        return jobGraph
+
+    def exists(self, jobStoreID):
+        """
+        Indicates whether the job graph with the given ID exists, consulting the job store only
+        if the job graph isn't cached.
+
+        :rtype: bool
+        """
+        with self._lock:
+            if jobStoreID in self._jobGraphs:
+                return True
+        fetch = self._fetches.get(jobStoreID)
+        if fetch is not None:
+            return self._wait(fetch) is not None
+        return self._wait(self._io.submit(jobStoreID, self.jobStore.exists, jobStoreID))
+
+    def update(self, jobGraph):
+        """
+        Caches the job graph and starts writing it through to the job store.
+        """
+        self._put(jobGraph)
+        self._fetches.pop(jobGraph.jobStoreID, None)
+        self._writes[jobGraph.jobStoreID] = self._io.submit(jobGraph.jobStoreID,
+                                                            self.jobStore.update, jobGraph)
+
+    def check(self):
+        """
+        Re-raises the exception of any write to the job store that failed.
+        """
+        for jobStoreID, write in list(self._writes.items()):
+            if write.done():
+                del self._writes[jobStoreID]
+                write.result()
+
+    def pendingWrites(self):
+        """
+        Returns the IDs of the jobs whose job graphs are still being written to the job store.
+
+        :rtype: set[str]
+        """
+        return set(jobStoreID for jobStoreID, write in list(self._writes.items())
+                   if not write.done())
+
+    def shutdown(self):
+        """
+        Waits for all writes to the job store to complete.
+        """
+        self._io.shutdown()
+        self.check()
+
+    def jobIssued(self, jobStoreID):
+        """
+        Drops the job graph with the given ID from the cache and stops caching it, as the job has
+        been issued and may be rewritten by a worker. Waits for any write to the job to complete,
+        so this must be called before the job is handed to the batch system.
+        """
+        write = self._writes.pop(jobStoreID, None)
+        if write is not None:
+            self._wait(write)
+        self._fetches.pop(jobStoreID, None)
+        with self._lock:
+            self._jobGraphs.pop(jobStoreID, None)
+            version = self._versions.get(jobStoreID, 0)
+            if version % 2 == 0:
+                self._versions[jobStoreID] = version + 1
+
+    def jobFinished(self, jobStoreID):
+        """
+        Resumes caching the job graph with the given ID, as its job is no longer running.
+        """
+        with self._lock:
+            version = self._versions.get(jobStoreID, 0)
+            if version % 2:
+                self._versions[jobStoreID] = version + 1
+
+    def forget(self, jobStoreID):
+        """
+        Drops all state held for a job that has been removed from the job store.
+        """
+        self._fetches.pop(jobStoreID, None)
+        with self._lock:
+            self._jobGraphs.pop(jobStoreID, None)
+            self._versions.pop(jobStoreID, None)
@@ -0,0 +1,114 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+
+from builtins import object
+import logging
+import time
+
+from toil.lib.runningAverage import RunningAverage
+
+logger = logging.getLogger(__name__)
+
+
+class JobPrioritizer(object):
+    """
+    Orders ready jobs so that those on the longest remaining path through the workflow are
+    issued first.
+
+    The remaining critical-path length of a job is estimated, in order of preference, from
+
+    1) the criticalPathHint the user gave the job,
+
+    2) the average time previous jobs of the same name took from first being issued until the
+       job and all of its successors had completed, and
+
+    3) the average wall time of previous jobs of the same name, which the leader shares with
+       :meth:`toil.provisioners.clusterScaler.ClusterScaler.getAverageRuntime`.
+
+    Jobs of names that have not been seen yet are estimated with the average wall time of all
+    completed jobs. As ordering is stable, ready jobs retain their original order until some
+    history has been gathered.
+    """
+    def __init__(self):
+        # Average wall time of a job, by job name
+        self.runtimes = RunningAverage()
+        # Average time from a job being issued until its subtree has completed, by job name
+        self.subtreeRuntimes = RunningAverage()
+        # Time at which each job currently in progress was first issued, by jobStoreID
+        self.jobStoreIDToIssueTime = {}
+
+    def jobIssued(self, jobNode):
+        """
+        Records that the given job has been issued. Reissues of the same job are ignored.
+        """
+        self.jobStoreIDToIssueTime.setdefault(jobNode.jobStoreID, time.time())
+
+    def addCompletedJob(self, jobNode, wallTime):
+        """
+        Records the wall time of a job that ran.
+        """
+        self.runtimes.add(jobNode.jobName, wallTime)
+
+    def jobRemoved(self, jobNode):
+        """
+        Records that the given job and all of its successors have completed and that it has been
+        removed from the job store.
+        """
+        issueTime = self.jobStoreIDToIssueTime.pop(jobNode.jobStoreID, None)
+        if issueTime is not None:
+            self.subtreeRuntimes.add(jobNode.jobName, time.time() - issueTime)
+
+    def jobFailed(self, jobStoreID):
+        """
+        Forgets the issue time of a job that has totally failed, whose subtree won't complete.
+        """
+        self.jobStoreIDToIssueTime.pop(jobStoreID, None)
+
+    def getRuntimeEstimate(self, jobNode):
+        """
+        Returns the average wall time of previous jobs of the same name as the given job, or None
+        if none has completed yet.
+
+        :rtype: float|None
+        """
+        return self.runtimes.get(jobNode.jobName)
+
+    def getCriticalPathEstimate(self, jobNode):
+        """
+        Returns an estimate of the number of seconds needed to complete the job and all of its
+        successors.
+
+        :param toil.job.JobNode jobNode: the job to estimate
+        :rtype: float
+        """
+        if jobNode.criticalPathHint is not None:
+            return jobNode.criticalPathHint
+        subtreeRuntime = self.subtreeRuntimes.get(jobNode.jobName)
+        runtime = self.runtimes.get(jobNode.jobName)
+        if subtreeRuntime is not None or runtime is not None:
+            # A subtree can't take less time than the job at its root
+            return max(subtreeRuntime or 0.0, runtime or 0.0)
+        return self.runtimes.totalAverage
+
+    def prioritize(self, jobNodes):
+        """
+        Returns the given jobs ordered by decreasing estimated critical-path length.
+
+        :param list[toil.job.JobNode] jobNodes: the jobs ready to be issued
+        :rtype: list[toil.job.JobNode]
+        """
+        return sorted(jobNodes, key=self.getCriticalPathEstimate, reverse=True)
@@ -438,7 +438,7 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
 
     # Cleanup functions
 
-    def clean(self, jobCache=None):
+    def clean(self, jobCache=None, jobCacheIsComplete=False, touchedJobStoreIDs=None):
         """
         Function to cleanup the state of a job store after a restart.
         Fixes jobs that might have been partially updated. Resets the try counts and removes jobs
@@ -447,7 +447,17 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
         :param dict[str,toil.jobGraph.JobGraph] jobCache: if a value it must be a dict
                from job ID keys to JobGraph object values. Jobs will be loaded from the cache
                (which can be downloaded from the job store in a batch) instead of piecemeal when
-               recursed into.
+               recursed into. Jobs deleted by the clean up are removed from the cache.
+        :param bool jobCacheIsComplete: if True, the jobCache is known to hold every job that is
+               reachable from the root job, so that the existence of jobs need not be checked
+               against the job store
+        :param set[str] touchedJobStoreIDs: if not None, the IDs of the only jobs that may have
+               changed since the jobCache was last known to be clean, see
+               :meth:`toil.stateJournal.StateJournal.recover`. The flag files of other services
+               are known to exist, as services stay touched from being scheduled until they are
+               deleted. Every other repair only depends on the job graphs in the jobCache, which
+               are still all checked, in memory, so that jobs that totally failed long before
+               the restart get their retry count reset.
         """
         if jobCache is None:
             logger.warning("Cleaning jobStore recursively. This may be slow.")
@@ -459,7 +469,7 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
                 try:
                     return jobCache[jobId]
                 except KeyError:
-                    self.load(jobId)
+                    return self.load(jobId)
             else:
                 return self.load(jobId)
 
@@ -467,6 +477,8 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
             if jobCache is not None:
                 if jobId in jobCache:
                     return True
+                elif jobCacheIsComplete:
+                    return False
                 else:
                     return self.exists(jobId)
             else:
@@ -482,22 +494,26 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
         # All other jobs returned by self.jobs() are orphaned and can be removed
         reachableFromRoot = set()
 
-        def getConnectedJobs(jobGraph):
-            if jobGraph.jobStoreID in reachableFromRoot:
-                return
-            reachableFromRoot.add(jobGraph.jobStoreID)
-            # Traverse jobs in stack
-            for jobs in jobGraph.stack:
-                for successorJobStoreID in [x.jobStoreID for x in jobs]:
-                    if (successorJobStoreID not in reachableFromRoot
-                        and haveJob(successorJobStoreID)):
-                        getConnectedJobs(getJob(successorJobStoreID))
-            # Traverse service jobs
-            for jobs in jobGraph.services:
-                for serviceJobStoreID in [x.jobStoreID for x in jobs]:
-                    if haveJob(serviceJobStoreID):
-                        assert serviceJobStoreID not in reachableFromRoot
-                        reachableFromRoot.add(serviceJobStoreID)
+        def getConnectedJobs(rootJobGraph):
+            # Iterative rather than recursive, so that long chains of jobs can't exhaust the stack
+            jobGraphsToVisit = [rootJobGraph]
+            while jobGraphsToVisit:
+                jobGraph = jobGraphsToVisit.pop()
+                if jobGraph.jobStoreID in reachableFromRoot:
+                    continue
+                reachableFromRoot.add(jobGraph.jobStoreID)
+                # Traverse jobs in stack
+                for jobs in jobGraph.stack:
+                    for successorJobStoreID in [x.jobStoreID for x in jobs]:
+                        if (successorJobStoreID not in reachableFromRoot
+                            and haveJob(successorJobStoreID)):
+                            jobGraphsToVisit.append(getJob(successorJobStoreID))
+                # Traverse service jobs
+                for jobs in jobGraph.services:
+                    for serviceJobStoreID in [x.jobStoreID for x in jobs]:
+                        if haveJob(serviceJobStoreID):
+                            assert serviceJobStoreID not in reachableFromRoot
+                            reachableFromRoot.add(serviceJobStoreID)
 
         logger.debug("Checking job graph connectivity...")
         getConnectedJobs(self.loadRootJob())
@@ -514,6 +530,8 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
                 self.deleteFile(fileID)
             # Delete the job
             self.delete(jobGraph.jobStoreID)
+            if jobCache is not None:
+                jobCache.pop(jobGraph.jobStoreID, None)
 
         jobGraphsReachableFromRoot = {id: getJob(id) for id in reachableFromRoot}
 
@@ -532,6 +550,8 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
             jobsDeletedByCheckpoints |= set(deletedThisRound)
         for jobID in jobsDeletedByCheckpoints:
             del jobGraphsReachableFromRoot[jobID]
+            if jobCache is not None:
+                jobCache.pop(jobID, None)
 
         # Clean up jobs that are in reachable from the root
         for jobGraph in jobGraphsReachableFromRoot.values():
@@ -557,7 +577,7 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
                 stackSizeFn = lambda: sum(map(len, jobGraph.stack))
                 startStackSize = stackSizeFn()
                 # Remove deleted jobs
-                jobGraph.stack = [[y for y in x if self.exists(y.jobStoreID)] for x in jobGraph.stack]
+                jobGraph.stack = [[y for y in x if haveJob(y.jobStoreID)] for x in jobGraph.stack]
                 # Remove empty stuff from the stack
                 jobGraph.stack = [x for x in jobGraph.stack if len(x) > 0]
                 # Check if anything got removed
@@ -569,6 +589,8 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
             # If there are services then renew
             # the start and terminate flags if they have been removed
             def subFlagFile(jobStoreID, jobStoreFileID, flag):
+                if touchedJobStoreIDs is not None and jobStoreID not in touchedJobStoreIDs:
+                    return jobStoreFileID
                 if self.fileExists(jobStoreFileID):
                     return jobStoreFileID
 
@@ -612,7 +634,7 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
             services = jobGraph.services
             jobGraph.services = []
             for serviceList in services:
-                existingServices = [service for service in serviceList if self.exists(service.jobStoreID)]
+                existingServices = [service for service in serviceList if haveJob(service.jobStoreID)]
                 if existingServices:
                     jobGraph.services.append(existingServices)
 
@@ -733,6 +755,19 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
         """
         raise NotImplementedError()
 
+    def loadMany(self, jobStoreIDs):
+        """
+        Loads the jobs referenced by the given IDs and returns them in the same order. Job stores
+        that can fetch several jobs in one request should override this method.
+
+        :param list[str] jobStoreIDs: the IDs of the jobs to load
+
+        :raise NoSuchJobException: if there is no job with one of the given IDs
+
+        :rtype: list[toil.jobGraph.JobGraph]
+        """
+        return [self.load(jobStoreID) for jobStoreID in jobStoreIDs]
+
     @abstractmethod
     def update(self, job):
         """
@@ -922,6 +957,49 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
         """
         raise NotImplementedError()
 
+    ##########################################
+    # The following methods deal with the records of the values promised by jobs, see
+    # toil.job.Promise. The record of a job holds all of its promised values.
+    ##########################################
+
+    def createPromiseRecord(self):
+        """
+        Creates an empty record for the values promised by a job. Like the files of promises, the
+        record isn't associated with a job and is kept until the job store is destroyed.
+
+        :return: the ID of the record
+        :rtype: str
+        """
+        return self.getEmptyFileStoreID()
+
+    def writePromiseRecord(self, recordID, record):
+        """
+        Replaces the contents of a record created by :meth:`createPromiseRecord` in one write.
+
+        :param str recordID: the ID of the record
+        :param bytes record: the serialised promised values
+        """
+        with self.updateFileStream(recordID) as fileHandle:
+            fileHandle.write(record)
+
+    def readPromiseRecords(self, recordIDs):
+        """
+        Reads the records with the given IDs. Job stores that can read several records in one
+        request should override this method.
+
+        :param list[str] recordIDs: the IDs of the records
+
+        :raise NoSuchFileException: if there is no record with one of the given IDs
+
+        :return: the contents of each record by its ID, empty if the record hasn't been written
+        :rtype: dict[str,bytes]
+        """
+        records = {}
+        for recordID in recordIDs:
+            with self.readFileStream(recordID) as fileHandle:
+                records[recordID] = fileHandle.read()
+        return records
+
     ##########################################
     # The following methods deal with shared files, i.e. files not associated
     # with specific jobs.
@@ -21,10 +21,6 @@ from builtins import range
 from contextlib import contextmanager, closing
 import logging
 
-try:
-    import cPickle as pickle
-except ImportError:
-    import pickle
 
 import re
 import uuid
@@ -62,6 +58,7 @@ from toil.jobStores.aws.utils import (SDBHelper,
                                       bucket_location_to_region,
                                       region_to_bucket_location, copyKeyMultipart,
                                       uploadFromPath, chunkedFileUpload, fileSizeAndTime)
+from toil.jobStores.jobGraphCodec import decodeJobGraph, encodeJobGraph
 from toil.jobStores.utils import WritablePipe, ReadablePipe
 from toil.jobGraph import JobGraph
 import toil.lib.encryption as encryption
@@ -73,7 +70,7 @@ class AWSJobStore(AbstractJobStore):
     """
     A job store that uses Amazon's S3 for file storage and SimpleDB for storing job info and
     enforcing strong consistency on the S3 file storage. There will be SDB domains for jobs and
-    files and a versioned S3 bucket for file contents. Job objects are pickled, compressed,
+    files and a versioned S3 bucket for file contents. Job objects are serialised, compressed,
     partitioned into chunks of 1024 bytes and each chunk is stored as a an attribute of the SDB
     item representing the job. UUIDs are used to identify jobs and files.
     """
@@ -250,11 +247,12 @@ class AWSJobStore(AbstractJobStore):
         else:
             binary,_ = SDBHelper.attributesToBinary(item)
             assert binary is not None
-        job = pickle.loads(binary)
+        job = decodeJobGraph(binary)
         return job
 
     def _awsJobToItem(self, job):
-        binary = pickle.dumps(job, protocol=pickle.HIGHEST_PROTOCOL)
+        # SDBHelper compresses the job
+        binary = encodeJobGraph(job)
         if len(binary) > SDBHelper.maxBinarySize(extraReservedChunks=1):
             #Store as an overlarge job in S3
             with self.writeFileStream() as (writable, fileID):
@@ -329,6 +327,31 @@ class AWSJobStore(AbstractJobStore):
         log.debug("Loaded job %s", jobStoreID)
         return job
 
+    # SimpleDB limits the number of values compared in a single IN expression
+    itemsPerBatchSelect = 20
+
+    def loadMany(self, jobStoreIDs):
+        jobStoreIDs = list(jobStoreIDs)
+        items = {}
+        n = self.itemsPerBatchSelect
+        for batch in (jobStoreIDs[i:i + n] for i in range(0, len(jobStoreIDs), n)):
+            for attempt in retry_sdb():
+                with attempt:
+                    result = list(self.jobsDomain.select(
+                        consistent_read=True,
+                        query="select * from `%s` where itemName() in (%s)" % (
+                            self.jobsDomain.name,
+                            ', '.join("'%s'" % jobStoreID for jobStoreID in batch))))
+            items.update((item.name, item) for item in result)
+        jobs = []
+        for jobStoreID in jobStoreIDs:
+            job = self._awsJobFromItem(items[jobStoreID]) if jobStoreID in items else None
+            if job is None:
+                raise NoSuchJobException(jobStoreID)
+            jobs.append(job)
+        log.debug("Loaded %i jobs", len(jobs))
+        return jobs
+
     def update(self, job):
         log.debug("Updating job %s", job.jobStoreID)
         item = self._awsJobToItem(job)        
@@ -569,6 +592,30 @@ class AWSJobStore(AbstractJobStore):
         with info.downloadStream() as readable:
             yield readable
 
+    def readPromiseRecords(self, recordIDs):
+        recordIDs = list(recordIDs)
+        records = {}
+        n = self.itemsPerBatchSelect
+        for batch in (recordIDs[i:i + n] for i in range(0, len(recordIDs), n)):
+            for attempt in retry_sdb():
+                with attempt:
+                    items = list(self.filesDomain.select(
+                        consistent_read=True,
+                        query="select * from `%s` where itemName() in (%s)" % (
+                            self.filesDomain.name,
+                            ', '.join("'%s'" % recordID for recordID in batch))))
+            for item in items:
+                info = self.FileInfo.fromItem(item)
+                if info is not None and info.content is not None:
+                    records[info.fileID] = info.content
+        # Records too large to be inlined in SimpleDB are read from S3
+        for recordID in recordIDs:
+            if recordID not in records:
+                with self.readFileStream(recordID) as readable:
+                    records[recordID] = readable.read()
+        log.debug("Read %i promise records", len(records))
+        return records
+
     @contextmanager
     def readSharedFileStream(self, sharedFileName):
         assert self._validateSharedFileName(sharedFileName)
@@ -29,10 +29,6 @@ from collections import namedtuple
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 
-try:
-    import cPickle as pickle
-except ImportError:
-    import pickle
 
 # Python 3 compatibility imports
 from six.moves.http_client import HTTPException
@@ -52,6 +48,7 @@ from toil.lib.memoize import strict_bool, memoize
 from toil.lib.exceptions import panic
 from toil.lib.retry import retry
 
+from toil.jobStores.jobGraphCodec import decodeJobGraph, encodeJobGraph
 from toil.jobStores.utils import WritablePipe, ReadablePipe
 from toil.jobGraph import JobGraph
 from toil.jobStores.abstractJobStore import (AbstractJobStore,
@@ -745,7 +742,10 @@ class AzureJob(JobGraph):
             wholeJobString = chunkedJob[0][1].value
         else:
             wholeJobString = ''.join(item[1].value for item in chunkedJob)
-        return pickle.loads(bz2.decompress(wholeJobString))
+        if wholeJobString.startswith(b'BZh'):
+            # Jobs were pickled and compressed with bz2 by earlier versions
+            wholeJobString = bz2.decompress(wholeJobString)
+        return decodeJobGraph(wholeJobString, cls=cls)
 
     def toEntity(self, chunkSize=maxAzureTablePropertySize):
         """
@@ -755,7 +755,7 @@ class AzureJob(JobGraph):
         """
         assert chunkSize <= maxAzureTablePropertySize
         item = {}
-        serializedAndEncodedJob = bz2.compress(pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL))
+        serializedAndEncodedJob = encodeJobGraph(self, compress=True)
         jobChunks = [serializedAndEncodedJob[i:i + chunkSize]
                      for i in range(0, len(serializedAndEncodedJob), chunkSize)]
         for attributeOrder, chunk in enumerate(jobChunks):
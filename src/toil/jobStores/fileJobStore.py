@@ -28,10 +28,6 @@ import stat
 import errno
 import time
 import traceback
-try:
-    import cPickle as pickle
-except ImportError:
-    import pickle
 
 # toil and bd2k dependencies
 from toil.fileStore import FileID
@@ -41,6 +37,7 @@ from toil.jobStores.abstractJobStore import (AbstractJobStore,
                                              NoSuchFileException,
                                              JobStoreExistsException,
                                              NoSuchJobStoreException)
+from toil.jobStores.jobGraphCodec import decodeJobGraph, encodeJobGraph
 from toil.jobGraph import JobGraph
 
 logger = logging.getLogger( __name__ )
@@ -165,7 +162,7 @@ class FileJobStore(AbstractJobStore):
         # Load a valid version of the job
         jobFile = self._getJobFileName(jobStoreID)
         with open(jobFile, 'rb') as fileHandle:
-            job = pickle.load(fileHandle)
+            job = decodeJobGraph(fileHandle.read())
         # The following cleans up any issues resulting from the failure of the
         # job during writing by the batch system.
         if os.path.isfile(jobFile + ".new"):
@@ -180,7 +177,7 @@ class FileJobStore(AbstractJobStore):
         # Atomicity guarantees use the fact the underlying file systems "move"
         # function is atomic.
         with open(self._getJobFileName(job.jobStoreID) + ".new", 'wb') as f:
-            pickle.dump(job, f)
+            f.write(encodeJobGraph(job))
         # This should be atomic for the file system
         os.rename(self._getJobFileName(job.jobStoreID) + ".new", self._getJobFileName(job.jobStoreID))
 
@@ -25,10 +25,6 @@ import logging
 import time
 import os
 
-try:
-    import cPickle as pickle
-except ImportError:
-    import pickle
 
 from toil.lib.retry import retry
 from google.cloud import storage, exceptions
@@ -42,6 +38,7 @@ from toil.jobStores.abstractJobStore import (AbstractJobStore, NoSuchJobExceptio
                                              NoSuchFileException, NoSuchJobStoreException,
                                              JobStoreExistsException,
                                              ConcurrentFileModificationException)
+from toil.jobStores.jobGraphCodec import decodeJobGraph, encodeJobGraph
 from toil.jobStores.utils import WritablePipe, ReadablePipe
 from toil.jobGraph import JobGraph
 log = logging.getLogger(__name__)
@@ -171,7 +168,7 @@ class GoogleJobStore(AbstractJobStore):
         if hasattr(self, "_batchedJobGraphs") and self._batchedJobGraphs is not None:
             self._batchedJobGraphs.append(job)
         else:
-            self._writeString(jobStoreID, pickle.dumps(job, protocol=pickle.HIGHEST_PROTOCOL))  # UPDATE: bz2.compress(
+            self._writeString(jobStoreID, encodeJobGraph(job, compress=True))
         return job
 
     def _newJobID(self):
@@ -196,10 +193,10 @@ class GoogleJobStore(AbstractJobStore):
             jobString = self._readContents(jobStoreID)
         except NoSuchFileException:
             raise NoSuchJobException(jobStoreID)
-        return pickle.loads(jobString)  # UPDATE bz2.decompress(
+        return decodeJobGraph(jobString)
 
     def update(self, job):
-        self._writeString(job.jobStoreID, pickle.dumps(job, protocol=pickle.HIGHEST_PROTOCOL), update=True)
+        self._writeString(job.jobStoreID, encodeJobGraph(job, compress=True), update=True)
 
     @googleRetry
     def delete(self, jobStoreID):
@@ -0,0 +1,218 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The serialisation of job graphs shared by the job stores.
+
+An encoded job graph is a header followed by a payload. The header is the magic bytes
+b'\\x00JG', the format version and a byte of flags. The payload is a tuple of the job graph's
+attributes in the order of :data:`jobGraphFields`, serialised by :mod:`marshal`. Successors in
+the stack and services are tuples of their attributes in the order of :data:`jobNodeFields`
+or :data:`serviceJobNodeFields`, preceded by a tag for their class. No class paths are stored.
+If the compressed flag is set the payload is compressed with zlib.
+
+Job graphs holding anything the format can't represent are pickled, as they were by earlier
+versions. Pickles never start with the magic bytes, so both are decoded.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import marshal
+import struct
+import zlib
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from future.types import newbytes, newint, newstr
+from future.utils import native
+from six import binary_type, integer_types, text_type
+
+from toil.job import JobNode, ServiceJobNode, _intern
+from toil.jobGraph import JobGraph
+
+logger = logging.getLogger(__name__)
+
+magic = b'\x00JG'
+
+# The version of the format written by encodeJobGraph. Decoders must read every earlier
+# version. Version 2 added pickledJob.
+formatVersion = 2
+
+# The marshal format version. Version 3 onwards shares repeated strings, such as the names of
+# successors. Every version reads those before it.
+_marshalVersion = min(marshal.version, 4)
+
+_compressed = 0x01
+
+# Payloads smaller than this are not worth compressing
+_minCompressedSize = 512
+
+_header = struct.Struct('!3sBB')
+
+# The attributes of successors, in the order of the tuples _encodeJobNode and _decodeJobNode
+# convert them to and from
+jobNodeFields = ('_memory', '_cores', '_disk', '_preemptable', 'unitName', 'jobName',
+                 'displayName', 'jobStoreID', 'predecessorNumber', 'command', 'criticalPathHint')
+
+serviceJobNodeFields = jobNodeFields + ('startJobStoreID', 'terminateJobStoreID',
+                                        'errorJobStoreID')
+
+jobGraphFields = jobNodeFields + ('remainingRetryCount', 'filesToDelete', 'predecessorsFinished',
+                                  'stack', 'logJobStoreFileID', 'services',
+                                  'terminateJobStoreID', 'startJobStoreID', 'errorJobStoreID',
+                                  'checkpoint', 'checkpointFilesToDelete', 'chainedJobs',
+                                  'pickledJob')
+
+# The types marshal writes faithfully. It writes subclasses of some of them as their internal
+# buffers, so values of any other type are pickled instead.
+_marshalTypes = frozenset((type(None), bool, float, binary_type, text_type) + integer_types)
+
+# The bytes, int and str of the future package, which are subclasses of the native types on
+# Python 2 and are converted to them, see _toNative. Their own subclasses, such as FileID, are
+# not converted as that would lose the subclass.
+_futureTypes = frozenset((newbytes, newint, newstr))
+
+# The tags of the classes of successors
+_jobNodeTag = 0
+_serviceJobNodeTag = 1
+
+
+class UnencodableJobGraph(ValueError):
+    pass
+
+
+def _encodeJobNode(jobNode):
+    # Subclasses may have attributes the format doesn't know about
+    if type(jobNode) is JobNode:
+        return (_jobNodeTag, jobNode._memory, jobNode._cores, jobNode._disk, jobNode._preemptable,
+                jobNode.unitName, jobNode.jobName, jobNode.displayName, jobNode.jobStoreID,
+                jobNode.predecessorNumber, jobNode.command, jobNode.criticalPathHint)
+    elif type(jobNode) is ServiceJobNode:
+        return (_serviceJobNodeTag, jobNode._memory, jobNode._cores, jobNode._disk,
+                jobNode._preemptable, jobNode.unitName, jobNode.jobName, jobNode.displayName,
+                jobNode.jobStoreID, jobNode.predecessorNumber, jobNode.command,
+                jobNode.criticalPathHint, jobNode.startJobStoreID, jobNode.terminateJobStoreID,
+                jobNode.errorJobStoreID)
+    else:
+        raise UnencodableJobGraph('Successor %s is of %s' % (jobNode, type(jobNode)))
+
+
+def _decodeJobNode(values):
+    # Unpacking into the attributes is much faster than setting them one by one
+    if values[0] == _jobNodeTag:
+        jobNode = JobNode.__new__(JobNode)
+        (_, jobNode._memory, jobNode._cores, jobNode._disk, jobNode._preemptable, unitName,
+         jobName, displayName, jobNode.jobStoreID, jobNode.predecessorNumber, jobNode.command,
+         jobNode.criticalPathHint) = values
+    else:
+        jobNode = ServiceJobNode.__new__(ServiceJobNode)
+        (_, jobNode._memory, jobNode._cores, jobNode._disk, jobNode._preemptable, unitName,
+         jobName, displayName, jobNode.jobStoreID, jobNode.predecessorNumber, jobNode.command,
+         jobNode.criticalPathHint, jobNode.startJobStoreID, jobNode.terminateJobStoreID,
+         jobNode.errorJobStoreID) = values
+    jobNode._config = None
+    jobNode.unitName = _intern(unitName)
+    jobNode.jobName = _intern(jobName)
+    jobNode.displayName = _intern(displayName)
+    return jobNode
+
+
+def _toNative(value):
+    """
+    Converts the value and the items of lists, tuples and sets to the exact native types
+    marshal writes faithfully.
+    """
+    if type(value) in _futureTypes:
+        value = native(value)
+    elif type(value) in (list, tuple, set, frozenset):
+        return type(value)(_toNative(item) for item in value)
+    if type(value) not in _marshalTypes:
+        raise UnencodableJobGraph('%r is of %s' % (value, type(value)))
+    return value
+
+
+def _encodePayload(jobGraph):
+    if getattr(jobGraph, '__dict__', None) or getattr(jobGraph, '_config', None) is not None:
+        raise UnencodableJobGraph('Job graph %s has attributes the format does not hold' % jobGraph)
+    values = []
+    for name in jobGraphFields:
+        value = getattr(jobGraph, name)
+        if name in ('stack', 'services'):
+            value = [tuple(_encodeJobNode(jobNode) for jobNode in jobNodes) for jobNodes in value]
+        values.append(_toNative(value))
+    return marshal.dumps(tuple(values), _marshalVersion)
+
+
+def encodeJobGraph(jobGraph, compress=False):
+    """
+    Serialises a job graph for a job store.
+
+    :param toil.jobGraph.JobGraph jobGraph: the job graph
+    :param bool compress: whether to compress job graphs whose serialisation is large enough for
+           it to be worth it, for job stores that pay for every byte they transfer
+    :rtype: bytes
+    """
+    try:
+        payload = _encodePayload(jobGraph)
+    except (UnencodableJobGraph, ValueError) as e:
+        # marshal raises ValueError for values it can't serialise
+        logger.debug('Pickling job graph %s: %s', jobGraph, e)
+        return pickle.dumps(jobGraph, pickle.HIGHEST_PROTOCOL)
+    flags = 0
+    if compress and len(payload) >= _minCompressedSize:
+        payload = zlib.compress(payload, 1)
+        flags |= _compressed
+    return _header.pack(magic, formatVersion, flags) + payload
+
+
+def decodeJobGraph(data, cls=JobGraph):
+    """
+    Deserialises a job graph written by :func:`encodeJobGraph`, or pickled by an earlier
+    version.
+
+    :param bytes data: the serialised job graph
+    :param type cls: the subclass of JobGraph to decode the job graph as, if the job store has
+           its own
+    :rtype: toil.jobGraph.JobGraph
+    """
+    if not data.startswith(magic):
+        return pickle.loads(data)
+    _, version, flags = _header.unpack_from(data)
+    if version > formatVersion:
+        raise RuntimeError('The job graph was written in version %i of the format by a newer '
+                           'version of Toil, this version reads up to version %i.'
+                           % (version, formatVersion))
+    payload = data[_header.size:]
+    if flags & _compressed:
+        payload = zlib.decompress(payload)
+    values = marshal.loads(payload)
+    jobGraph = cls.__new__(cls)
+    for name, value in zip(jobGraphFields, values):
+        setattr(jobGraph, name, value)
+    # Fields added by later versions of the format
+    for name in jobGraphFields[len(values):]:
+        setattr(jobGraph, name, None)
+    jobGraph._config = None
+    jobGraph.unitName = _intern(jobGraph.unitName)
+    jobGraph.jobName = _intern(jobGraph.jobName)
+    jobGraph.displayName = _intern(jobGraph.displayName)
+    jobGraph.stack = [tuple(_decodeJobNode(nodeValues) for nodeValues in jobNodes)
+                      for jobNodes in jobGraph.stack]
+    jobGraph.services = [tuple(_decodeJobNode(nodeValues) for nodeValues in jobNodes)
+                         for jobNodes in jobGraph.services]
+    return jobGraph
@@ -31,6 +31,7 @@ try:
 except ImportError:
     import pickle
 
+from toil.lib.exceptions import panic
 from toil.lib.humanize import bytes2human
 from toil import resolveEntryPoint
 try:
@@ -41,8 +42,12 @@ except ImportError:
 from toil.jobStores.abstractJobStore import NoSuchJobException
 from toil.provisioners.clusterScaler import ScalerThread
 from toil.serviceManager import ServiceManager
-from toil.statsAndLogging import StatsAndLogging
-from toil.job import JobNode, ServiceJobNode
+from toil.statsAndLogging import StatsAndLogging, LeaderStats
+from toil.job import JobBundle, JobNode, ServiceJobNode
+from toil.jobGraphCache import JobGraphCache
+from toil.jobPrioritizer import JobPrioritizer
+from toil.resourceProfile import ResourceProfile
+from toil.stateJournal import StateJournal
 from toil.toilState import ToilState
 from toil.common import ToilMetrics
 
@@ -124,8 +129,24 @@ class Leader(object):
         self.jobStore = jobStore
         self.jobStoreLocator = config.jobStore
 
+        # The leader's view of the job graphs it currently owns, which saves repeatedly loading
+        # them from the job store. Any job graph the leader loads or updates must go through it.
+        self.jobGraphCache = JobGraphCache(jobStore, config.jobGraphCacheSize,
+                                           numIOThreads=config.jobStoreIOThreads)
+
+        # A journal of the jobs handed to and returned by workers, which saves scanning the whole
+        # job store on restart. On restart the jobCache holds every job in the job store, on the
+        # first run only the root job, which must be loaded with its successors on recovery.
+        self.stateJournal = StateJournal(jobStore, config.stateSnapshotInterval,
+                                         jobGraphCache=self.jobGraphCache)
+        if config.restart and jobCache is not None:
+            self.stateJournal.start(jobCache)
+        else:
+            self.stateJournal.start({}, touchedJobStoreIDs=[rootJob.jobStoreID])
+
         # Get a snap shot of the current state of the jobs in the jobStore
-        self.toilState = ToilState(jobStore, rootJob, jobCache=jobCache)
+        self.toilState = ToilState(jobStore, rootJob, jobCache=jobCache,
+                                   numLoadThreads=config.statePrefetchThreads)
         logger.debug("Found %s jobs to start and %i jobs with successors to run",
                         len(self.toilState.updatedJobs), len(self.toilState.successorCounts))
 
@@ -159,20 +180,47 @@ class Leader(object):
         # using a statically defined cluster
         self.provisioner = provisioner
 
-        # Create cluster scaling thread if the provisioner is not None
+        # Orders the jobs made ready by each pass over the updated jobs by their estimated
+        # remaining critical-path length
+        self.jobPrioritizer = JobPrioritizer()
+
+        # Create cluster scaling thread if the provisioner is not None. It estimates the runtimes
+        # of queued jobs from the same averages as the job prioritizer.
         self.clusterScaler = None
         if self.provisioner is not None and len(self.provisioner.nodeTypes) > 0:
-            self.clusterScaler = ScalerThread(self.provisioner, self, self.config)
+            self.clusterScaler = ScalerThread(self.provisioner, self, self.config,
+                                              runtimes=self.jobPrioritizer.runtimes)
 
         # A service manager thread to start and terminate services
         self.serviceManager = ServiceManager(jobStore, self.toilState)
 
+        # The usage of previous jobs, from which the requirements of the jobs to issue are sized
+        self.resourceProfile = None
+        if config.rightSizeResources:
+            self.resourceProfile = ResourceProfile(config.rightSizePercentile,
+                                                   config.rightSizeHeadroom,
+                                                   getattr(batchSystem, 'maxMemory',
+                                                           config.maxMemory))
+            if config.resourceProfile is not None:
+                self.resourceProfile.load(config.resourceProfile)
+
         # A thread to manage the aggregation of statistics and logging from the run
-        self.statsAndLogging = StatsAndLogging(self.jobStore, self.config)
+        self.statsAndLogging = StatsAndLogging(
+            self.jobStore, self.config,
+            jobStatsListener=None if self.resourceProfile is None else self.resourceProfile.addJobStats)
+
+        # Timings of the phases of the main loop
+        self.leaderStats = LeaderStats(self.jobStore, self.config)
+
+        # While updated jobs are being processed, the jobs to issue are collected here so that
+        # they can be prioritized as a whole, see _processReadyJobs
+        self.readyJobsToIssue = None
 
         # Set used to monitor deadlocked jobs
         self.potentialDeadlockedJobs = set()
         self.potentialDeadlockTime = 0
+        # When the batch system was last asked for the running jobs to check for deadlocks
+        self.timeDeadlocksLastChecked = 0
 
         # A dashboard that runs on the leader node in AWS clusters to track the state
         # of the cluster
@@ -208,8 +256,16 @@ class Leader(object):
                     self.clusterScaler.start()
 
                 try:
-                    # Run the main loop
-                    self.innerLoop()
+                    try:
+                        # Run the main loop
+                        self.innerLoop()
+                    except:
+                        # A failure to write the last updates of job graphs or the last snapshot
+                        # is only logged, so that it doesn't hide the failure of the main loop
+                        with panic(logger):
+                            self._shutdownJobStoreWrites()
+                    else:
+                        self._shutdownJobStoreWrites()
                 finally:
                     if self.clusterScaler is not None:
                         logger.debug('Waiting for workers to shutdown.')
@@ -224,6 +280,8 @@ class Leader(object):
         finally:
             # Ensure the stats and logging thread is properly shutdown
             self.statsAndLogging.shutdown()
+            if self.resourceProfile is not None and self.config.resourceProfile is not None:
+                self.resourceProfile.save(self.config.resourceProfile)
             if self.toilMetrics:
                 self.toilMetrics.shutdown()
 
@@ -231,6 +289,8 @@ class Leader(object):
         # Filter the failed jobs
         self.toilState.totalFailedJobs = [j for j in self.toilState.totalFailedJobs if self.jobStore.exists(j.jobStoreID)]
 
+        logger.debug("Leader job graph cache: %i hits, %i misses",
+                     self.jobGraphCache.hits, self.jobGraphCache.misses)
         logger.info("Finished toil run %s" %
                      ("successfully." if not self.toilState.totalFailedJobs \
                 else ("with %s failed jobs." % len(self.toilState.totalFailedJobs))))
@@ -244,6 +304,15 @@ class Leader(object):
 
         return self.jobStore.getRootJobReturnValue()
 
+    def _shutdownJobStoreWrites(self):
+        """
+        Waits for the last updates of job graphs and the last snapshot to be written.
+        """
+        try:
+            self.jobGraphCache.shutdown()
+        finally:
+            self.stateJournal.shutdown()
+
     def _handledFailedSuccessor(self, jobNode, jobGraph, successorJobStoreID):
         """Deal with the successor having failed. Return True if there are
         still active successors. Return False if all successors have failed
@@ -281,7 +350,7 @@ class Leader(object):
 
         # Get the successor job graph, which is caches
         if successorJobStoreID not in self.toilState.jobsToBeScheduledWithMultiplePredecessors:
-            self.toilState.jobsToBeScheduledWithMultiplePredecessors[successorJobStoreID] = self.jobStore.load(successorJobStoreID)
+            self.toilState.jobsToBeScheduledWithMultiplePredecessors[successorJobStoreID] = self.jobGraphCache.load(successorJobStoreID)
         successorJobGraph = self.toilState.jobsToBeScheduledWithMultiplePredecessors[successorJobStoreID]
 
         # Add the jobGraph as a finished predecessor to the successor
@@ -325,6 +394,11 @@ class Leader(object):
         assert jobGraph.jobStoreID not in self.toilState.successorCounts
         self.toilState.successorCounts[jobGraph.jobStoreID] = len(jobGraph.stack[-1])
 
+        # Start loading the successors with multiple predecessors, which are needed below
+        self.jobGraphCache.prefetch([jobNode.jobStoreID for jobNode in jobGraph.stack[-1]
+                                     if jobNode.predecessorNumber > 1 and jobNode.jobStoreID not in
+                                     self.toilState.jobsToBeScheduledWithMultiplePredecessors])
+
         # For each successor schedule if all predecessors have been completed
         successors = []
         for jobNode in jobGraph.stack[-1]:
@@ -406,6 +480,12 @@ class Leader(object):
                     self.toilState.serviceJobStoreIDToPredecessorJob[serviceID] = jobGraph
                     self.toilState.servicesIssued[jobGraph.jobStoreID][serviceID] = serviceTuple
 
+            # From now on the flag files of the services may be deleted, which must be known
+            # on restart
+            self.stateJournal.record(StateJournal.servicesScheduled,
+                                     list(self.toilState.servicesIssued[jobGraph.jobStoreID]))
+            self.stateJournal.flush()
+
             # Use the service manager to start the services
             self.serviceManager.scheduleServices(jobGraph)
 
@@ -441,8 +521,16 @@ class Leader(object):
         updatedJobs = self.toilState.updatedJobs # The updated jobs to consider below
         self.toilState.updatedJobs = set() # Resetting the list for the next set
 
-        for jobGraph, resultStatus in updatedJobs:
-            self._processReadyJob(jobGraph, resultStatus)
+        # Collect the jobs that become ready and issue them once all updated jobs have been
+        # processed, those on the longest estimated path through the workflow first
+        self.readyJobsToIssue = []
+        try:
+            for jobGraph, resultStatus in updatedJobs:
+                self._processReadyJob(jobGraph, resultStatus)
+        finally:
+            readyJobs, self.readyJobsToIssue = self.readyJobsToIssue, None
+        if readyJobs:
+            self.issueJobs(self.jobPrioritizer.prioritize(readyJobs))
 
     def _startServiceJobs(self):
         """Start any service jobs available from the service manager"""
@@ -486,6 +574,21 @@ class Leader(object):
                             result, updatedJob)
             self.processFinishedJob(jobID, result, wallTime=wallTime)
 
+    def _prefetchUpdatedJobs(self, updatedJobTuples):
+        """
+        Start loading the job graphs of the finished jobs in a batch of updates from the batch
+        system, so that they are loaded concurrently rather than one by one as they are processed.
+        """
+        jobStoreIDs = []
+        for jobID, _, _ in updatedJobTuples:
+            issuedJob = self.jobBatchSystemIDToIssuedJob.get(jobID)
+            if issuedJob is not None:
+                for jobNode in self._bundledJobs(issuedJob):
+                    # The job is done, so its job graph is the leader's to cache again
+                    self.jobGraphCache.jobFinished(jobNode.jobStoreID)
+                    jobStoreIDs.append(jobNode.jobStoreID)
+        self.jobGraphCache.prefetch(jobStoreIDs)
+
     def _processLostJobs(self):
         """Process jobs that have gone awry"""
         # In the case that there is nothing happening (no updated jobs to
@@ -517,19 +620,34 @@ class Leader(object):
               self.getNumberOfJobsIssued() or \
               self.serviceManager.jobsIssuedToServiceManager:
 
+            # Time each phase of the iteration
+            iterationStart = t = self.leaderStats.now()
+
             if self.toilState.updatedJobs:
                 self._processReadyJobs()
+                t = self.leaderStats.phase('processReadyJobs', t)
 
             # deal with service-related jobs
             self._startServiceJobs()
             self._processJobsWithRunningServices()
-
-            # check in with the batch system
-            updatedJobTuple = self.batchSystem.getUpdatedBatchJob(maxWait=2)
-            if updatedJobTuple is not None:
-                self._gatherUpdatedJobs(updatedJobTuple)
+            t = self.leaderStats.phase('services', t)
+
+            # check in with the batch system, taking every update that is already available so
+            # that successors of a whole batch of finished jobs are issued in one iteration
+            updatedJobTuples = self.batchSystem.getUpdatedBatchJobs(
+                maxWait=2, maxCount=self.config.maxUpdatedJobsPerLoop)
+            t = self.leaderStats.phase('getUpdatedBatchJobs', t)
+            if updatedJobTuples:
+                self._prefetchUpdatedJobs(updatedJobTuples)
+                for updatedJobTuple in updatedJobTuples:
+                    self._gatherUpdatedJobs(updatedJobTuple)
+                t = self.leaderStats.phase('gatherUpdatedJobs', t)
             else:
                 self._processLostJobs()
+                t = self.leaderStats.phase('processLostJobs', t)
+
+            # Surface any failure to write a job graph in the background
+            self.jobGraphCache.check()
 
             # Check on the associated threads and exit if a failure is detected
             self.statsAndLogging.check()
@@ -537,10 +655,28 @@ class Leader(object):
             # the cluster scaler object will only be instantiated if autoscaling is enabled
             if self.clusterScaler is not None:
                 self.clusterScaler.check()
+            t = self.leaderStats.phase('checkThreads', t)
 
             # Check for deadlocks
             self.checkForDeadlocks()
-
+            t = self.leaderStats.phase('checkForDeadlocks', t)
+
+            self.stateJournal.snapshotIfNeeded()
+            self.leaderStats.phase('stateJournal', t)
+
+            counters = dict(jobStoreWaitTime=self.jobGraphCache.waitTime,
+                            jobGraphCacheHits=self.jobGraphCache.hits,
+                            jobGraphCacheMisses=self.jobGraphCache.misses)
+            counters.update(self.batchSystem.getCounters())
+            self.leaderStats.iteration(iterationStart, queueDepths=dict(
+                updatedJobs=len(self.toilState.updatedJobs),
+                issuedJobs=self.getNumberOfJobsIssued(),
+                serviceJobsToBeIssued=(len(self.serviceJobsToBeIssued) +
+                                       len(self.preemptableServiceJobsToBeIssued)),
+                jobsIssuedToServiceManager=self.serviceManager.jobsIssuedToServiceManager),
+                counters=counters)
+
+        self.leaderStats.report()
         logger.debug("Finished the main loop: no jobs left to run.")
 
         # Consistency check the toil state
@@ -555,11 +691,24 @@ class Leader(object):
     def checkForDeadlocks(self):
         """
         Checks if the system is deadlocked running service jobs.
+
+        A deadlock requires service jobs to be issued and no updated jobs to process, which the
+        leader tracks itself. Only then are the running jobs listed by the batch system, which
+        may be expensive, and no more often than every deadlockCheckInterval seconds.
         """
-        totalRunningJobs = len(self.batchSystem.getRunningBatchJobIDs())
         totalServicesIssued = self.serviceJobsIssued + self.preemptableServiceJobsIssued
+        if totalServicesIssued == 0 or len(self.toilState.updatedJobs) > 0:
+            # There can't be a deadlock, so reset the potential deadlock
+            self.potentialDeadlockedJobs = set()
+            self.potentialDeadlockTime = 0
+            return
+        if time.time() - self.timeDeadlocksLastChecked < self.config.deadlockCheckInterval:
+            return
+        self.timeDeadlocksLastChecked = time.time()
+
+        totalRunningJobs = len(self.batchSystem.getRunningBatchJobIDs())
         # If there are no updated jobs and at least some jobs running
-        if totalServicesIssued >= totalRunningJobs and len(self.toilState.updatedJobs) == 0 and totalRunningJobs > 0:
+        if totalServicesIssued >= totalRunningJobs and totalRunningJobs > 0:
             serviceJobs = [x for x in list(self.jobBatchSystemIDToIssuedJob.keys()) if isinstance(self.jobBatchSystemIDToIssuedJob[x], ServiceJobNode)]
             runningServiceJobs = set([x for x in serviceJobs if self.serviceManager.isRunning(self.jobBatchSystemIDToIssuedJob[x])])
             assert len(runningServiceJobs) <= totalRunningJobs
@@ -585,33 +734,103 @@ class Leader(object):
         """
         Add a job to the queue of jobs
         """
-        jobNode.command = ' '.join((resolveEntryPoint('_toil_worker'),
-                                    jobNode.jobName,
-                                    self.jobStoreLocator,
-                                    jobNode.jobStoreID))
-        # jobBatchSystemID is an int that is an incremented counter for each job
-        jobBatchSystemID = self.batchSystem.issueBatchJob(jobNode)
-        self.jobBatchSystemIDToIssuedJob[jobBatchSystemID] = jobNode
-        if jobNode.preemptable:
-            # len(jobBatchSystemIDToIssuedJob) should always be greater than or equal to preemptableJobsIssued,
-            # so increment this value after the job is added to the issuedJob dict
-            self.preemptableJobsIssued += 1
-        cur_logger = (logger.debug if jobNode.jobName.startswith(CWL_INTERNAL_JOBS)
-                      else logger.info)
-        cur_logger("Issued job %s with job batch system ID: "
-                   "%s and cores: %s, disk: %s, and memory: %s",
-                   jobNode, str(jobBatchSystemID), int(jobNode.cores),
-                   bytes2human(jobNode.disk), bytes2human(jobNode.memory))
-        if self.toilMetrics:
-            self.toilMetrics.logIssuedJob(jobNode)
-            self.toilMetrics.logQueueSize(self.getNumberOfJobsIssued())
+        self.issueJobs([jobNode])
 
     def issueJobs(self, jobs):
         """
-        Add a list of jobs, each represented as a jobNode object
+        Add a list of jobs, each represented as a jobNode object. The jobs are handed to the batch
+        system in a single call so that it can submit them together, in the given order. While
+        updated jobs are being processed the jobs are only collected, see _processReadyJobs.
+        """
+        if self.readyJobsToIssue is not None:
+            self.readyJobsToIssue.extend(jobs)
+            return
+        if self.resourceProfile is not None:
+            jobs = [jobNode if isinstance(jobNode, ServiceJobNode)
+                    else self.resourceProfile.size(jobNode) for jobNode in jobs]
+        if self.config.maxJobsPerBundle > 1:
+            jobs = self._bundleJobs(jobs)
+        for jobNode in jobs:
+            command = [resolveEntryPoint('_toil_worker'), jobNode.jobName,
+                       self.jobStoreLocator, jobNode.jobStoreID]
+            if self.resourceProfile is not None:
+                # The worker must not chain jobs that need more than the job was issued with
+                command.insert(1, '--resources=%d,%s,%d' % (jobNode.memory, jobNode.cores,
+                                                             jobNode.disk))
+            for bundledJobNode in self._bundledJobs(jobNode)[1:]:
+                command.extend((bundledJobNode.jobName, bundledJobNode.jobStoreID))
+            jobNode.command = ' '.join(command)
+        bundledJobStoreIDs = [bundledJobNode.jobStoreID
+                              for jobNode in jobs for bundledJobNode in self._bundledJobs(jobNode)]
+        # The workers may change the jobs, which must be known on restart
+        self.stateJournal.record(StateJournal.issued, bundledJobStoreIDs)
+        self.stateJournal.flush()
+        for jobStoreID in bundledJobStoreIDs:
+            # The worker may rewrite the job graph from now on, and must see any pending update
+            self.jobGraphCache.jobIssued(jobStoreID)
+        # a jobBatchSystemID is an int that is an incremented counter for each job
+        jobBatchSystemIDs = self.batchSystem.issueBatchJobs(jobs)
+        for jobNode, jobBatchSystemID in zip(jobs, jobBatchSystemIDs):
+            self.jobBatchSystemIDToIssuedJob[jobBatchSystemID] = jobNode
+            for bundledJobNode in self._bundledJobs(jobNode):
+                self.jobPrioritizer.jobIssued(bundledJobNode)
+            if jobNode.preemptable:
+                # len(jobBatchSystemIDToIssuedJob) should always be greater than or equal to preemptableJobsIssued,
+                # so increment this value after the job is added to the issuedJob dict
+                self.preemptableJobsIssued += 1
+            cur_logger = (logger.debug if jobNode.jobName.startswith(CWL_INTERNAL_JOBS)
+                          else logger.info)
+            cur_logger("Issued job %s with job batch system ID: "
+                       "%s and cores: %s, disk: %s, and memory: %s",
+                       jobNode, str(jobBatchSystemID), int(jobNode.cores),
+                       bytes2human(jobNode.disk), bytes2human(jobNode.memory))
+            if self.toilMetrics:
+                self.toilMetrics.logIssuedJob(jobNode)
+                self.toilMetrics.logQueueSize(self.getNumberOfJobsIssued())
+
+    @staticmethod
+    def _bundledJobs(issuedJob):
+        """
+        Returns the jobs run by an issued job, which are several if it is a bundle.
+
+        :rtype: list[toil.job.JobNode]
         """
-        for job in jobs:
-            self.issueJob(job)
+        return issuedJob.jobNodes if isinstance(issuedJob, JobBundle) else [issuedJob]
+
+    def _bundleJobs(self, jobs):
+        """
+        Packs ready jobs that are expected to be short into bundles, so that the batch system
+        runs them in one worker rather than paying the overhead of a submission for each.
+
+        Jobs are bundled with jobs of the same requirements and preemptability, in the order
+        given, until the bundle holds maxJobsPerBundle jobs or the sum of the average wall times
+        of previous jobs of the same names would exceed maxBundleRuntime. Services, jobs of
+        names that have not completed yet and jobs without a command, which are issued to clean
+        them up, are issued on their own.
+
+        :param list[toil.job.JobNode] jobs: the jobs to issue, in order of priority
+        :return: the jobs to issue, some of them bundles, in the order of their first jobs
+        :rtype: list[toil.job.JobNode]
+        """
+        issuedJobs = []
+        # The bundle being filled and its estimated runtime, by requirements
+        openBundles = {}
+        for jobNode in jobs:
+            runtime = self.jobPrioritizer.getRuntimeEstimate(jobNode)
+            if (isinstance(jobNode, ServiceJobNode) or jobNode.command is None
+                    or runtime is None or runtime >= self.config.maxBundleRuntime):
+                issuedJobs.append([jobNode])
+                continue
+            key = (jobNode.memory, jobNode.cores, jobNode.disk, jobNode.preemptable)
+            bundle, bundleRuntime = openBundles.get(key, (None, 0.0))
+            if (bundle is None or len(bundle) >= self.config.maxJobsPerBundle
+                    or bundleRuntime + runtime > self.config.maxBundleRuntime):
+                bundle, bundleRuntime = [], 0.0
+                issuedJobs.append(bundle)
+            bundle.append(jobNode)
+            openBundles[key] = bundle, bundleRuntime + runtime
+        return [JobBundle(jobNodes) if len(jobNodes) > 1 else jobNodes[0]
+                for jobNodes in issuedJobs]
 
     def issueServiceJob(self, jobNode):
         """
@@ -751,20 +970,83 @@ class Leader(object):
         if resultStatus != 0:
             logger.warn("Despite the batch system claiming failure the "
                         "job %s seems to have finished and been removed", issuedJob)
+        self.jobPrioritizer.jobRemoved(issuedJob)
+        if self.resourceProfile is not None:
+            self.resourceProfile.jobRemoved(issuedJob.jobStoreID)
+        self.jobGraphCache.forget(issuedJob.jobStoreID)
+        self.stateJournal.record(StateJournal.deleted, [issuedJob.jobStoreID])
         self._updatePredecessorStatus(issuedJob.jobStoreID)
 
     def processFinishedJob(self, batchSystemID, resultStatus, wallTime=None):
         """
         Function reads a processed jobGraph file and updates its state.
         """
-        jobNode = self.removeJob(batchSystemID)
+        issuedJob = self.removeJob(batchSystemID)
+        if not isinstance(issuedJob, JobBundle):
+            self._processFinishedJobNode(issuedJob, resultStatus, wallTime)
+            return
+        jobNodes, unrunJobNodes = self._splitBundle(issuedJob.jobNodes)
+        if wallTime is not None:
+            # Share the wall time of a bundle out among the jobs it ran in proportion to their
+            # estimates
+            runtimes = [self.jobPrioritizer.getRuntimeEstimate(jobNode) or 0.0
+                        for jobNode in jobNodes]
+            totalRuntime = sum(runtimes)
+            wallTimes = [wallTime * (runtime / totalRuntime if totalRuntime else 1 / len(jobNodes))
+                         for runtime in runtimes]
+        else:
+            wallTimes = [wallTime] * len(jobNodes)
+        # Only the last job that ran can have failed, the jobs before it completed
+        resultStatuses = [0] * (len(jobNodes) - 1) + [resultStatus]
+        for jobNode, jobResultStatus, jobWallTime in zip(jobNodes, resultStatuses, wallTimes):
+            self._processFinishedJobNode(jobNode, jobResultStatus, jobWallTime)
+        if unrunJobNodes:
+            # The jobs are unchanged, so they are issued again without counting as a failure
+            logger.warn("Reissuing %i jobs that the %s did not get to run",
+                        len(unrunJobNodes), issuedJob)
+            unrunJobStoreIDs = [jobNode.jobStoreID for jobNode in unrunJobNodes]
+            for jobStoreID in unrunJobStoreIDs:
+                self.jobGraphCache.jobFinished(jobStoreID)
+            self.stateJournal.record(StateJournal.finished, unrunJobStoreIDs)
+            self.issueJobs(unrunJobNodes)
+
+    def _splitBundle(self, jobNodes):
+        """
+        Tells the jobs of a finished bundle that its worker ran apart from those it didn't get
+        to. The worker runs the jobs in order and stops at the first that fails, so every job
+        after the first that has not completed was left untouched. A job has completed once it
+        has been deleted or has neither a command left to run nor the log file of a failure,
+        which is why jobs without a command are never bundled, see _bundleJobs.
+
+        :param list[toil.job.JobNode] jobNodes: the jobs of the bundle, in the order they ran
+        :return: the jobs that were run, the last of which may have failed, and those that were
+                 not run
+        :rtype: tuple(list[toil.job.JobNode],list[toil.job.JobNode])
+        """
+        for i, jobNode in enumerate(jobNodes[:-1]):
+            self.jobGraphCache.jobFinished(jobNode.jobStoreID)
+            try:
+                jobGraph = self.jobGraphCache.load(jobNode.jobStoreID)
+            except NoSuchJobException:
+                continue
+            if jobGraph.command is not None or jobGraph.logJobStoreFileID is not None:
+                return jobNodes[:i + 1], jobNodes[i + 1:]
+        return jobNodes, []
+
+    def _processFinishedJobNode(self, jobNode, resultStatus, wallTime):
+        """
+        Updates the state of one of the jobs run by a finished batch system job.
+        """
         jobStoreID = jobNode.jobStoreID
-        if wallTime is not None and self.clusterScaler is not None:
-            self.clusterScaler.addCompletedJob(jobNode, wallTime)
-        if self.jobStore.exists(jobStoreID):
+        self.jobGraphCache.jobFinished(jobStoreID)
+        self.stateJournal.record(StateJournal.finished, [jobStoreID])
+        if wallTime is not None:
+            # Also updates the runtimes the cluster scaler uses
+            self.jobPrioritizer.addCompletedJob(jobNode, wallTime)
+        if self.jobGraphCache.exists(jobStoreID):
             logger.debug("Job %s continues to exist (i.e. has more to do)", jobNode)
             try:
-                jobGraph = self.jobStore.load(jobStoreID)
+                jobGraph = self.jobGraphCache.load(jobStoreID)
             except NoSuchJobException:
                 # Avoid importing AWSJobStore as the corresponding extra might be missing
                 if self.jobStore.__class__.__name__ == 'AWSJobStore':
@@ -795,23 +1077,47 @@ class Leader(object):
                 if jobGraph.logJobStoreFileID is None:
                     logger.warn("No log file is present, despite job failing: %s", jobNode)
                 jobGraph.setupJobAfterFailure(self.config)
-                self.jobStore.update(jobGraph)
+                self.jobGraphCache.update(jobGraph)
             elif jobStoreID in self.toilState.hasFailedSuccessors:
                 # If the job has completed okay, we can remove it from the list of jobs with failed successors
                 self.toilState.hasFailedSuccessors.remove(jobStoreID)
-
+            if (self.resourceProfile is not None and self._ranOutOfMemory(jobGraph, resultStatus)
+                    and self.resourceProfile.memoryExhausted(jobNode)):
+                # The job was issued with less memory than it requested, which is not its fault
+                jobGraph.remainingRetryCount += 1
+                self.jobGraphCache.update(jobGraph)
+
+            self.stateJournal.record(StateJournal.successorsAdded,
+                                     [successorJobNode.jobStoreID
+                                      for successorJobNodes in jobGraph.stack + jobGraph.services
+                                      for successorJobNode in successorJobNodes])
             self.toilState.updatedJobs.add((jobGraph, resultStatus)) #Now we know the
             #jobGraph is done we can add it to the list of updated jobGraph files
             logger.debug("Added job: %s to active jobs", jobGraph)
         else:  #The jobGraph is done
             self.processRemovedJob(jobNode, resultStatus)
 
+    def _ranOutOfMemory(self, jobGraph, resultStatus):
+        """
+        Returns whether a finished job seems to have failed for lack of memory, i.e. it was
+        killed by SIGKILL, as the kernel and most batch systems kill jobs that exceed their
+        memory, or its worker log reports a MemoryError.
+        """
+        if resultStatus in (-9, 137):
+            return True
+        if jobGraph.logJobStoreFileID is not None:
+            with jobGraph.getLogFileHandle(self.jobStore) as logFileStream:
+                return any(b'MemoryError' in line for line in logFileStream)
+        return False
+
     @staticmethod
     def getSuccessors(jobGraph, alreadySeenSuccessors, jobStore):
         """
         Gets successors of the given job by walking the job graph recursively.
         Any successor in alreadySeenSuccessors is ignored and not traversed.
         Returns the set of found successors. This set is added to alreadySeenSuccessors.
+
+        jobStore may be a job store or a :class:`toil.jobGraphCache.JobGraphCache`.
         """
         successors = set()
         def successorRecursion(jobGraph):
@@ -843,6 +1149,7 @@ class Leader(object):
         """
         # Mark job as a totally failed job
         self.toilState.totalFailedJobs.add(JobNode.fromJobGraph(jobGraph))
+        self.jobPrioritizer.jobFailed(jobGraph.jobStoreID)
         if self.toilMetrics:
             self.toilMetrics.logFailedJob(jobGraph)
 
@@ -879,7 +1186,7 @@ class Leader(object):
             # All successors traversed will be added to toilState.failedSuccessors and returned
             # as a set (unseenSuccessors).
             unseenSuccessors = self.getSuccessors(jobGraph, self.toilState.failedSuccessors,
-                                                  self.jobStore)
+                                                  self.jobGraphCache)
             logger.debug("Found new failed successors: %s of job: %s", " ".join(
                          unseenSuccessors), jobGraph)
 
@@ -0,0 +1,195 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Sampling of the resources used by this process and its descendants while a job runs.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+from builtins import object
+from glob import glob
+import logging
+import os
+import resource
+import sys
+import time
+from threading import Event, Thread
+
+log = logging.getLogger(__name__)
+
+_clockTicks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+_pageSize = resource.getpagesize()
+
+
+def _descendants(pid):
+    """
+    :return: the PIDs of the live descendants of the given process, which are only known on
+             Linux
+    :rtype: list[int]
+    """
+    pids = []
+    children = [pid]
+    while children:
+        parent = children.pop()
+        for path in glob('/proc/%i/task/*/children' % parent):
+            try:
+                with open(path) as f:
+                    children.extend(int(child) for child in f.read().split())
+            except (IOError, OSError, ValueError):
+                pass
+        if parent != pid:
+            pids.append(parent)
+    return pids
+
+
+def _processUsage(pid):
+    """
+    :return: the resident set size of a descendant in bytes and the CPU time in seconds spent by
+             it and its descendants that it has waited for, or (0, 0.0) if it has exited
+    :rtype: tuple(int,float)
+    """
+    try:
+        with open('/proc/%i/statm' % pid) as f:
+            rss = int(f.read().split()[1]) * _pageSize
+        with open('/proc/%i/stat' % pid) as f:
+            # The command name in parentheses may contain spaces
+            fields = f.read().rsplit(')', 1)[1].split()
+        # utime, stime, cutime and cstime are the 14th to 17th fields
+        cpuTime = sum(int(field) for field in fields[11:15]) / _clockTicks
+    except (IOError, OSError, IndexError, ValueError):
+        return 0, 0.0
+    return rss, cpuTime
+
+
+def _selfUsage():
+    me = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpuTime = me.ru_utime + me.ru_stime + children.ru_utime + children.ru_stime
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * _pageSize
+    except (IOError, OSError):
+        # The peak is the best approximation available without /proc. Linux reports
+        # kilobytes, macOS bytes.
+        rss = me.ru_maxrss if sys.platform == 'darwin' else me.ru_maxrss * 1024
+    return rss, cpuTime
+
+
+def sampleProcessTree():
+    """
+    :return: the resident set size in bytes of this process and its live descendants, and the
+             CPU time in seconds spent by them and all the descendants that have been waited for
+    :rtype: tuple(int,float)
+    """
+    rss, cpuTime = _selfUsage()
+    for pid in _descendants(os.getpid()):
+        childRss, childCpuTime = _processUsage(pid)
+        rss += childRss
+        cpuTime += childCpuTime
+    return rss, cpuTime
+
+
+def diskUsage(path):
+    """
+    :return: the number of bytes allocated to the files under the given path
+    :rtype: int
+    """
+    total = 0
+    for dirPath, dirNames, fileNames in os.walk(path):
+        for name in fileNames:
+            try:
+                total += os.lstat(os.path.join(dirPath, name)).st_blocks * 512
+            except OSError:
+                # The file has been removed since the directory was listed
+                pass
+    return total
+
+
+class ResourceSampler(object):
+    """
+    Samples the memory and CPU used by this process and its descendants, and the disk used in a
+    directory, on a background thread while a job runs.
+    """
+    def __init__(self, interval, getDirectory):
+        """
+        :param float interval: the number of seconds between samples
+        :param getDirectory: a function returning the directory whose disk usage is sampled, or
+               None to not sample disk usage. It is called for every sample as the job's
+               directory may only be created once the job has started.
+        """
+        self.interval = interval
+        self.getDirectory = getDirectory
+        self.samples = 0
+        self.peakMemory = 0
+        self.totalMemory = 0
+        self.peakCores = 0.0
+        self.peakDisk = 0
+        self._stopped = Event()
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._startTime = self._lastTime = time.time()
+        self._startCpuTime = self._lastCpuTime = sampleProcessTree()[1]
+        self._endTime = self._endCpuTime = None
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        rss, cpuTime = sampleProcessTree()
+        now = time.time()
+        self.samples += 1
+        self.peakMemory = max(self.peakMemory, rss)
+        self.totalMemory += rss
+        if now > self._lastTime:
+            self.peakCores = max(self.peakCores,
+                                 (cpuTime - self._lastCpuTime) / (now - self._lastTime))
+        self._lastTime, self._lastCpuTime = now, cpuTime
+        directory = self.getDirectory()
+        if directory is not None and os.path.isdir(directory):
+            self.peakDisk = max(self.peakDisk, diskUsage(directory))
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                self._sample()
+        except:
+            # Sampling must never fail the job
+            log.debug('Failed to sample the resource usage of the job', exc_info=True)
+
+    def stop(self):
+        """
+        Takes a last sample and stops sampling.
+        """
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._sample()
+        self._endTime, self._endCpuTime = self._lastTime, self._lastCpuTime
+
+    def summary(self):
+        """
+        :return: the peak and average memory in bytes, the average and peak number of cores
+                 and the peak disk usage in bytes, sampled until :meth:`stop` was called
+        :rtype: dict
+        """
+        wallTime = self._endTime - self._startTime
+        return dict(peak_memory=self.peakMemory,
+                    average_memory=self.totalMemory // self.samples,
+                    average_cores=((self._endCpuTime - self._startCpuTime) / wallTime
+                                   if wallTime > 0 else 0.0),
+                    peak_cores=self.peakCores,
+                    peak_disk=self.peakDisk)
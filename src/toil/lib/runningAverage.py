@@ -0,0 +1,49 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+
+from builtins import object
+
+
+class RunningAverage(object):
+    """
+    Per-key running averages, with an average over all keys to fall back on.
+
+    >>> average = RunningAverage()
+    >>> average.add('a', 1)
+    >>> average.add('a', 2)
+    >>> average.add('b', 6)
+    >>> average.get('a'), average.get('b'), average.get('c'), average.totalAverage
+    (1.5, 6.0, None, 3.0)
+    """
+    def __init__(self):
+        self.keyToAverage = {}
+        self.keyToCount = {}
+        self.totalAverage = 0.0
+        self.totalCount = 0
+
+    def add(self, key, value):
+        count = self.keyToCount.get(key, 0)
+        self.keyToAverage[key] = (self.keyToAverage.get(key, 0.0) * count + value) / (count + 1)
+        self.keyToCount[key] = count + 1
+        self.totalCount += 1
+        self.totalAverage += (value - self.totalAverage) / self.totalCount
+
+    def get(self, key):
+        """
+        Returns the average for the key, or None if no value has been added for it.
+        """
+        return self.keyToAverage.get(key)
@@ -17,6 +17,8 @@
 from __future__ import absolute_import
 from future.utils import raise_
 from builtins import range
+from builtins import object
+from collections import deque
 import sys
 import threading
 if sys.version_info >= (3, 0):
@@ -86,6 +88,124 @@ class ExceptionalThread(threading.Thread):
             raise_(type, value, traceback)
 
 
+class Future(object):
+    """
+    The eventual result of a call submitted to a :class:`KeyedThreadPool`.
+    """
+
+    def __init__( self ):
+        self._done = threading.Event( )
+        self._result = None
+        self._exc_info = None
+
+    def done( self ):
+        return self._done.is_set( )
+
+    def result( self ):
+        """
+        Waits for the call to complete and returns its return value, re-raising any exception
+        raised by the call.
+        """
+        self._done.wait( )
+        if self._exc_info is not None:
+            type, value, traceback = self._exc_info
+            raise_(type, value, traceback)
+        return self._result
+
+    def _run( self, fn, args, kwargs ):
+        try:
+            self._result = fn( *args, **kwargs )
+        except:
+            self._exc_info = sys.exc_info( )
+        self._done.set( )
+
+
+class KeyedThreadPool(object):
+    """
+    Runs calls on a pool of threads. Calls submitted with the same key run one at a time, in the
+    order they were submitted, while calls with different keys run concurrently.
+
+    >>> pool = KeyedThreadPool( 2 )
+    >>> log = []
+    >>> futures = [pool.submit( i % 2, log.append, i ) for i in range( 6 )]
+    >>> [f.result( ) for f in futures] == [None] * 6
+    True
+    >>> [i for i in log if i % 2] == [1, 3, 5]
+    True
+    >>> pool.shutdown( )
+    """
+
+    def __init__( self, numThreads ):
+        """
+        :param int numThreads: the number of threads, zero runs every call synchronously in
+               submit()
+        """
+        # Keys that have calls ready to run, each key is in the queue at most once
+        self._readyKeys = deque( )
+        # Calls not yet completed, by key
+        self._calls = {}
+        self._condition = threading.Condition( )
+        self._shuttingDown = False
+        self._threads = []
+        for i in range( numThreads ):
+            thread = threading.Thread( target=self._work )
+            thread.daemon = True
+            thread.start( )
+            self._threads.append( thread )
+
+    def submit( self, key, fn, *args, **kwargs ):
+        """
+        Schedules fn(*args, **kwargs) to run after all calls submitted earlier with the same key.
+
+        :rtype: Future
+        """
+        future = Future( )
+        if not self._threads:
+            future._run( fn, args, kwargs )
+            return future
+        with self._condition:
+            calls = self._calls.get( key )
+            if calls is None:
+                self._calls[ key ] = deque( [ (future, fn, args, kwargs) ] )
+                self._readyKeys.append( key )
+                self._condition.notify( )
+            else:
+                calls.append( (future, fn, args, kwargs) )
+        return future
+
+    def shutdown( self ):
+        """
+        Waits for all submitted calls to complete and stops the threads.
+        """
+        with self._condition:
+            self._shuttingDown = True
+            self._condition.notify_all( )
+        for thread in self._threads:
+            thread.join( )
+        self._threads = []
+
+    def _work( self ):
+        while True:
+            with self._condition:
+                while not self._readyKeys and not (self._shuttingDown and not self._calls):
+                    self._condition.wait( )
+                if not self._readyKeys:
+                    return
+                key = self._readyKeys.popleft( )
+                future, fn, args, kwargs = self._calls[ key ][ 0 ]
+            future._run( fn, args, kwargs )
+            with self._condition:
+                calls = self._calls[ key ]
+                calls.popleft( )
+                if calls:
+                    self._readyKeys.append( key )
+                    self._condition.notify( )
+                else:
+                    del self._calls[ key ]
+                    if self._shuttingDown and not self._calls:
+                        self._condition.notify_all( )
+
+
 # noinspection PyPep8Naming
 class defaultlocal(threading.local):
     """
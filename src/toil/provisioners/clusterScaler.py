@@ -28,6 +28,7 @@ import time
 from collections import defaultdict
 
 from toil.lib.retry import retry
+from toil.lib.runningAverage import RunningAverage
 from toil.lib.threading import ExceptionalThread
 from toil.lib.throttle import throttle
 from itertools import islice
@@ -288,25 +289,24 @@ def binPacking(nodeShapes, jobShapes, goalTime):
     return bpf.getRequiredNodes()
 
 class ClusterScaler(object):
-    def __init__(self, provisioner, leader, config):
+    def __init__(self, provisioner, leader, config, runtimes=None):
         """
         Class manages automatically scaling the number of worker nodes.
 
         :param AbstractProvisioner provisioner: Provisioner instance to scale.
         :param toil.leader.Leader leader:
         :param Config config: Config object from which to draw parameters.
+        :param RunningAverage runtimes: The average runtimes of completed jobs by job name, if
+               they are tracked by the caller, in which case addCompletedJob must not be called.
         """
         self.provisioner = provisioner
         self.leader = leader
         self.config = config
         self.static = {}
 
-        # Dictionary of job names to their average runtime, used to estimate wall time of queued
+        # Average runtimes of completed jobs by job name, used to estimate wall time of queued
         # jobs for bin-packing
-        self.jobNameToAvgRuntime = {}
-        self.jobNameToNumCompleted = {}
-        self.totalAvgRuntime = 0.0
-        self.totalJobsCompleted = 0
+        self.runtimes = RunningAverage() if runtimes is None else runtimes
 
         self.targetTime = config.targetTime
         if self.targetTime <= 0:
@@ -409,14 +409,15 @@ class ClusterScaler(object):
             # and a deadlock, because often multiple services need to
             # be running at once for any actual work to get done.
             return self.targetTime * 24 + 3600
-        if jobName in self.jobNameToAvgRuntime:
+        runtime = self.runtimes.get(jobName)
+        if runtime is not None:
             #Have seen jobs of this type before, so estimate
             #the runtime based on average of previous jobs of this type
-            return self.jobNameToAvgRuntime[jobName]
-        elif self.totalAvgRuntime > 0:
+            return runtime
+        elif self.runtimes.totalAverage > 0:
             #Haven't seen this job yet, so estimate its runtime as
             #the average runtime of all completed jobs
-            return self.totalAvgRuntime
+            return self.runtimes.totalAverage
         else:
             #Have no information whatsoever
             return 1.0
@@ -430,18 +431,7 @@ class ClusterScaler(object):
         """
 
         #Adjust average runtimes to include this job.
-        if job.jobName in self.jobNameToAvgRuntime:
-            prevAvg = self.jobNameToAvgRuntime[job.jobName]
-            prevNum = self.jobNameToNumCompleted[job.jobName]
-            self.jobNameToAvgRuntime[job.jobName] = float(prevAvg*prevNum + wallTime)/(prevNum + 1)
-            self.jobNameToNumCompleted[job.jobName] += 1
-        else:
-            self.jobNameToAvgRuntime[job.jobName] = wallTime
-            self.jobNameToNumCompleted[job.jobName] = 1
-
-        self.totalJobsCompleted += 1
-        self.totalAvgRuntime = float(self.totalAvgRuntime * (self.totalJobsCompleted - 1) + \
-                                     wallTime)/self.totalJobsCompleted
+        self.runtimes.add(job.jobName, wallTime)
 
     def setStaticNodes(self, nodes, preemptable):
         """
@@ -818,12 +808,12 @@ class ScalerThread(ExceptionalThread):
     is made, else the size of the cluster is adapted. The beta factor is an inertia parameter
     that prevents continual fluctuations in the number of nodes.
     """
-    def __init__(self, provisioner, leader, config):
+    def __init__(self, provisioner, leader, config, runtimes=None):
         """
         :param ClusterScaler scaler: the parent class
         """
         super(ScalerThread, self).__init__(name='scaler')
-        self.scaler = ClusterScaler(provisioner, leader, config)
+        self.scaler = ClusterScaler(provisioner, leader, config, runtimes=runtimes)
 
         # Indicates that the scaling thread should shutdown
         self.stop = False
@@ -0,0 +1,212 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+
+from builtins import object
+from collections import deque
+import copy
+import json
+import logging
+import math
+import os
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile of the values by the nearest-rank method.
+
+    >>> percentile([4, 1, 3, 2], 50)
+    2
+    >>> percentile([4, 1, 3, 2], 95)
+    4
+    """
+    values = sorted(values)
+    rank = int(math.ceil(p / 100 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+class ResourceProfile(object):
+    """
+    The memory, cores and disk used by previous jobs of each name, from which the leader sizes
+    the requirements of the jobs it issues.
+
+    A job's requirements are shrunk to the given percentile of what jobs of the same name used,
+    times the headroom, once minSamples of them have completed. Requirements are never grown
+    beyond what the job requested, except for the memory of a job that ran out of it, which is
+    escalated on every retry, see :meth:`memoryExhausted`.
+
+    The usage is taken from the stats the workers record for each job, see
+    :meth:`toil.job.Job._executor`, and can be kept across workflows in a profile file.
+    """
+    # The number of jobs of a name that must have completed before its jobs are sized
+    minSamples = 5
+
+    # The number of most recent jobs of each name whose usage is kept
+    maxSamples = 1000
+
+    # The factor by which the memory of a job that ran out of memory is increased
+    memoryEscalationFactor = 2
+
+    resources = ('memory', 'cores', 'disk')
+
+    def __init__(self, percentile, headroom, maxMemory):
+        """
+        :param float percentile: the percentile of the observed usage to size jobs to
+        :param float headroom: the factor by which to increase that percentile
+        :param int maxMemory: the most memory a job can be escalated to
+        """
+        self.percentile = percentile
+        self.headroom = headroom
+        self.maxMemory = maxMemory
+        self._lock = Lock()
+        # The usage of each resource by previous jobs, by job name
+        self._usage = {}
+        # The percentile of the usage of each resource, by job name, until new usage is added
+        self._estimates = {}
+        # The memory to issue jobs that ran out of memory with, by jobStoreID
+        self._escalatedMemory = {}
+        # The memory requested by the jobs issued with less, by jobStoreID
+        self._requestedMemory = {}
+
+    def _add(self, jobName, memory, cores, disk):
+        with self._lock:
+            usage = self._usage.get(jobName)
+            if usage is None:
+                usage = self._usage[jobName] = {resource: deque(maxlen=self.maxSamples)
+                                                for resource in self.resources}
+            for resource, value in zip(self.resources, (memory, cores, disk)):
+                if value is not None:
+                    usage[resource].append(value)
+            self._estimates.pop(jobName, None)
+
+    def addJobStats(self, jobStats):
+        """
+        Records the usage of a job from the stats recorded by its worker. The memory, cores and
+        disk sampled while the job ran are used if available, otherwise the peak RSS of the
+        worker and the job's CPU time over its wall time.
+
+        :param toil.lib.expando.Expando jobStats: an element of the jobs of a worker's stats
+        """
+        jobName = jobStats.get('job_name')
+        if jobName is None:
+            # Recorded by a worker that didn't record the job's name
+            return
+        if 'peak_memory' in jobStats:
+            self._add(jobName, jobStats.peak_memory, jobStats.average_cores, jobStats.peak_disk)
+        else:
+            wallTime = float(jobStats.time)
+            # ru_maxrss is in kilobytes
+            self._add(jobName, int(float(jobStats.memory)) * 1024,
+                      float(jobStats.clock) / wallTime if wallTime > 0 else None, None)
+
+    def load(self, path):
+        """
+        Adds the usage saved to the given profile file by an earlier workflow, if it exists.
+        """
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            profile = json.load(f)
+        for jobName, usage in profile.items():
+            with self._lock:
+                self._usage[jobName] = {resource: deque(usage.get(resource, []),
+                                                        maxlen=self.maxSamples)
+                                        for resource in self.resources}
+                self._estimates.pop(jobName, None)
+        logger.debug('Loaded the resource usage of %i job names from %s', len(profile), path)
+
+    def save(self, path):
+        """
+        Saves the usage recorded so far to the given profile file.
+        """
+        with self._lock:
+            profile = {jobName: {resource: list(values) for resource, values in usage.items()}
+                       for jobName, usage in self._usage.items()}
+        tempPath = path + '.tmp'
+        with open(tempPath, 'w') as f:
+            json.dump(profile, f)
+        os.rename(tempPath, path)
+
+    def _estimate(self, jobName, resource):
+        with self._lock:
+            estimates = self._estimates.setdefault(jobName, {})
+            if resource not in estimates:
+                usage = self._usage.get(jobName)
+                values = usage[resource] if usage is not None else ()
+                if len(values) < self.minSamples:
+                    estimates[resource] = None
+                else:
+                    estimates[resource] = percentile(values, self.percentile) * self.headroom
+            return estimates[resource]
+
+    def size(self, jobNode):
+        """
+        Returns the job with its requirements sized to the usage of previous jobs of the same
+        name, or the job itself if they don't change.
+
+        :param toil.job.JobNode jobNode: the job to be issued
+        :rtype: toil.job.JobNode
+        """
+        requirements = {}
+        memory = self._estimate(jobNode.jobName, 'memory')
+        if memory is not None and memory < jobNode.memory:
+            requirements['memory'] = int(math.ceil(memory))
+        cores = self._estimate(jobNode.jobName, 'cores')
+        if cores is not None and cores < jobNode.cores:
+            # Batch systems that can't allocate fractions of a core round up
+            requirements['cores'] = max(math.ceil(cores * 10) / 10, 0.1)
+        disk = self._estimate(jobNode.jobName, 'disk')
+        if disk is not None and disk < jobNode.disk:
+            requirements['disk'] = int(math.ceil(disk))
+        escalatedMemory = self._escalatedMemory.get(jobNode.jobStoreID)
+        if escalatedMemory is not None:
+            requirements['memory'] = escalatedMemory
+        if not requirements or all(getattr(jobNode, resource) == value
+                                   for resource, value in requirements.items()):
+            return jobNode
+        if requirements.get('memory', jobNode.memory) < jobNode.memory:
+            self._requestedMemory.setdefault(jobNode.jobStoreID, jobNode.memory)
+        # Job nodes may be shared with the stack of their predecessor
+        jobNode = copy.copy(jobNode)
+        for resource, value in requirements.items():
+            setattr(jobNode, '_' + resource, value)
+        return jobNode
+
+    def memoryExhausted(self, jobNode):
+        """
+        Escalates the memory the job is issued with after it ran out of memory.
+
+        :param toil.job.JobNode jobNode: the job as it was issued
+        :return: whether the job was issued with less memory than it requested, in which case
+                 the failure should not count against its retries
+        :rtype: bool
+        """
+        memory = min(int(jobNode.memory * self.memoryEscalationFactor), self.maxMemory)
+        self._escalatedMemory[jobNode.jobStoreID] = memory
+        logger.warn('Job %s seems to have run out of %s bytes of memory, issuing it with %s '
+                    'bytes from now on', jobNode, jobNode.memory, memory)
+        return jobNode.memory < self._requestedMemory.get(jobNode.jobStoreID, 0)
+
+    def jobRemoved(self, jobStoreID):
+        """
+        Forgets the escalated and requested memory of a job that has been removed from the job
+        store.
+        """
+        self._escalatedMemory.pop(jobStoreID, None)
+        self._requestedMemory.pop(jobStoreID, None)
@@ -0,0 +1,332 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from builtins import object
+import itertools
+import logging
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from toil.common import safeUnpickleFromStream
+from toil.jobStores.abstractJobStore import NoSuchFileException, NoSuchJobException
+from toil.lib.threading import KeyedThreadPool
+
+logger = logging.getLogger(__name__)
+
+
+class StateJournal(object):
+    """
+    A write-ahead journal of the jobs the leader hands to workers and finds to be done, kept in
+    shared files of the job store so that a restart does not need to download every job.
+
+    A snapshot holds every job graph in the job store as of the time it was written. The journal
+    records which jobs have been touched since then. A job is touched when it is issued, when it
+    finishes, when it gains successors and when it is deleted. Any job that was not touched
+    since the snapshot is unchanged in the job store. On restart, the snapshot is brought up to
+    date by reloading only the touched jobs and any new jobs they reference, see :meth:`recover`.
+
+    Records of issued jobs are flushed to the job store before the jobs reach the batch system,
+    as only workers running issued jobs change the job graph behind the leader's back. Each flush
+    appends the records since the previous one to the journal as a shared file of its own.
+
+    Snapshots are written in the background. The records made meanwhile start the journal of the
+    next generation, so recovery replays the journals of the snapshot's generation and of the
+    one after it. The journals of consecutive generations use different file names, and the
+    files of older generations, which can't be deleted, are told apart by their generation.
+    Jobs that are running or whose updates the leader is still writing when a snapshot is
+    started stay touched in it, as the snapshot may hold an outdated copy of them. So do services
+    from the time they are handed to the service manager until they are deleted, as the leader,
+    the service manager and the services themselves delete the services' flag files meanwhile.
+    The jobs touched since the snapshot are therefore the only ones the clean up on restart needs
+    to check against the job store, see :meth:`recover`.
+
+    Unlike a scan of the job store, recovery does not find orphaned jobs, i.e. successors a
+    worker created before dying without updating its job. Nothing references them, so they are
+    never loaded or run. They and their files are removed with the job store, or by a restart
+    that finds no usable snapshot and scans the job store, see
+    :meth:`toil.jobStores.abstractJobStore.AbstractJobStore.clean`.
+    """
+    snapshotFileName = 'stateSnapshot'
+    journalFileName = 'stateJournal%d.%d'
+
+    # Kinds of journal records, each of which is a pair of a kind and a list of jobStoreIDs
+    issued = 'i'
+    finished = 'f'
+    successorsAdded = 's'
+    deleted = 'd'
+    servicesScheduled = 'v'
+
+    def __init__(self, jobStore, snapshotInterval, jobGraphCache=None):
+        """
+        :param toil.jobStores.abstractJobStore.AbstractJobStore jobStore: the job store to
+               journal to
+        :param int snapshotInterval: the number of jobs to record in the journal before writing
+               a new snapshot, zero disables the journal
+        :param toil.jobGraphCache.JobGraphCache jobGraphCache: the cache through which the
+               leader writes job graphs, if any
+        """
+        self.jobStore = jobStore
+        self.snapshotInterval = snapshotInterval
+        self.jobGraphCache = jobGraphCache
+        self.generation = 0
+        # The records of the current generation
+        self.records = []
+        # The number of jobStoreIDs in self.records
+        self.recordedJobs = 0
+        # The number of records in self.records that have been written to the job store
+        self.flushedRecords = 0
+        # The number of journal files written in the current generation
+        self.journalFiles = 0
+        # Jobs that have been issued but have not yet finished or been deleted
+        self.runningJobStoreIDs = set()
+        # Services that have been handed to the service manager and have not yet been deleted
+        self.serviceJobStoreIDs = set()
+        # Writes the snapshots, created with the first of them
+        self._snapshotPool = None
+        # The snapshot being written in the background, if any
+        self._pendingSnapshot = None
+
+    @property
+    def enabled(self):
+        return self.snapshotInterval > 0
+
+    def start(self, jobCache, touchedJobStoreIDs=()):
+        """
+        Writes the initial snapshot of a run of the leader, replacing any earlier snapshot and
+        journal.
+
+        :param dict[str,toil.jobGraph.JobGraph] jobCache: every job graph in the job store,
+               except those whose IDs are in touchedJobStoreIDs and jobs reachable only through
+               them
+        :param touchedJobStoreIDs: IDs of jobs to reload from the job store on recovery
+        """
+        previous = self._readSnapshot()
+        # An earlier run may have started the journal of the generation after its last snapshot,
+        # whose files must not be mistaken for those of this run
+        self.generation = previous['generation'] + 1 if previous is not None else 0
+        if not self.enabled:
+            # Make sure a later restart can't pick up an outdated snapshot
+            if previous is not None and previous['jobs'] is not None:
+                self._startGeneration()
+                self._writeSnapshot(self.generation, None, set(), set())
+            return
+        touched = set(touchedJobStoreIDs)
+        jobs = {jobStoreID: jobGraph for jobStoreID, jobGraph in jobCache.items()
+                if jobStoreID not in touched}
+        self._startGeneration()
+        self._writeSnapshot(self.generation, jobs, touched, set())
+
+    def record(self, kind, jobStoreIDs):
+        """
+        Appends a record to the journal. The record is only written to the job store by the next
+        call to :meth:`flush`.
+
+        :param str kind: one of StateJournal.issued, finished, successorsAdded, deleted or
+               servicesScheduled
+        :param list[str] jobStoreIDs: the jobs the record is about
+        """
+        if not self.enabled or not jobStoreIDs:
+            return
+        jobStoreIDs = list(jobStoreIDs)
+        if kind == self.issued:
+            self.runningJobStoreIDs.update(jobStoreIDs)
+        elif kind == self.servicesScheduled:
+            self.serviceJobStoreIDs.update(jobStoreIDs)
+        elif kind in (self.finished, self.deleted):
+            self.runningJobStoreIDs.difference_update(jobStoreIDs)
+            if kind == self.deleted:
+                self.serviceJobStoreIDs.difference_update(jobStoreIDs)
+        self.records.append((kind, jobStoreIDs))
+        self.recordedJobs += len(jobStoreIDs)
+
+    def flush(self):
+        """
+        Appends the records made since the last flush to the journal in the job store.
+        """
+        if self.flushedRecords < len(self.records):
+            fileName = self.journalFileName % (self.generation % 2, self.journalFiles)
+            with self.jobStore.writeSharedFileStream(fileName) as fileHandle:
+                pickle.dump((self.generation, self.records[self.flushedRecords:]), fileHandle,
+                            pickle.HIGHEST_PROTOCOL)
+            self.flushedRecords = len(self.records)
+            self.journalFiles += 1
+
+    def snapshotIfNeeded(self):
+        """
+        Starts folding the journal into a new snapshot once it has grown past the snapshot
+        interval, unless the previous snapshot is still being written.
+        """
+        self.check()
+        if (self.enabled and self.recordedJobs >= self.snapshotInterval
+                and self._pendingSnapshot is None):
+            self.snapshot()
+
+    def snapshot(self):
+        """
+        Starts folding the journal into a new snapshot in the background, after waiting for any
+        snapshot still being written. Only the job graphs touched since the last snapshot are
+        loaded from the job store. Running jobs, scheduled services and jobs with pending writes
+        stay touched in the new snapshot.
+        """
+        self.flush()
+        self.check(wait=True)
+        records, touched = self.records, self.runningJobStoreIDs | self.serviceJobStoreIDs
+        if self.jobGraphCache is not None:
+            # The job store may not have caught up with the leader's updates of these jobs yet
+            touched.update(self.jobGraphCache.pendingWrites())
+        self._startGeneration()
+        if self._snapshotPool is None:
+            self._snapshotPool = KeyedThreadPool(1)
+        self._pendingSnapshot = self._snapshotPool.submit(None, self._foldJournal,
+                                                          self.generation, records, touched)
+
+    def check(self, wait=False):
+        """
+        Raises the exception of the snapshot written in the background, if it failed.
+
+        :param bool wait: whether to wait for the snapshot to be written
+        """
+        if self._pendingSnapshot is not None and (wait or self._pendingSnapshot.done()):
+            pendingSnapshot, self._pendingSnapshot = self._pendingSnapshot, None
+            pendingSnapshot.result()
+
+    def shutdown(self):
+        """
+        Waits for the snapshot being written in the background, if any.
+        """
+        try:
+            self.check(wait=True)
+        finally:
+            if self._snapshotPool is not None:
+                self._snapshotPool.shutdown()
+                self._snapshotPool = None
+
+    def _foldJournal(self, generation, records, touchedJobStoreIDs):
+        jobs, deleted, _ = self._replay(self._readSnapshot(), records)
+        self._writeSnapshot(generation, jobs, touchedJobStoreIDs, deleted)
+        logger.debug('Wrote a snapshot of %i jobs to the job store', len(jobs))
+
+    def recover(self):
+        """
+        Reconstructs the job graphs in the job store from the last snapshot and the journal.
+
+        :return: the job graphs reachable from the root job, by jobStoreID, and the IDs of the
+                 jobs touched since the snapshot was started, which are the only ones that may
+                 need repairs other than those the job graphs show, see
+                 :meth:`toil.jobStores.abstractJobStore.AbstractJobStore.clean`. None if there is
+                 no usable snapshot, in which case all jobs must be downloaded.
+        :rtype: (dict[str,toil.jobGraph.JobGraph], set[str])|None
+        """
+        if not self.enabled:
+            return None
+        snapshot = self._readSnapshot()
+        if snapshot is None or snapshot['jobs'] is None:
+            return None
+        self.generation = snapshot['generation']
+        # The snapshot of the next generation may not have been written yet
+        records = (self._readJournal(self.generation) +
+                   self._readJournal(self.generation + 1))
+        logger.info('Recovering the state of the workflow from a snapshot of %i jobs and %i '
+                    'journal records', len(snapshot['jobs']), len(records))
+        jobs, _, touched = self._replay(snapshot, records)
+        return jobs, touched
+
+    def _replay(self, snapshot, records):
+        """
+        Applies the journal records to the snapshot, loading every touched job graph and every
+        job graph referenced by them that is not in the snapshot.
+
+        :return: the job graphs by jobStoreID, the set of deleted jobStoreIDs that may still
+                 be referenced by them and the set of jobStoreIDs of the touched jobs
+        """
+        jobs = snapshot['jobs']
+        deleted = set(snapshot['deleted'])
+        touched = set(snapshot['touched'])
+        for kind, jobStoreIDs in records:
+            if kind == self.deleted:
+                deleted.update(jobStoreIDs)
+                touched.difference_update(jobStoreIDs)
+            else:
+                touched.update(jobStoreIDs)
+        for jobStoreID in deleted:
+            jobs.pop(jobStoreID, None)
+
+        # Successors created by workers are only reachable through touched jobs
+        jobStoreIDsToLoad = list(touched)
+        while jobStoreIDsToLoad:
+            jobStoreID = jobStoreIDsToLoad.pop()
+            try:
+                jobGraph = self.jobStore.load(jobStoreID)
+            except NoSuchJobException:
+                jobs.pop(jobStoreID, None)
+                deleted.add(jobStoreID)
+                continue
+            jobs[jobStoreID] = jobGraph
+            for jobNodes in jobGraph.stack + jobGraph.services:
+                for jobNode in jobNodes:
+                    if (jobNode.jobStoreID not in jobs and jobNode.jobStoreID not in deleted
+                            and jobNode.jobStoreID not in touched):
+                        touched.add(jobNode.jobStoreID)
+                        jobStoreIDsToLoad.append(jobNode.jobStoreID)
+
+        # Only remember deleted jobs that are still referenced
+        referenced = set(jobNode.jobStoreID for jobGraph in jobs.values()
+                         for jobNodes in jobGraph.stack + jobGraph.services
+                         for jobNode in jobNodes)
+        return jobs, deleted & referenced, touched
+
+    def _readJournal(self, generation):
+        """
+        Reads the records of the given generation from the consecutive journal files written by
+        :meth:`flush`.
+        """
+        records = []
+        for i in itertools.count():
+            try:
+                fileName = self.journalFileName % (generation % 2, i)
+                with self.jobStore.readSharedFileStream(fileName) as fileHandle:
+                    fileGeneration, fileRecords = safeUnpickleFromStream(fileHandle)
+            except NoSuchFileException:
+                break
+            if fileGeneration != generation:
+                # Left over from an older generation
+                break
+            records.extend(fileRecords)
+        return records
+
+    def _readSnapshot(self):
+        try:
+            with self.jobStore.readSharedFileStream(self.snapshotFileName) as fileHandle:
+                return safeUnpickleFromStream(fileHandle)
+        except NoSuchFileException:
+            return None
+
+    def _startGeneration(self):
+        # The journal of the new generation starts out empty
+        self.generation += 1
+        self.records = []
+        self.recordedJobs = 0
+        self.flushedRecords = 0
+        self.journalFiles = 0
+
+    def _writeSnapshot(self, generation, jobs, touched, deleted):
+        with self.jobStore.writeSharedFileStream(self.snapshotFileName) as fileHandle:
+            pickle.dump(dict(generation=generation, jobs=jobs, touched=touched,
+                             deleted=deleted),
+                        fileHandle, pickle.HIGHEST_PROTOCOL)
@@ -16,12 +16,16 @@ from __future__ import absolute_import
 
 from builtins import str
 from builtins import object
+from bisect import bisect_left
 import gzip
 import json
 import logging
 import os
 import time
 from threading import Thread, Event
+from timeit import default_timer
+
+from six import iteritems
 
 from toil.lib.expando import Expando
 from toil.lib.bioio import getTotalCpuTime
@@ -34,10 +38,14 @@ class StatsAndLogging( object ):
     Class manages a thread that aggregates statistics and logging information on a toil run.
     """
 
-    def __init__(self, jobStore, config):
+    def __init__(self, jobStore, config, jobStatsListener=None):
+        """
+        :param jobStatsListener: a function called on the aggregator thread with the stats of
+               every job the workers report, see :meth:`toil.job.Job._executor`
+        """
         self._stop = Event()
         self._worker = Thread(target=self.statsAndLoggingAggregator,
-                              args=(jobStore, self._stop, config))
+                              args=(jobStore, self._stop, config, jobStatsListener))
 
     def start(self):
         """
@@ -99,7 +107,7 @@ class StatsAndLogging( object ):
             os.symlink(os.path.relpath(fullName, path), name)
 
     @classmethod
-    def statsAndLoggingAggregator(cls, jobStore, stop, config):
+    def statsAndLoggingAggregator(cls, jobStore, stop, config, jobStatsListener=None):
         """
         The following function is used for collating stats/reporting log messages from the workers.
         Works inside of a thread, collates as long as the stop flag is not True.
@@ -131,6 +139,9 @@ class StatsAndLogging( object ):
                 cls.logWithFormatting(jobNames[0], messages,
                                       message='Received Toil worker log. Disable debug level logging to hide this output')
                 cls.writeLogFiles(jobNames, messages, config=config)
+            if jobStatsListener is not None:
+                for jobStats in stats.get('jobs', []):
+                    jobStatsListener(jobStats)
 
         while True:
             # This is a indirect way of getting a message to the thread to exit
@@ -163,3 +174,93 @@ class StatsAndLogging( object ):
         self._worker.join()
         logger.debug('... finished collating stats and logs. Took %s seconds', time.time() - startTime)
         # in addition to cleaning on exceptions, onError should clean if there are any failed jobs
+
+
+class LeaderStats( object ):
+    """
+    Timers, counters and queue depths for the phases of the leader's main loop. They are cheap
+    enough to be kept all the time. With --stats they are written to the stats stream every
+    reportInterval seconds and at the end of the run, and summarised by `toil stats`.
+    """
+    # Upper bounds in seconds of the buckets of the histogram of the main loop's iteration
+    # latency. The last bucket holds anything longer.
+    latencyBuckets = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30, 60)
+
+    # The minimum number of seconds between reports written to the stats stream
+    reportInterval = 60
+
+    # A monotonic clock where one is available
+    now = staticmethod(default_timer)
+
+    def __init__(self, jobStore, config):
+        self.jobStore = jobStore
+        self.writeReports = config.stats
+        self._counterBaselines = {}
+        self._reset()
+
+    def _reset(self):
+        self._start = self.now()
+        self.iterations = 0
+        self.phaseTimes = {}
+        self.phaseCounts = {}
+        self.latencyCounts = [0] * (len(self.latencyBuckets) + 1)
+        self.maxQueueDepths = {}
+        self.totalQueueDepths = {}
+        self.counters = {}
+
+    def phase(self, name, start):
+        """
+        Adds the time since start to the named phase.
+
+        :return: the current time, which starts the next phase
+        :rtype: float
+        """
+        now = self.now()
+        self.phaseTimes[name] = self.phaseTimes.get(name, 0.0) + now - start
+        self.phaseCounts[name] = self.phaseCounts.get(name, 0) + 1
+        return now
+
+    def iteration(self, start, queueDepths, counters):
+        """
+        Records an iteration of the main loop that began at the given time, and writes a report
+        if one is due.
+
+        :param dict[str,int] queueDepths: the current length of each of the leader's queues
+        :param dict[str,float] counters: running totals kept elsewhere, the increase of which
+               since the previous report is reported
+        """
+        now = self.now()
+        self.iterations += 1
+        self.latencyCounts[bisect_left(self.latencyBuckets, now - start)] += 1
+        for name, depth in iteritems(queueDepths):
+            self.totalQueueDepths[name] = self.totalQueueDepths.get(name, 0) + depth
+            self.maxQueueDepths[name] = max(self.maxQueueDepths.get(name, 0), depth)
+        self.counters = counters
+        if now - self._start >= self.reportInterval:
+            self.report()
+
+    def report(self):
+        """
+        Writes the statistics gathered since the previous report to the stats stream, if stats
+        are enabled, and starts gathering afresh.
+        """
+        if self.iterations == 0:
+            return
+        counters = {name: value - self._counterBaselines.get(name, 0)
+                    for name, value in iteritems(self.counters)}
+        self._counterBaselines.update(self.counters)
+        leader = dict(time=self.now() - self._start,
+                      iterations=self.iterations,
+                      phases={name: dict(time=self.phaseTimes[name], count=self.phaseCounts[name])
+                              for name in self.phaseTimes},
+                      latency=dict(buckets=list(self.latencyBuckets), counts=self.latencyCounts),
+                      queues={name: dict(max=self.maxQueueDepths[name],
+                                         total=self.totalQueueDepths[name])
+                              for name in self.totalQueueDepths},
+                      counters=counters)
+        logger.debug('Leader main loop: %i iterations in %.1f seconds, %s', leader['iterations'],
+                     leader['time'], ', '.join('%s: %.2fs' % (name, times['time'])
+                                               for name, times in iteritems(leader['phases'])))
+        if self.writeReports:
+            self.jobStore.writeStatsAndLogging(json.dumps(dict(leader=leader), ensure_ascii=True))
+        self._reset()
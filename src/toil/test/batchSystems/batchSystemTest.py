@@ -31,9 +31,15 @@ from textwrap import dedent
 import time
 import multiprocessing
 import sys
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 from toil import subprocess
 from unittest import skipIf
 
+from mock import patch
+
 from toil.common import Config
 from toil.batchSystems.mesos.test import MesosTestSupport
 from toil.batchSystems.parasolTestSupport import ParasolTestSupport
@@ -42,6 +48,7 @@ from toil.batchSystems.singleMachine import SingleMachineBatchSystem
 from toil.batchSystems.abstractBatchSystem import (InsufficientSystemResources,
                                                    BatchSystemSupport)
 from toil.job import Job, JobNode
+from toil.lib.expando import Expando
 from toil.test import (ToilTest,
                        needs_lsf,
                        needs_mesos,
@@ -175,6 +182,41 @@ class hidden(object):
             # Make sure killBatchJobs can handle jobs that don't exist
             self.batchSystem.killBatchJobs([10])
 
+        def testGetUpdatedBatchJobs(self):
+            jobIDs = set()
+            for i in range(3):
+                jobNode = JobNode(command='true', jobName='test%d' % i, unitName=None,
+                                  jobStoreID=str(i), requirements=defaultRequirements)
+                jobIDs.add(self.batchSystem.issueBatchJob(jobNode))
+            updatedJobs = []
+            for it in range(100):
+                if len(updatedJobs) == len(jobIDs):
+                    break
+                # Updates are capped at maxCount, even if more are available
+                batch = self.batchSystem.getUpdatedBatchJobs(maxWait=10, maxCount=2)
+                self.assertTrue(len(batch) <= 2)
+                updatedJobs.extend(batch)
+            self.assertEqual({jobID for jobID, _, _ in updatedJobs}, jobIDs)
+            self.assertEqual({exitStatus for _, exitStatus, _ in updatedJobs}, {0})
+            self.assertEqual(self.batchSystem.getUpdatedBatchJobs(maxWait=0), [])
+
+        def testIssueBatchJobs(self):
+            testPaths = [os.path.join(self.tempDir, 'test%d.txt' % i) for i in range(3)]
+            jobNodes = [JobNode(command='touch %s' % testPath, jobName='test%d' % i,
+                                unitName=None, jobStoreID=str(i),
+                                requirements=defaultRequirements)
+                        for i, testPath in enumerate(testPaths)]
+            jobIDs = self.batchSystem.issueBatchJobs(jobNodes)
+            self.assertEqual(len(set(jobIDs)), len(jobNodes))
+            self.assertTrue(set(jobIDs).issubset(self.batchSystem.getIssuedBatchJobIDs()))
+            updatedJobs = {}
+            while len(updatedJobs) < len(jobIDs):
+                jobID, exitStatus, wallTime = self.batchSystem.getUpdatedBatchJob(maxWait=1000)
+                updatedJobs[jobID] = exitStatus
+            self.assertEqual(updatedJobs, dict.fromkeys(jobIDs, 0))
+            for testPath in testPaths:
+                self.assertTrue(os.path.exists(testPath))
+
         def testSetEnv(self):
             # Parasol disobeys shell rules and stupidly splits the command at the space character
             # before exec'ing it, whether the space is quoted, escaped or not. This means that we
@@ -370,6 +412,191 @@ class SingleMachineBatchSystemTest(hidden.AbstractBatchSystemTest):
         return SingleMachineBatchSystem(config=self.config,
                                         maxCores=numCores, maxMemory=1e9, maxDisk=2001)
 
+    def _runInOrder(self, commandsAndCores):
+        jobIDs = []
+        for i, (command, cores) in enumerate(commandsAndCores):
+            requirements = dict(defaultRequirements, cores=cores)
+            jobIDs.append(self.batchSystem.issueBatchJob(
+                JobNode(command=command, jobName='test%d' % i, unitName=None,
+                        jobStoreID=str(i), requirements=requirements)))
+        updatedJobIDs = []
+        for _ in jobIDs:
+            jobID, exitStatus, wallTime = self.batchSystem.getUpdatedBatchJob(maxWait=60)
+            self.assertEqual(exitStatus, 0)
+            updatedJobIDs.append(jobID)
+        return [jobIDs.index(jobID) for jobID in updatedJobIDs]
+
+    def testBackfill(self):
+        """
+        A job that doesn't fit into the free cores doesn't hold up smaller jobs issued after it.
+        """
+        maxCores = self.batchSystem.maxCores
+        order = self._runInOrder([('sleep 2', maxCores / 2), ('true', maxCores),
+                                  ('true', maxCores / 2)])
+        self.assertEqual(order, [2, 0, 1])
+
+    def testGetUpdatedBatchJobsCollectsQueuedUpdates(self):
+        """
+        One call collects every update that is already queued, up to maxCount.
+        """
+        jobIDs = set()
+        for i in range(3):
+            jobNode = JobNode(command='true', jobName='test%d' % i, unitName=None,
+                              jobStoreID=str(i), requirements=defaultRequirements)
+            jobIDs.add(self.batchSystem.issueBatchJob(jobNode))
+        for _ in range(600):
+            if self.batchSystem.outputQueue.qsize() == len(jobIDs):
+                break
+            time.sleep(0.1)
+        updatedJobs = self.batchSystem.getUpdatedBatchJobs(maxWait=0, maxCount=1)
+        self.assertEqual(len(updatedJobs), 1)
+        updatedJobs.extend(self.batchSystem.getUpdatedBatchJobs(maxWait=0))
+        self.assertEqual({jobID for jobID, _, _ in updatedJobs}, jobIDs)
+
+    def testNoBackfillAfterDelay(self):
+        """
+        A job that has waited for longer than maxBackfillDelay isn't overtaken.
+        """
+        self.batchSystem.maxBackfillDelay = 0
+        maxCores = self.batchSystem.maxCores
+        order = self._runInOrder([('sleep 2', maxCores / 2), ('true', maxCores),
+                                  ('true', maxCores / 2)])
+        self.assertEqual(order, [0, 1, 2])
+
+    @slow
+    def testSchedulingLatency(self):
+        """
+        Measure the time jobs spend waiting for free cores and the share of the cores that is
+        used while a queue of jobs of mixed sizes is worked off.
+        """
+        maxCores = self.batchSystem.maxCores
+        minCores = SingleMachineBatchSystem.minCores
+        numJobs = 200
+        jobs = {}
+        start = time.time()
+        for i in range(numJobs):
+            cores = maxCores if i % 20 == 0 else minCores * (1 + i % 3)
+            jobNode = JobNode(command='sleep 0.1', jobName='test%d' % i, unitName=None,
+                              jobStoreID=str(i), requirements=dict(defaultRequirements,
+                                                                   cores=cores, disk=1))
+            jobs[self.batchSystem.issueBatchJob(jobNode)] = (time.time(), cores)
+        waitTime = busyTime = 0.0
+        for _ in range(numJobs):
+            jobID, exitStatus, wallTime = self.batchSystem.getUpdatedBatchJob(maxWait=60)
+            self.assertEqual(exitStatus, 0)
+            issueTime, cores = jobs[jobID]
+            waitTime += time.time() - issueTime - wallTime
+            busyTime += cores * wallTime
+        makespan = time.time() - start
+        log.info('Ran %i jobs in %.2f s, jobs waited %.3f s on average, utilisation was %.0f%%',
+                 numJobs, makespan, waitTime / numJobs, 100 * busyTime / (maxCores * makespan))
+
+
+class WarmWorkerSingleMachineBatchSystemTest(ToilTest):
+    """
+    Tests running worker commands in the warm worker processes of the single-machine batch
+    system
+    """
+
+    def setUp(self):
+        super(WarmWorkerSingleMachineBatchSystemTest, self).setUp()
+        from toil.jobStores.fileJobStore import FileJobStore
+        path = self._getTestJobStorePath()
+        self.config = Config()
+        self.config.jobStore = 'file:%s' % path
+        self._configure(self.config)
+        self.jobStore = FileJobStore(path)
+        self.jobStore.initialize(self.config)
+        with self.jobStore.writeSharedFileStream('environment.pickle') as fileHandle:
+            pickle.dump(dict(os.environ), fileHandle, pickle.HIGHEST_PROTOCOL)
+        self.batchSystem = SingleMachineBatchSystem(config=self.config, maxCores=numCores,
+                                                    maxMemory=1e9, maxDisk=2001)
+
+    def tearDown(self):
+        self.batchSystem.shutdown()
+        self.jobStore.destroy()
+        super(WarmWorkerSingleMachineBatchSystemTest, self).tearDown()
+
+    def _configure(self, config):
+        config.warmWorkers = True
+        config.warmWorkerMaxJobs = 2
+
+    def _checkWorkers(self, numJobs):
+        # The fifth job ran in the third process, which is idle
+        self.assertEqual(len(self.batchSystem.idleWarmWorkers), 1)
+
+    def testRunJobs(self):
+        numJobs = 5
+        jobStoreIDs = []
+        jobNodes = []
+        for i in range(numJobs):
+            # A job without a command is deleted by the worker
+            jobGraph = self.jobStore.create(JobNode(command=None, jobName='test', unitName=None,
+                                                    jobStoreID=None,
+                                                    requirements=defaultRequirements))
+            jobStoreIDs.append(jobGraph.jobStoreID)
+            jobNodes.append(JobNode(command='_toil_worker test %s %s' % (self.config.jobStore,
+                                                                          jobGraph.jobStoreID),
+                                    jobName='test', unitName=None, jobStoreID=jobGraph.jobStoreID,
+                                    requirements=defaultRequirements))
+        for jobNode in jobNodes:
+            self.batchSystem.issueBatchJob(jobNode)
+            # Run the jobs one after another so that the worker processes are reused
+            jobID, exitStatus, wallTime = self.batchSystem.getUpdatedBatchJob(maxWait=60)
+            self.assertEqual(exitStatus, 0)
+        for jobStoreID in jobStoreIDs:
+            self.assertFalse(self.jobStore.exists(jobStoreID))
+        self._checkWorkers(numJobs)
+
+
+class ForkServerSingleMachineBatchSystemTest(WarmWorkerSingleMachineBatchSystemTest):
+    """
+    Tests forking worker commands from the fork server of the single-machine batch system
+    """
+
+    def _configure(self, config):
+        config.forkServer = True
+
+    def _checkWorkers(self, numJobs):
+        self.assertEqual(self.batchSystem.getCounters()['jobsLaunched'], numJobs)
+
+    def testKillJob(self):
+        jobGraph = self.jobStore.create(JobNode(command=None, jobName='test', unitName=None,
+                                                jobStoreID=None, requirements=defaultRequirements))
+        process = self.batchSystem.forkServer.spawn(['_toil_worker', 'test', self.config.jobStore,
+                                                      jobGraph.jobStoreID], dict(os.environ))
+        os.kill(process.pid, 9)
+        self.assertIn(process.wait(), (0, -9))
+
+
+class WarmWorkerFailureTest(ToilTest):
+    """
+    Tests that jobs are reported as failed when a warm worker can't be talked to
+    """
+
+    def testGarbledReply(self):
+        config = Config()
+        config.workflowID = 'test'
+        config.warmWorkers = True
+        batchSystem = SingleMachineBatchSystem(config=config, maxCores=numCores, maxMemory=1e9,
+                                               maxDisk=2001)
+        try:
+            with patch('toil.batchSystems.warmWorker.pickle') as mockPickle:
+                mockPickle.PickleError = pickle.PickleError
+                mockPickle.load.side_effect = pickle.UnpicklingError('truncated reply')
+                jobID = batchSystem.issueBatchJob(JobNode(command='_toil_worker test file:x 1',
+                                                          jobName='test', unitName=None,
+                                                          jobStoreID='1',
+                                                          requirements=defaultRequirements))
+                updatedJob = batchSystem.getUpdatedBatchJob(maxWait=60)
+            self.assertIsNotNone(updatedJob)
+            self.assertEqual(updatedJob[0], jobID)
+            self.assertNotEqual(updatedJob[1], 0)
+            # The worker process was discarded
+            self.assertEqual(batchSystem.idleWarmWorkers, [])
+        finally:
+            batchSystem.shutdown()
+
 
 @slow
 class MaxCoresSingleMachineBatchSystemTest(ToilTest):
@@ -661,6 +888,58 @@ class SlurmBatchSystemTest(hidden.AbstractGridEngineBatchSystemTest):
             os.unlink(f)
 
 
+class ArrayJobTest(ToilTest):
+    """
+    Tests submitting batches of jobs with the same requirements as array jobs to grid engines
+    """
+
+    def _createWorker(self):
+        from toil.batchSystems.slurm import SlurmBatchSystem
+
+        class Worker(SlurmBatchSystem.Worker):
+            def submitJob(self, subLine):
+                self.submissions.append(subLine)
+                return len(self.submissions)
+
+            def submitArrayJob(self, subLine, script):
+                self.submissions.append(subLine)
+                self.scripts.append(script)
+                return len(self.submissions)
+
+        worker = Worker(None, None, None, None, Expando(environment={}))
+        worker.submissions = []
+        worker.scripts = []
+        return worker
+
+    def testSubmitJobs(self):
+        worker = self._createWorker()
+        jobs = [(0, 1, 100, 'a'), (1, 2, 100, 'b'), (2, 1, 100, 'c'), (3, 1, 100, 'd')]
+        self.assertEqual(worker.submitJobs(jobs), [(1, 1), (2, None), (1, 2), (1, 3)])
+        self.assertEqual(len(worker.submissions), 2)
+        self.assertIn('--array=1-3', worker.submissions[0])
+        self.assertIn('--wrap=b', worker.submissions[1])
+        self.assertEqual(worker.scripts, [worker.arrayJobScript(['a', 'c', 'd'])])
+        worker.batchJobIDs = {0: (1, 2), 1: (2, None)}
+        self.assertEqual(worker.getBatchSystemID(0), '1_2')
+        self.assertEqual(worker.getBatchSystemID(1), '2')
+
+    def testArrayJobScript(self):
+        worker = self._createWorker()
+        script = worker.arrayJobScript(['echo a', 'echo b; exit 3'])
+        for task, output, exitStatus in ((1, b'a\n', 0), (2, b'b\n', 3), (3, b'', 1)):
+            process = subprocess.Popen(['sh', '-c', script],
+                                       env=dict(os.environ, SLURM_ARRAY_TASK_ID=str(task)),
+                                       stdout=subprocess.PIPE)
+            self.assertEqual(process.communicate()[0], output)
+            self.assertEqual(process.returncode, exitStatus)
+
+    def testMaxArrayTasks(self):
+        worker = self._createWorker()
+        worker.maxArrayTasks = 2
+        jobs = [(i, 1, 100, 'true') for i in range(5)]
+        self.assertEqual(worker.submitJobs(jobs), [(1, 1), (1, 2), (2, 1), (2, 2), (3, None)])
+
+
 @slow
 @needs_lsf
 class LSFBatchSystemTest(hidden.AbstractGridEngineBatchSystemTest):
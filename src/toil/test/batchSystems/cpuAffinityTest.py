@@ -0,0 +1,123 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import os
+import sys
+from unittest import skipIf
+
+from mock import patch
+
+from toil.batchSystems import cpuAffinity
+from toil.batchSystems.abstractBatchSystem import InsufficientSystemResources
+from toil.batchSystems.cpuAffinity import CpuAllocator, parseCpuList
+from toil.batchSystems.singleMachine import SingleMachineBatchSystem
+from toil.common import Config
+from toil.job import JobNode
+from toil.test import ToilTest
+
+
+class CpuAllocatorTest(ToilTest):
+    """Tests placing jobs on the CPUs of two NUMA nodes of four CPUs each."""
+
+    def setUp(self):
+        super(CpuAllocatorTest, self).setUp()
+        self.allocator = CpuAllocator([parseCpuList('0-3'), parseCpuList('4-7')], unitsPerCpu=10)
+
+    def testParseCpuList(self):
+        self.assertEqual(parseCpuList('0-2,5,7-8'), {0, 1, 2, 5, 7, 8})
+        self.assertEqual(parseCpuList(''), set())
+
+    def testFractionalJobsShareCpus(self):
+        first = self.allocator.allocate(5)
+        second = self.allocator.allocate(5)
+        self.assertEqual(first, second)
+        third = self.allocator.allocate(5)
+        self.assertNotEqual(set(third), set(first))
+        self.allocator.release(first)
+        self.assertEqual(self.allocator.allocate(5), first)
+
+    def testJobsStayOnOneNumaNode(self):
+        small = self.allocator.allocate(10)
+        # The node with the fewest idle CPUs that can hold a job is filled up first
+        large = self.allocator.allocate(30)
+        self.assertEqual(set(small) | set(large), {0, 1, 2, 3})
+        other = self.allocator.allocate(30)
+        self.assertEqual(set(other), {4, 5, 6})
+        self.assertEqual(self.allocator.allocate(20), None)
+        # A job that fits on no single node spans several
+        self.allocator.release(small)
+        spanning = self.allocator.allocate(20)
+        self.assertEqual(set(spanning), {0, 7})
+        self.assertEqual(self.allocator.numNumaNodes(spanning), 2)
+
+    def testFits(self):
+        self.assertTrue(self.allocator.fits(5))
+        self.assertTrue(self.allocator.fits(80))
+        self.assertFalse(self.allocator.fits(81))
+
+    def testFewerCpusThanMaxCores(self):
+        """
+        A process confined to fewer CPUs than the system has limits the cores of the batch
+        system, and jobs that could never be placed are rejected rather than waiting forever.
+        """
+        config = Config()
+        config.workflowID = 'test'
+        config.cpuAffinity = True
+        with patch.object(SingleMachineBatchSystem, 'numCores', 4), \
+                patch.object(cpuAffinity, 'isSupported', return_value=True), \
+                patch.object(cpuAffinity, 'readNumaNodes', return_value=[{0}, {2}]):
+            batchSystem = SingleMachineBatchSystem(config=config, maxCores=4, maxMemory=1e9,
+                                                   maxDisk=1000)
+        try:
+            self.assertEqual(batchSystem.maxCores, 2)
+            self.assertEqual(batchSystem.cpuAllocator.numCpus, 2)
+            self.assertRaises(InsufficientSystemResources, batchSystem.issueBatchJob,
+                              JobNode(command='true', jobName='test', unitName=None,
+                                      jobStoreID='1',
+                                      requirements=dict(memory=1, cores=3, disk=1,
+                                                        preemptable=False)))
+            self.assertEqual(batchSystem.getIssuedBatchJobIDs(), [])
+        finally:
+            batchSystem.shutdown()
+
+
+@skipIf(not cpuAffinity.isSupported(), 'Pinning processes to CPUs is not supported')
+class PinnedSingleMachineBatchSystemTest(ToilTest):
+    """Tests pinning the jobs of the single-machine batch system to CPUs."""
+
+    def testPinning(self):
+        config = Config()
+        config.workflowID = 'test'
+        config.cpuAffinity = True
+        batchSystem = SingleMachineBatchSystem(config=config, maxCores=1, maxMemory=1e9,
+                                               maxDisk=1000)
+        try:
+            path = os.path.join(self._createTempDir(), 'affinity')
+            command = ("%s -c \"import os; open('%s', 'w').write(' '.join(map(str, "
+                       "os.sched_getaffinity(0))))\"" % (sys.executable, path))
+            batchSystem.issueBatchJob(JobNode(command=command, jobName='test', unitName=None,
+                                              jobStoreID='1',
+                                              requirements=dict(memory=1, cores=0.5, disk=1,
+                                                                preemptable=False)))
+            jobID, exitStatus, wallTime = batchSystem.getUpdatedBatchJob(maxWait=60)
+            self.assertEqual(exitStatus, 0)
+            with open(path) as f:
+                self.assertEqual(len(f.read().split()), 1)
+            self.assertEqual(batchSystem.getCounters()['jobsPinned'], 1)
+        finally:
+            batchSystem.shutdown()
+        # The CPU was released once the job's thread ended
+        self.assertEqual(sum(batchSystem.cpuAllocator.freeUnits.values()),
+                         10 * len(batchSystem.cpuAllocator.freeUnits))
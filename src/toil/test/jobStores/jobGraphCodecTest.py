@@ -0,0 +1,187 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from builtins import int, range, str
+import logging
+import marshal
+import pickle
+import timeit
+
+from toil.fileStore import FileID
+from toil.job import JobNode, ServiceJobNode
+from toil.jobGraph import JobGraph
+from toil.jobStores.jobGraphCodec import (decodeJobGraph, encodeJobGraph, formatVersion, magic,
+                                          _header)
+from toil.test import ToilTest, slow
+
+logger = logging.getLogger(__name__)
+
+
+class JobGraphCodecTest(ToilTest):
+    """Tests the serialisation of job graphs shared by the job stores."""
+
+    def _createJobGraph(self, successors=1):
+        jobGraph = JobGraph(command='_toil job', memory=2 ** 30, cores=1, disk=2 ** 30,
+                            preemptable=True, jobStoreID='job', remainingRetryCount=3,
+                            predecessorNumber=1, jobName='JobGraph', unitName='someUnit')
+        jobGraph.filesToDelete = ['file1', 'file2']
+        jobGraph.logJobStoreFileID = 'log'
+        jobGraph.chainedJobs = ['chained']
+        jobGraph.stack = [[JobNode(requirements=dict(memory=2 ** 20, cores=0.5, disk=2 ** 20,
+                                                     preemptable=False),
+                                   jobName='ChildJob', unitName=None, jobStoreID='child%i' % i,
+                                   command='_toil child%i' % i, predecessorNumber=2)
+                           for i in range(successors)], []]
+        return jobGraph
+
+    def _assertEqualJobGraphs(self, decoded, jobGraph):
+        self.assertEquals(decoded, jobGraph)
+        self.assertEquals(type(decoded), type(jobGraph))
+        for decodedNodes, jobNodes in zip(decoded.stack + decoded.services,
+                                          jobGraph.stack + jobGraph.services):
+            self.assertEquals(list(decodedNodes), list(jobNodes))
+            self.assertEquals([type(jobNode) for jobNode in decodedNodes],
+                              [type(jobNode) for jobNode in jobNodes])
+
+    def testRoundTrip(self):
+        for successors in 0, 1, 100:
+            jobGraph = self._createJobGraph(successors)
+            jobGraph.services = [[ServiceJobNode(jobStoreID='service', memory=10, cores=1, disk=10,
+                                                 preemptable=False, startJobStoreID='start',
+                                                 terminateJobStoreID='terminate',
+                                                 errorJobStoreID='error', unitName=None,
+                                                 jobName='Service', command='_toil service',
+                                                 predecessorNumber=1)]]
+            for compress in False, True:
+                data = encodeJobGraph(jobGraph, compress=compress)
+                self.assertTrue(data.startswith(magic))
+                decoded = decodeJobGraph(data)
+                self._assertEqualJobGraphs(decoded, jobGraph)
+                # Names are shared with the job graphs of jobs of the same name
+                self.assertTrue(decoded.jobName is jobGraph.jobName)
+                self.assertTrue(isinstance(decoded.stack[0], tuple))
+        # Only payloads large enough are compressed
+        self.assertEquals(_header.unpack_from(encodeJobGraph(self._createJobGraph(0), True))[2], 0)
+        self.assertEquals(_header.unpack_from(encodeJobGraph(self._createJobGraph(100), True))[2],
+                          1)
+
+    def testSubclass(self):
+        class SubJobGraph(JobGraph):
+            __slots__ = ()
+
+        jobGraph = self._createJobGraph()
+        decoded = decodeJobGraph(encodeJobGraph(jobGraph), cls=SubJobGraph)
+        self.assertEquals(type(decoded), SubJobGraph)
+        self.assertEquals(decoded.command, jobGraph.command)
+        self.assertEquals(decoded.stack[0][0], jobGraph.stack[0][0])
+
+    def testPickleFallback(self):
+        """
+        Tests that job graphs holding things the format can't represent are pickled, and that job
+        graphs pickled by earlier versions are decoded.
+        """
+        jobGraph = self._createJobGraph()
+        self._assertEqualJobGraphs(
+            decodeJobGraph(pickle.dumps(jobGraph, pickle.HIGHEST_PROTOCOL)), jobGraph)
+        self._assertEqualJobGraphs(decodeJobGraph(pickle.dumps(jobGraph, 0)), jobGraph)
+        jobGraph.stack[0].append(self._createJobGraph())
+        data = encodeJobGraph(jobGraph)
+        self.assertFalse(data.startswith(magic))
+        self._assertEqualJobGraphs(decodeJobGraph(data), jobGraph)
+        jobGraph = self._createJobGraph()
+        jobGraph.filesToDelete = [object]
+        self.assertFalse(encodeJobGraph(jobGraph).startswith(magic))
+
+    def testFutureTypes(self):
+        """
+        Tests that the str and int of the future package, which are not the native types on
+        Python 2, are encoded as their native types.
+        """
+        jobGraph = JobGraph(command=str('_toil job'), memory=2 ** 30, cores=1, disk=2 ** 30,
+                            preemptable=True, jobStoreID=str('d'), remainingRetryCount=3,
+                            predecessorNumber=1, jobName=str('d'), unitName=str('someUnit'))
+        # Requirements are checked to be of the native types, other fields aren't
+        jobGraph._memory = int(2 ** 30)
+        jobGraph.remainingRetryCount = int(3)
+        jobGraph.filesToDelete = [str('file1')]
+        child = JobNode(requirements=dict(memory=2 ** 20, cores=1, disk=1, preemptable=False),
+                        jobName=str('child'), unitName=None, jobStoreID=str('child'),
+                        command=str('_toil child'), predecessorNumber=int(1))
+        child._memory = int(2 ** 20)
+        jobGraph.stack = [[child]]
+        data = encodeJobGraph(jobGraph)
+        self.assertTrue(data.startswith(magic))
+        decoded = decodeJobGraph(data)
+        self.assertEquals('d', decoded.jobName)
+        self.assertEquals('d', decoded.jobStoreID)
+        self.assertEquals('_toil job', decoded.command)
+        self.assertEquals(['file1'], decoded.filesToDelete)
+        self.assertEquals('_toil child', decoded.stack[0][0].command)
+        self.assertEquals(2 ** 30, decoded.memory)
+        self.assertEquals(3, decoded.remainingRetryCount)
+        self.assertEquals(2 ** 20, decoded.stack[0][0].memory)
+
+    def testStringSubclass(self):
+        """
+        Tests that job graphs holding subclasses of strings are pickled.
+        """
+        jobGraph = self._createJobGraph()
+        jobGraph.filesToDelete = [FileID('file1', 0)]
+        data = encodeJobGraph(jobGraph)
+        self.assertFalse(data.startswith(magic))
+        filesToDelete = decodeJobGraph(data).filesToDelete
+        self.assertEquals(['file1'], filesToDelete)
+        self.assertTrue(isinstance(filesToDelete[0], FileID))
+
+    def testEarlierVersion(self):
+        """
+        Tests that job graphs written before fields were added to the format are decoded.
+        """
+        jobGraph = self._createJobGraph()
+        jobGraph.pickledJob = b'job'
+        self.assertEquals(decodeJobGraph(encodeJobGraph(jobGraph)).pickledJob, b'job')
+        values = marshal.loads(encodeJobGraph(jobGraph)[_header.size:])
+        # Version 1 lacked pickledJob
+        data = _header.pack(magic, 1, 0) + marshal.dumps(values[:-1], 2)
+        decoded = decodeJobGraph(data)
+        self.assertEquals(decoded.pickledJob, None)
+        self.assertEquals(decoded.command, jobGraph.command)
+
+    def testNewerVersion(self):
+        data = encodeJobGraph(self._createJobGraph())
+        data = _header.pack(magic, formatVersion + 1, 0) + data[_header.size:]
+        self.assertRaises(RuntimeError, decodeJobGraph, data)
+
+    @slow
+    def testSpeed(self):
+        """
+        Compares the time taken to encode and decode job graphs to that of pickling them.
+        """
+        for successors in 0, 10, 1000:
+            jobGraph = self._createJobGraph(successors)
+            encoded = encodeJobGraph(jobGraph)
+            pickled = pickle.dumps(jobGraph, pickle.HIGHEST_PROTOCOL)
+            number = 100000 // (successors + 10)
+            times = [min(timeit.repeat(f, number=number, repeat=3)) for f in (
+                lambda: encodeJobGraph(jobGraph),
+                lambda: pickle.dumps(jobGraph, pickle.HIGHEST_PROTOCOL),
+                lambda: decodeJobGraph(encoded),
+                lambda: pickle.loads(pickled))]
+            logger.info('Job graph with %i successors: encoded in %.1f us (pickled in %.1f us), '
+                        'decoded in %.1f us (unpickled in %.1f us), %i bytes (%i bytes pickled, '
+                        '%i bytes compressed)', successors,
+                        *([t / number * 1e6 for t in times] +
+                          [len(encoded), len(pickled), len(encodeJobGraph(jobGraph, True))]))
+            self.assertLess(len(encoded), len(pickled))
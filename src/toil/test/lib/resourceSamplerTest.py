@@ -0,0 +1,96 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import os
+import sys
+import threading
+import time
+
+from toil import subprocess
+from toil.job import Job
+from toil.lib.expando import Expando, MagicExpando
+from toil.lib.resourceSampler import ResourceSampler, sampleProcessTree
+from toil.test import ToilTest
+from toil.utils.toilStats import collateResourceUsage, sprintResourceUsage
+
+
+class ResourceSamplerTest(ToilTest):
+    """Tests sampling the resources used by a job and summarising them in toil stats."""
+
+    def testSampleProcessTree(self):
+        rss, cpuTime = sampleProcessTree()
+        child = subprocess.Popen([sys.executable, '-c',
+                                  'x = bytearray(64 * 1024 * 1024); import time; time.sleep(5)'])
+        try:
+            time.sleep(2)
+            childRss, childCpuTime = sampleProcessTree()
+        finally:
+            child.kill()
+            child.wait()
+        if os.path.exists('/proc/%i/task/%i/children' % (os.getpid(), os.getpid())):
+            # The child's memory is included
+            self.assertGreater(childRss, rss + 32 * 1024 * 1024)
+        self.assertGreaterEqual(childCpuTime, cpuTime)
+
+    def testSampler(self):
+        directory = self._createTempDir()
+        sampler = ResourceSampler(0.05, lambda: directory).start()
+        with open(os.path.join(directory, 'data'), 'wb') as f:
+            f.write(os.urandom(1024 * 1024))
+        end = time.time() + 0.5
+        while time.time() < end:
+            pass
+        sampler.stop()
+        summary = sampler.summary()
+        self.assertGreater(sampler.samples, 1)
+        self.assertGreaterEqual(summary['peak_memory'], summary['average_memory'])
+        self.assertGreater(summary['average_cores'], 0.1)
+        self.assertGreaterEqual(summary['peak_disk'], 1024 * 1024)
+
+    def testSamplerStoppedOnFailure(self):
+        directory = self._createTempDir()
+        fileStore = Expando(jobStore=Expando(config=Expando(statsSampleInterval=0.05)),
+                            localTempDir=directory)
+        threads = threading.active_count()
+        with self.assertRaises(RuntimeError):
+            with Job()._executor(jobGraph=None, stats=MagicExpando(), fileStore=fileStore):
+                self.assertEqual(threading.active_count(), threads + 1)
+                raise RuntimeError('The job failed')
+        self.assertEqual(threading.active_count(), threads)
+
+    def testCollateResourceUsage(self):
+        def job(name, **sampled):
+            return Expando(class_name=name, time='2', clock='1', memory='1024',
+                           requested_memory=2 ** 30, requested_cores=2, requested_disk=2 ** 30,
+                           jobstore_read=10, jobstore_written=20, **sampled)
+
+        usage = collateResourceUsage([
+            job('A', peak_memory=300, average_memory=100, average_cores=0.5, peak_cores=1.0,
+                peak_disk=5),
+            job('A', peak_memory=500, average_memory=300, average_cores=1.5, peak_cores=2.0,
+                peak_disk=7),
+            job('B'),
+            Expando(class_name='C', time='1', clock='1', memory='1')])
+        self.assertEqual(sorted(usage.keys()), ['A', 'B'])
+        self.assertEqual(usage.A.count, 2)
+        self.assertEqual(usage.A.peak_memory, 500)
+        self.assertEqual(usage.A.average_memory, 200)
+        self.assertEqual(usage.A.average_cores, 1.0)
+        self.assertEqual(usage.A.peak_disk, 7)
+        self.assertEqual(usage.A.jobstore_written, 40)
+        # Jobs without samples fall back on the peak RSS and CPU time of the worker
+        self.assertEqual(usage.B.peak_memory, 1024 * 1024)
+        self.assertEqual(usage.B.average_cores, 0.5)
+        self.assertIn('Requested vs used', sprintResourceUsage(usage, Expando(pretty=True)))
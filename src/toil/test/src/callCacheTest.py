@@ -0,0 +1,130 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from toil.common import Config
+from toil.fileStore import FileID, NonCachingFileStore
+from toil.job import Job, Promise
+from toil.jobStores.fileJobStore import FileJobStore
+from toil.test import ToilTest
+
+
+class CallCacheTest(ToilTest):
+    """
+    Tests skipping memoised jobs whose return values are in the call cache.
+    """
+
+    def setUp(self):
+        super(CallCacheTest, self).setUp()
+        self.cacheDir = self._createTempDir()
+        CountingJob.runs = 0
+
+    def tearDown(self):
+        Promise._jobstore = None
+        super(CallCacheTest, self).tearDown()
+
+    def _createJobStore(self):
+        path = self._getTestJobStorePath()
+        jobStore = FileJobStore(path)
+        config = Config()
+        config.jobStore = 'file:%s' % path
+        config.callCache = self.cacheDir
+        jobStore.initialize(config)
+        return jobStore
+
+    def _writeFile(self, jobStore, content):
+        with jobStore.writeFileStream() as (f, fileID):
+            f.write(content)
+        return FileID(fileID, len(content))
+
+    def _runJob(self, job, jobStore):
+        """
+        Runs the job as a worker would, returning the value it promised.
+        """
+        job.prepareForPromiseRegistration(jobStore)
+        promiseArgs = job.registerPromise(())
+        jobGraph = job._serialiseFirstJob(jobStore)
+        job = Job._loadJob(jobGraph.command, jobStore)
+        fileStore = NonCachingFileStore(jobStore, jobGraph, self._createTempDir(), None)
+        job._runner(jobGraph=jobGraph, jobStore=jobStore, fileStore=fileStore)
+        Promise._jobstore = jobStore
+        return Promise._resolve(*promiseArgs)
+
+    def _readFile(self, jobStore, fileID):
+        with jobStore.readFileStream(fileID) as f:
+            return f.read()
+
+    def test(self):
+        jobStore = self._createJobStore()
+        value = self._runJob(CountingJob(self._writeFile(jobStore, b'input'), b'1'), jobStore)
+        self.assertEquals(1, CountingJob.runs)
+        self.assertEquals(b'1', value['suffix'])
+        self.assertEquals(b'input1', self._readFile(jobStore, value['file']))
+
+        # A later workflow with the same input skips the job, the output file is copied into its
+        # job store
+        jobStore = self._createJobStore()
+        value = self._runJob(CountingJob(self._writeFile(jobStore, b'input'), b'1'), jobStore)
+        self.assertEquals(1, CountingJob.runs)
+        self.assertEquals(b'1', value['suffix'])
+        self.assertEquals(b'input1', self._readFile(jobStore, value['file']))
+        self.assertEquals(6, value['file'].size)
+
+        # Changing the content of the input file or an attribute of the job runs it
+        self._runJob(CountingJob(self._writeFile(jobStore, b'other'), b'1'), jobStore)
+        self.assertEquals(2, CountingJob.runs)
+        value = self._runJob(CountingJob(self._writeFile(jobStore, b'input'), b'2'), jobStore)
+        self.assertEquals(3, CountingJob.runs)
+        self.assertEquals(b'input2', self._readFile(jobStore, value['file']))
+
+    def testNotMemoised(self):
+        jobStore = self._createJobStore()
+        for _ in range(2):
+            self._runJob(CountingJob(self._writeFile(jobStore, b'input'), b'1', memoise=False),
+                         jobStore)
+        self.assertEquals(2, CountingJob.runs)
+
+    def testSuccessors(self):
+        """
+        Tests that the return values of jobs that create successors are not cached.
+        """
+        jobStore = self._createJobStore()
+        for _ in range(2):
+            self._runJob(CountingJob(self._writeFile(jobStore, b'input'), b'1',
+                                     createChild=True), jobStore)
+        self.assertEquals(2, CountingJob.runs)
+
+
+class CountingJob(Job):
+    """
+    Appends a suffix to its input file, counting how often it ran.
+    """
+    runs = 0
+
+    def __init__(self, inputFileID, suffix, memoise=True, createChild=False):
+        Job.__init__(self, memoise=memoise)
+        self.inputFileID = inputFileID
+        self.suffix = suffix
+        self.createChild = createChild
+
+    def run(self, fileStore):
+        CountingJob.runs += 1
+        if self.createChild:
+            self.addChild(Job())
+        with fileStore.readGlobalFileStream(self.inputFileID) as f:
+            content = f.read() + self.suffix
+        with fileStore.writeGlobalFileStream() as (f, fileID):
+            f.write(content)
+        return {'file': FileID(fileID, len(content)), 'suffix': self.suffix}
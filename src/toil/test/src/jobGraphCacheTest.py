@@ -0,0 +1,130 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from builtins import range
+
+from toil.common import Config
+from toil.job import JobNode
+from toil.jobGraphCache import JobGraphCache
+from toil.jobStores.abstractJobStore import NoSuchJobException
+from toil.jobStores.fileJobStore import FileJobStore
+from toil.test import ToilTest
+
+
+class JobGraphCacheTest(ToilTest):
+    """Tests the leader's cache of job graphs."""
+    def setUp(self):
+        super(JobGraphCacheTest, self).setUp()
+        path = self._getTestJobStorePath()
+        self.jobStore = FileJobStore(path)
+        self.config = Config()
+        self.config.jobStore = 'file:%s' % path
+        self.jobStore.initialize(self.config)
+
+    def tearDown(self):
+        self.jobStore.destroy()
+        super(JobGraphCacheTest, self).tearDown()
+
+    def _createJobGraph(self):
+        jobNode = JobNode(requirements=dict(memory=1, cores=1, disk=1, preemptable=False),
+                          jobName='test', unitName=None, jobStoreID=None, command='foo')
+        return self.jobStore.create(jobNode)
+
+    def testHitsAndMisses(self):
+        cache = JobGraphCache(self.jobStore, maxSize=10)
+        jobGraph = self._createJobGraph()
+        self.assertEqual(cache.load(jobGraph.jobStoreID), jobGraph)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertIs(cache.load(jobGraph.jobStoreID), cache.load(jobGraph.jobStoreID))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertTrue(cache.exists(jobGraph.jobStoreID))
+
+    def testWriteThrough(self):
+        cache = JobGraphCache(self.jobStore, maxSize=10)
+        jobGraph = self._createJobGraph()
+        jobGraph.remainingRetryCount = 42
+        cache.update(jobGraph)
+        self.assertEqual(self.jobStore.load(jobGraph.jobStoreID).remainingRetryCount, 42)
+        self.assertIs(cache.load(jobGraph.jobStoreID), jobGraph)
+        self.assertEqual(cache.misses, 0)
+
+    def testIssuedJobsAreNotCached(self):
+        cache = JobGraphCache(self.jobStore, maxSize=10)
+        jobGraph = self._createJobGraph()
+        cache.load(jobGraph.jobStoreID)
+        cache.jobIssued(jobGraph.jobStoreID)
+        self.assertNotIn(jobGraph.jobStoreID, cache)
+        # A worker rewrites the job graph while the leader looks at it
+        cache.load(jobGraph.jobStoreID)
+        self.assertNotIn(jobGraph.jobStoreID, cache)
+        workerCopy = self.jobStore.load(jobGraph.jobStoreID)
+        workerCopy.command = None
+        self.jobStore.update(workerCopy)
+        cache.jobFinished(jobGraph.jobStoreID)
+        # The rewritten job graph is loaded once, and then served from the cache
+        self.assertIsNone(cache.load(jobGraph.jobStoreID).command)
+        misses = cache.misses
+        self.assertIsNone(cache.load(jobGraph.jobStoreID).command)
+        self.assertEqual(cache.misses, misses)
+
+    def testBoundedSize(self):
+        cache = JobGraphCache(self.jobStore, maxSize=3)
+        jobGraphs = [self._createJobGraph() for _ in range(5)]
+        for jobGraph in jobGraphs:
+            cache.load(jobGraph.jobStoreID)
+        # Touch the oldest remaining entry so that it is not evicted next
+        cache.load(jobGraphs[2].jobStoreID)
+        cache.load(jobGraphs[0].jobStoreID)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual({jobGraph.jobStoreID for jobGraph in jobGraphs if jobGraph.jobStoreID in cache},
+                         {jobGraphs[0].jobStoreID, jobGraphs[2].jobStoreID, jobGraphs[4].jobStoreID})
+
+    def testDisabled(self):
+        cache = JobGraphCache(self.jobStore, maxSize=0)
+        jobGraph = self._createJobGraph()
+        cache.load(jobGraph.jobStoreID)
+        cache.load(jobGraph.jobStoreID)
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 2))
+
+    def testPrefetch(self):
+        cache = JobGraphCache(self.jobStore, maxSize=10, numIOThreads=4)
+        jobGraphs = [self._createJobGraph() for _ in range(5)]
+        self.jobStore.delete(jobGraphs[0].jobStoreID)
+        cache.prefetch([jobGraph.jobStoreID for jobGraph in jobGraphs])
+        self.assertFalse(cache.exists(jobGraphs[0].jobStoreID))
+        self.assertRaises(NoSuchJobException, cache.load, jobGraphs[0].jobStoreID)
+        for jobGraph in jobGraphs[1:]:
+            self.assertEqual(cache.load(jobGraph.jobStoreID), jobGraph)
+        cache.shutdown()
+
+    def testWritesAreOrdered(self):
+        # Without caching, loads must still see earlier updates that are still being written
+        cache = JobGraphCache(self.jobStore, maxSize=0, numIOThreads=4)
+        jobGraph = self._createJobGraph()
+        for i in range(10):
+            jobGraph.remainingRetryCount = i
+            cache.update(jobGraph)
+            self.assertEqual(cache.load(jobGraph.jobStoreID).remainingRetryCount, i)
+        cache.jobIssued(jobGraph.jobStoreID)
+        self.assertEqual(self.jobStore.load(jobGraph.jobStoreID).remainingRetryCount, 9)
+        cache.shutdown()
+
+    def testFailedWrite(self):
+        cache = JobGraphCache(self.jobStore, maxSize=10, numIOThreads=4)
+        jobGraph = self._createJobGraph()
+        self.jobStore.delete(jobGraph.jobStoreID)
+        cache.update(jobGraph)
+        # The file job store fails to write the job graph of a deleted job
+        self.assertRaises((IOError, OSError), cache.shutdown)
@@ -13,13 +13,25 @@
 # limitations under the License.
 
 from __future__ import absolute_import
+import copy
+import logging
 import os
+import pickle
 from argparse import ArgumentParser
+from unittest import skipIf
 from toil.common import Toil
-from toil.job import Job
-from toil.test import ToilTest
+from toil.job import Job, JobNode
+from toil.test import ToilTest, slow
 from toil.jobGraph import JobGraph
 
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+logger = logging.getLogger(__name__)
+
 class JobGraphTest(ToilTest):
     
     def setUp(self):
@@ -80,3 +92,61 @@ class JobGraphTest(ToilTest):
         self.assertNotEquals(j, j2)
         
         ###TODO test other functionality
+
+    def _createJobGraph(self, i):
+        jobGraph = JobGraph(command='_toil %i' % i, memory=2 ** 30, cores=1, disk=2 ** 30,
+                            preemptable=False, jobStoreID='job%i' % i, remainingRetryCount=1,
+                            predecessorNumber=1, jobName=''.join(['Job', 'Graph']),
+                            unitName=''.join(['some', 'Unit']))
+        jobGraph.stack = [[JobNode(requirements=dict(memory=2 ** 30, cores=1, disk=2 ** 30,
+                                                     preemptable=False),
+                                   jobName=''.join(['Child', 'Job']), unitName=None,
+                                   jobStoreID='child%i' % i, command='_toil child%i' % i)]]
+        return jobGraph
+
+    def testPickle(self):
+        """
+        Tests that job graphs survive pickling, and that job graphs pickled by versions that kept
+        their attributes in a __dict__ can be loaded.
+        """
+        j = self._createJobGraph(1)
+        self.assertFalse(hasattr(j, '__dict__'))
+        for loaded in pickle.loads(pickle.dumps(j, pickle.HIGHEST_PROTOCOL)), copy.deepcopy(j):
+            self.assertEquals(loaded, j)
+            self.assertEquals(loaded.stack[0][0], j.stack[0][0])
+            self.assertTrue(isinstance(loaded.stack[0], tuple))
+            # Names are shared between the job graphs of jobs with the same name
+            self.assertTrue(loaded.jobName is self._createJobGraph(2).jobName)
+            self.assertTrue(loaded.stack[0][0].jobName is j.stack[0][0].jobName)
+        # The state of earlier versions lacks criticalPathHint and may hold attributes that
+        # have since been removed
+        state = j.__getstate__()
+        del state['criticalPathHint']
+        state['removedAttribute'] = 1
+        old = JobGraph.__new__(JobGraph)
+        old.__setstate__(state)
+        self.assertEquals(old, j)
+        self.assertEquals(old.criticalPathHint, None)
+        self.assertFalse(hasattr(old, 'removedAttribute'))
+
+    @slow
+    @skipIf(tracemalloc is None, 'Requires tracemalloc')
+    def testMemoryUsage(self):
+        """
+        Measure the memory taken by a million job graphs loaded from the job store, each with one
+        successor, as the leader holds them.
+        """
+        numJobs = 1000000
+        pickles = [pickle.dumps(self._createJobGraph(i), pickle.HIGHEST_PROTOCOL)
+                   for i in range(numJobs)]
+        tracemalloc.start()
+        try:
+            jobGraphs = [pickle.loads(data) for data in pickles]
+            memory = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        logger.info('%i job graphs take %i bytes, %i bytes per job',
+                    len(jobGraphs), memory, memory // numJobs)
+        # Job graphs and job nodes without slots, or names that aren't shared between the job
+        # graphs, take more
+        self.assertLess(memory // numJobs, 1536)
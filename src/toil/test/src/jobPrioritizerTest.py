@@ -0,0 +1,96 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from mock import MagicMock
+
+from toil.common import Config
+from toil.job import JobNode
+from toil.jobPrioritizer import JobPrioritizer
+from toil.lib.expando import Expando
+from toil.provisioners.abstractProvisioner import Shape
+from toil.provisioners.clusterScaler import ClusterScaler
+from toil.test import ToilTest
+
+
+class JobPrioritizerTest(ToilTest):
+    """Tests the ordering of ready jobs by estimated critical-path length."""
+
+    def _jobNode(self, jobName, jobStoreID, criticalPathHint=None):
+        return JobNode(requirements=dict(memory=1, cores=1, disk=1, preemptable=False),
+                       jobName=jobName, unitName=None, jobStoreID=jobStoreID, command=None,
+                       criticalPathHint=criticalPathHint)
+
+    def testOrderPreservedWithoutHistory(self):
+        prioritizer = JobPrioritizer()
+        jobs = [self._jobNode('job%d' % i, str(i)) for i in range(5)]
+        self.assertEqual(prioritizer.prioritize(jobs), jobs)
+
+    def testRuntimeHistory(self):
+        prioritizer = JobPrioritizer()
+        prioritizer.addCompletedJob(self._jobNode('short', 'a'), 1)
+        prioritizer.addCompletedJob(self._jobNode('long', 'b'), 100)
+        prioritizer.addCompletedJob(self._jobNode('long', 'c'), 50)
+        short, long, unknown = (self._jobNode('short', '1'), self._jobNode('long', '2'),
+                                self._jobNode('unknown', '3'))
+        self.assertEqual(prioritizer.getCriticalPathEstimate(long), 75)
+        # Unknown jobs are estimated with the average over all jobs
+        self.assertAlmostEqual(prioritizer.getCriticalPathEstimate(unknown), 151 / 3.0)
+        self.assertEqual(prioritizer.prioritize([short, unknown, long]), [long, unknown, short])
+
+    def testSubtreeHistoryAndHints(self):
+        prioritizer = JobPrioritizer()
+        gate, leaf = self._jobNode('gate', 'a'), self._jobNode('leaf', 'b')
+        prioritizer.addCompletedJob(gate, 1)
+        prioritizer.addCompletedJob(leaf, 10)
+        # The gate job quickly spawns a long chain of successors
+        prioritizer.jobIssued(gate)
+        prioritizer.jobStoreIDToIssueTime[gate.jobStoreID] -= 1000
+        prioritizer.jobRemoved(gate)
+        self.assertEqual(prioritizer.jobStoreIDToIssueTime, {})
+        self.assertTrue(prioritizer.getCriticalPathEstimate(gate) >= 1000)
+        newGate, newLeaf = self._jobNode('gate', '1'), self._jobNode('leaf', '2')
+        self.assertEqual(prioritizer.prioritize([newLeaf, newGate]), [newGate, newLeaf])
+        # User hints take precedence over history
+        hinted = self._jobNode('leaf', '3', criticalPathHint=10000)
+        self.assertEqual(prioritizer.prioritize([newLeaf, newGate, hinted]),
+                         [hinted, newGate, newLeaf])
+
+    def testFailedJob(self):
+        prioritizer = JobPrioritizer()
+        job = self._jobNode('job', 'a')
+        prioritizer.jobIssued(job)
+        prioritizer.jobFailed(job.jobStoreID)
+        self.assertEqual(prioritizer.jobStoreIDToIssueTime, {})
+        # Its subtree never completed, so it isn't part of the history
+        self.assertEqual(prioritizer.subtreeRuntimes.get('job'), None)
+
+    def testSharedRuntimes(self):
+        """
+        A scaler given the prioritizer's runtimes estimates queued jobs from the wall times the
+        prioritizer has been told about.
+        """
+        prioritizer = JobPrioritizer()
+        provisioner = Expando(nodeTypes=['t2.micro'],
+                              nodeShapes=[Shape(wallTime=3600, memory=1024 ** 3, cores=1,
+                                                disk=8 * 1024 ** 3, preemptable=False)])
+        scaler = ClusterScaler(provisioner, MagicMock(), Config(), runtimes=prioritizer.runtimes)
+        self.assertEqual(scaler.getAverageRuntime('a'), 1.0)
+        jobNode = self._jobNode('a', '1')
+        prioritizer.addCompletedJob(jobNode, 10)
+        prioritizer.addCompletedJob(jobNode, 20)
+        self.assertEqual(scaler.getAverageRuntime('a'), prioritizer.getRuntimeEstimate(jobNode))
+        self.assertEqual(scaler.getAverageRuntime('a'), 15)
+        self.assertEqual(scaler.getAverageRuntime('b'), 15)
@@ -19,17 +19,21 @@ from builtins import str
 from builtins import range
 from past.utils import old_div
 import unittest
+import gc
 import logging
 import os
 import random
+import sys
+import time
 
 # Python 3 compatibility imports
 from six.moves import xrange
 
-from toil.common import Toil
+from toil.common import Config, Toil
 from toil.leader import FailedJobsException
 from toil.lib.bioio import getTempFile
 from toil.job import Job, JobGraphDeadlockException, JobFunctionWrappingJob
+from toil.jobStores.fileJobStore import FileJobStore
 from toil.test import ToilTest, slow
 
 logger = logging.getLogger(__name__)
@@ -270,6 +274,87 @@ class JobTest(ToilTest):
                 and (fNode, tNode) not in childEdges and (fNode, tNode) not in followOnEdges):
                 checkFollowOnEdgeCycleDetection(fNode, tNode)
 
+    @slow
+    def testDeadlockDetectionSpeed(self):
+        """
+        Times the checks of synthetic job graphs of 10^3 to 10^5 jobs, which must be linear in
+        the size of the graph and must not exceed the recursion limit.
+        """
+        # A check that is quadratic in the size of the graph would take 100 times as long for ten
+        # times as many jobs, a linear one about ten times as long
+        maxRatio = 30
+        def fanOut(n):
+            # Children of the root with follow-ons between some of them, which imply edges from
+            # all of the descendants of the root's children
+            root = Job()
+            followOn = root
+            for i in range(n // 2):
+                root.addChild(Job())
+                if i % 100 == 0:
+                    followOn = followOn.addFollowOn(Job())
+            return root, followOn
+
+        def chain(n):
+            # A chain of children alternating with follow-ons, much deeper than the recursion
+            # limit
+            root = job = Job()
+            for i in range(n - 1):
+                job = job.addChild(Job()) if i % 2 else job.addFollowOn(Job())
+            return root, job
+
+        def timeCheck(root):
+            # The best of several runs, without pauses for the garbage collector, which on Python
+            # 2 scans every one of the jobs allocated
+            gc.disable()
+            try:
+                times = []
+                for run in range(3):
+                    start = time.time()
+                    root.checkJobGraphForDeadlocks()
+                    times.append(time.time() - start)
+                return min(times)
+            finally:
+                gc.enable()
+
+        for makeGraph in fanOut, chain:
+            times = {}
+            for n in 10 ** 3, 10 ** 4, 10 ** 5:
+                root, last = makeGraph(n)
+                times[n] = timeCheck(root)
+                logger.info('Checked a %s of %i jobs in %.3f s', makeGraph.__name__, n, times[n])
+                # A follow-on edge back to the root creates a cycle
+                last.addFollowOn(root)
+                self.assertRaises(JobGraphDeadlockException, root.checkJobGraphAcylic,
+                                  {root})
+            # The smallest graphs are checked too quickly to time reliably
+            self.assertLess(times[10 ** 5], maxRatio * times[10 ** 4])
+
+    def testSerialiseDeepChain(self):
+        """
+        A chain of jobs much deeper than the recursion limit passes the deadlock check and is
+        serialised, in the order in which its jobs must run.
+        """
+        path = self._getTestJobStorePath()
+        jobStore = FileJobStore(path)
+        config = Config()
+        config.jobStore = 'file:%s' % path
+        jobStore.initialize(config)
+        try:
+            root = job = Job()
+            jobs = [root]
+            for i in range(3 * sys.getrecursionlimit()):
+                job = job.addChild(Job()) if i % 2 else job.addFollowOn(Job())
+                jobs.append(job)
+            self.assertEqual(root.getTopologicalOrderingOfJobs(), jobs)
+            jobGraph = root._serialiseFirstJob(jobStore)
+            self.assertEqual(len(list(jobStore.jobs())), len(jobs))
+            # The first follow-on is the only successor of the root
+            self.assertEqual([len(jobNodes) for jobNodes in jobGraph.stack], [1, 0])
+            successor = jobStore.load(jobGraph.stack[0][0].jobStoreID)
+            self.assertEqual([len(jobNodes) for jobNodes in successor.stack], [0, 1])
+        finally:
+            jobStore.destroy()
+
     @slow
     def testNewCheckpointIsLeafVertexNonRootCase(self):
         """
@@ -598,6 +683,71 @@ class JobTest(ToilTest):
 
         return jobs[0]
 
+    def testAddChildrenFrom(self):
+        """
+        Tests that children added with addChildrenFrom are serialised chunk by chunk along with
+        their successors.
+        """
+        jobStore = self._createJobStore()
+        produced = []
+        producedAtBatch = []
+        batch = jobStore.batch
+
+        def countingBatch():
+            producedAtBatch.append(len(produced))
+            return batch()
+
+        jobStore.batch = countingBatch
+
+        def children():
+            for i in range(25):
+                child = ValueJob(i)
+                child.addChild(ValueJob(-i))
+                produced.append(child)
+                yield child
+
+        root = Job()
+        root.addChild(Job())
+        root.addChildrenFrom(children(), chunkSize=10)
+        # Nothing is produced until the job is serialised
+        self.assertEquals([], produced)
+        rootJobGraph = root._serialiseFirstJob(jobStore)
+        # Each chunk is produced once the previous one was written
+        self.assertEquals([0, 10, 20, 25, 25], producedAtBatch)
+        childNodes = rootJobGraph.stack[-1]
+        self.assertEquals(26, len(childNodes))
+        values = []
+        for childNode in childNodes[1:]:
+            self.assertEquals(1, childNode.predecessorNumber)
+            childJobGraph = jobStore.load(childNode.jobStoreID)
+            child = Job._loadJob(childJobGraph.command, jobStore, childJobGraph.pickledJob)
+            grandChildNode, = childJobGraph.stack[-1]
+            grandChildJobGraph = jobStore.load(grandChildNode.jobStoreID)
+            grandChild = Job._loadJob(grandChildJobGraph.command, jobStore,
+                                      grandChildJobGraph.pickledJob)
+            self.assertEquals(-child.value, grandChild.value)
+            values.append(child.value)
+        self.assertEquals(list(range(25)), values)
+
+    def testAddChildrenFromWithPredecessor(self):
+        """
+        Tests that a job that already has a predecessor can't be added with addChildrenFrom.
+        """
+        jobStore = self._createJobStore()
+        root = Job()
+        child = root.addChild(Job())
+        root.addChildrenFrom([child])
+        self.assertRaises(JobGraphDeadlockException, root._serialiseFirstJob, jobStore)
+        self.assertRaises(ValueError, root.addChildrenFrom, [], chunkSize=0)
+
+    def _createJobStore(self):
+        path = self._getTestJobStorePath()
+        jobStore = FileJobStore(path)
+        config = Config()
+        config.jobStore = 'file:%s' % path
+        jobStore.initialize(config)
+        return jobStore
+
     def isAcyclic(self, adjacencyList):
         """
         Returns true if there are any cycles in the graph, which is represented as an adjacency
@@ -689,6 +839,12 @@ def errorChild(job):
     raise RuntimeError('Child failure')
 
 
+class ValueJob(Job):
+    def __init__(self, value):
+        Job.__init__(self)
+        self.value = value
+
+
 class TrivialService(Job.Service):
     def __init__(self, message, *args, **kwargs):
         """ Service that does nothing, used to check for deadlocks
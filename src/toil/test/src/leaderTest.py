@@ -0,0 +1,296 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from builtins import range
+import logging
+import time
+
+from toil.common import Config, Toil
+from toil.job import Job, JobBundle, JobNode
+from toil.jobGraphCache import JobGraphCache
+from toil.jobPrioritizer import JobPrioritizer
+from toil.leader import Leader
+from toil.lib.expando import Expando
+from toil.jobStores.fileJobStore import FileJobStore
+from toil.stateJournal import StateJournal
+from toil.statsAndLogging import LeaderStats
+from toil.test import ToilTest, slow
+from toil.utils.toilStats import getStats, collateLeaderStats, sprintLeader
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderTest(ToilTest):
+    """Tests and benchmarks of the leader's main loop."""
+
+    def _runFanOut(self, numChildren, **options):
+        """
+        Run a workflow whose root job has numChildren trivial children and return the leader's
+        throughput in jobs per second and the number of iterations of its main loop.
+        """
+        jobStoreLocator = self._getTestJobStorePath()
+        opts = Job.Runner.getDefaultOptions(jobStoreLocator)
+        opts.clean = 'never'
+        opts.logLevel = 'WARNING'
+        opts.stats = True
+        for name, value in options.items():
+            setattr(opts, name, value)
+        start = time.time()
+        Job.Runner.startToil(FanOutJob(numChildren), opts)
+        throughput = (numChildren + 1) / (time.time() - start)
+        jobStore = Toil.resumeJobStore(jobStoreLocator)
+        try:
+            return throughput, collateLeaderStats(getStats(jobStore).leader).iterations
+        finally:
+            jobStore.destroy()
+
+    @slow
+    def testUpdatedJobBatchingThroughput(self):
+        """
+        Compare leader throughput when collecting one finished job per iteration of the main loop
+        with collecting every available finished job. The timings are only logged, as they
+        depend on the load of the machine.
+        """
+        numChildren = 500
+        unbatched, unbatchedIterations = self._runFanOut(numChildren, maxUpdatedJobsPerLoop=1)
+        batched, batchedIterations = self._runFanOut(numChildren)
+        logger.info('Leader throughput for %i jobs: %.1f jobs/s in %i iterations collecting one '
+                    'update per iteration, %.1f jobs/s in %i iterations collecting batches of '
+                    'updates', numChildren + 1, unbatched, unbatchedIterations, batched,
+                    batchedIterations)
+        # Every job takes an iteration of its own to be collected
+        self.assertGreaterEqual(unbatchedIterations, numChildren + 1)
+        self.assertGreater(batchedIterations, 0)
+
+    def testLeaderStats(self):
+        """
+        The timings of the leader's main loop are written to the stats stream and summed up by
+        `toil stats`.
+        """
+        path = self._getTestJobStorePath()
+        jobStore = FileJobStore(path)
+        config = Config()
+        config.jobStore = 'file:%s' % path
+        config.stats = True
+        jobStore.initialize(config)
+        try:
+            leaderStats = LeaderStats(jobStore, config)
+            hits = 0
+            for report in range(2):
+                for i in range(5):
+                    start = t = leaderStats.now()
+                    t = leaderStats.phase('processReadyJobs', t)
+                    time.sleep(0.01)
+                    leaderStats.phase('getUpdatedBatchJobs', t)
+                    hits += 2
+                    # Queues that stay empty are reported too
+                    leaderStats.iteration(start, queueDepths=dict(issuedJobs=i,
+                                                                  jobsIssuedToServiceManager=0),
+                                          counters=dict(jobGraphCacheHits=hits,
+                                                        jobsLaunched=hits, launchTime=0.0))
+                leaderStats.report()
+            # Nothing happened since the last report
+            leaderStats.report()
+
+            leader = collateLeaderStats(getStats(jobStore).leader)
+            self.assertEqual(leader.iterations, 10)
+            self.assertEqual(leader.phases.processReadyJobs.count, 10)
+            self.assertGreaterEqual(leader.phases.getUpdatedBatchJobs.time, 0.1)
+            self.assertEqual(sum(leader.latency.counts), 10)
+            self.assertEqual(leader.queues.issuedJobs.max, 4)
+            self.assertEqual(leader.queues.issuedJobs.average, 2)
+            self.assertEqual(leader.queues.jobsIssuedToServiceManager.max, 0)
+            self.assertEqual(leader.counters.jobGraphCacheHits, 20)
+            summary = sprintLeader(leader, Expando(pretty=False))
+            self.assertIn('getUpdatedBatchJobs', summary)
+            self.assertIn('Launch rate', summary)
+        finally:
+            jobStore.destroy()
+
+    def testLeaderStatsWorkflow(self):
+        """
+        A workflow without services completes with stats enabled, and the leader's stats are
+        reported at its end.
+        """
+        jobStoreLocator = self._getTestJobStorePath()
+        opts = Job.Runner.getDefaultOptions(jobStoreLocator)
+        opts.clean = 'never'
+        opts.logLevel = 'WARNING'
+        opts.stats = True
+        Job.Runner.startToil(FanOutJob(1), opts)
+        jobStore = Toil.resumeJobStore(jobStoreLocator)
+        try:
+            leader = collateLeaderStats(getStats(jobStore).leader)
+            self.assertGreater(leader.iterations, 0)
+            self.assertEqual(leader.queues.jobsIssuedToServiceManager.max, 0)
+        finally:
+            jobStore.destroy()
+
+    def testDeadlockCheckIsIncremental(self):
+        """
+        The batch system is only asked for the running jobs while service jobs are issued and
+        no jobs are updated, and then at most once per deadlockCheckInterval.
+        """
+        calls = []
+
+        def getRunningBatchJobIDs():
+            calls.append(None)
+            return {}
+
+        leader = Leader.__new__(Leader)
+        leader.config = Expando(deadlockCheckInterval=3600, deadlockWait=60)
+        leader.batchSystem = Expando(getRunningBatchJobIDs=getRunningBatchJobIDs)
+        leader.toilState = Expando(updatedJobs={'updated'})
+        leader.serviceJobsIssued = leader.preemptableServiceJobsIssued = 0
+        leader.potentialDeadlockedJobs = set()
+        leader.potentialDeadlockTime = 0
+        leader.timeDeadlocksLastChecked = 0
+        leader.checkForDeadlocks()
+        leader.serviceJobsIssued = 1
+        leader.checkForDeadlocks()
+        self.assertEqual(len(calls), 0)
+        leader.toilState.updatedJobs = set()
+        for i in range(3):
+            leader.checkForDeadlocks()
+        self.assertEqual(len(calls), 1)
+
+    def testBundleJobs(self):
+        """
+        Short jobs with the same requirements are bundled up to the maximum number of jobs and
+        the maximum estimated runtime of a bundle, other jobs are issued on their own.
+        """
+        def jobNode(jobStoreID, jobName='short', memory=1, command='_toil'):
+            return JobNode(requirements=dict(memory=memory, cores=1, disk=1, preemptable=False),
+                           jobName=jobName, unitName=None, jobStoreID=jobStoreID,
+                           command=command)
+
+        leader = Leader.__new__(Leader)
+        leader.config = Expando(maxJobsPerBundle=3, maxBundleRuntime=10)
+        leader.jobPrioritizer = JobPrioritizer()
+        leader.jobPrioritizer.addCompletedJob(jobNode('0'), 2)
+        leader.jobPrioritizer.addCompletedJob(jobNode('0', jobName='medium'), 6)
+        leader.jobPrioritizer.addCompletedJob(jobNode('0', jobName='long'), 20)
+        jobs = leader._bundleJobs([jobNode('1'), jobNode('2', jobName='long'),
+                                   jobNode('3', memory=2), jobNode('4'), jobNode('5'),
+                                   jobNode('6'), jobNode('7', jobName='medium'),
+                                   jobNode('8', jobName='new'), jobNode('9', memory=2),
+                                   jobNode('10', command=None)])
+        self.assertEqual([[jobNode.jobStoreID for jobNode in Leader._bundledJobs(job)]
+                          for job in jobs],
+                         [['1', '4', '5'], ['2'], ['3', '9'], ['6', '7'], ['8'], ['10']])
+        self.assertTrue(isinstance(jobs[0], JobBundle))
+        self.assertFalse(isinstance(jobs[1], JobBundle))
+        self.assertEqual(jobs[0].jobStoreID, '1')
+
+    def testKilledBundle(self):
+        """
+        When a bundle is killed while running one of its jobs, only that job loses a retry. The
+        jobs that ran before it are processed as completed and those after it are issued again.
+        """
+        path = self._getTestJobStorePath()
+        jobStore = FileJobStore(path)
+        config = Config()
+        config.jobStore = 'file:%s' % path
+        jobStore.initialize(config)
+        try:
+            jobGraphs = [jobStore.create(JobNode(
+                requirements=dict(memory=1, cores=1, disk=1, preemptable=False),
+                jobName='short', unitName=None, jobStoreID=None, command='_toil',
+                predecessorNumber=1)) for i in range(4)]
+            for jobGraph in jobGraphs:
+                jobGraph.remainingRetryCount = 1
+                jobStore.update(jobGraph)
+            bundle = JobBundle([JobNode.fromJobGraph(jobGraph) for jobGraph in jobGraphs])
+            # The worker completed the first job and was killed while running the second
+            jobGraphs[0].command = None
+            jobStore.update(jobGraphs[0])
+
+            reissued = []
+            leader = Leader.__new__(Leader)
+            leader.config = config
+            leader.jobStore = jobStore
+            leader.jobGraphCache = JobGraphCache(jobStore, 10)
+            leader.stateJournal = StateJournal(jobStore, 0)
+            leader.jobPrioritizer = JobPrioritizer()
+            leader.clusterScaler = None
+            leader.resourceProfile = None
+            leader.toilState = Expando(updatedJobs=set(), hasFailedSuccessors=set(),
+                                       serviceJobStoreIDToPredecessorJob={})
+            leader.preemptableJobsIssued = 0
+            leader.jobBatchSystemIDToIssuedJob = {1: bundle}
+            leader.issueJobs = reissued.extend
+            leader.processFinishedJob(1, 137, wallTime=4)
+
+            self.assertEqual([jobNode.jobStoreID for jobNode in reissued],
+                             [jobGraph.jobStoreID for jobGraph in jobGraphs[2:]])
+            updatedJobs = {jobGraph.jobStoreID: (jobGraph, resultStatus)
+                           for jobGraph, resultStatus in leader.toilState.updatedJobs}
+            self.assertEqual(sorted(updatedJobs),
+                             sorted(jobGraph.jobStoreID for jobGraph in jobGraphs[:2]))
+            completedJob, resultStatus = updatedJobs[jobGraphs[0].jobStoreID]
+            self.assertEqual((completedJob.remainingRetryCount, resultStatus), (1, 0))
+            killedJob, resultStatus = updatedJobs[jobGraphs[1].jobStoreID]
+            self.assertEqual((killedJob.remainingRetryCount, resultStatus), (0, 137))
+            leader.jobGraphCache.shutdown()
+            for jobGraph in jobGraphs[2:]:
+                self.assertEqual(jobStore.load(jobGraph.jobStoreID).remainingRetryCount, 1)
+        finally:
+            jobStore.destroy()
+
+    def testShutdownAfterMainLoopFailure(self):
+        """
+        When the main loop fails, failures to write the last updates of job graphs and the last
+        snapshot are logged and the failure of the main loop is raised. Otherwise they are raised.
+        """
+        def fail(exception):
+            def f():
+                raise exception
+            return f
+
+        shutdowns = []
+        leader = Leader.__new__(Leader)
+        leader.config = Expando(metrics=False, resourceProfile=None)
+        leader.resourceProfile = leader.clusterScaler = leader.toilMetrics = None
+        leader.statsAndLogging = Expando(start=lambda: None, shutdown=lambda: None)
+        leader.serviceManager = Expando(start=lambda: None, shutdown=lambda: None)
+        leader.jobGraphCache = Expando(shutdown=fail(IOError('cache')))
+        leader.stateJournal = Expando(shutdown=lambda: shutdowns.append(None))
+        leader.innerLoop = fail(KeyError('innerLoop'))
+        with self.assertRaises(KeyError):
+            leader.run()
+        self.assertEqual(len(shutdowns), 1)
+        leader.innerLoop = lambda: None
+        with self.assertRaises(IOError):
+            leader.run()
+        self.assertEqual(len(shutdowns), 2)
+
+
+class FanOutJob(Job):
+    def __init__(self, numChildren):
+        Job.__init__(self, cores=0.1, memory='10M', disk='1M')
+        self.numChildren = numChildren
+
+    def run(self, fileStore):
+        for i in range(self.numChildren):
+            self.addChild(NoOpJob())
+
+
+class NoOpJob(Job):
+    def __init__(self):
+        Job.__init__(self, cores=0.1, memory='10M', disk='1M')
+
+    def run(self, fileStore):
+        pass
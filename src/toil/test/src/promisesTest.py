@@ -13,7 +13,9 @@
 # limitations under the License.
 from __future__ import absolute_import
 from builtins import range
-from toil.job import Job
+from toil.common import Config
+from toil.job import Job, Promise, PromisedRequirement
+from toil.jobStores.fileJobStore import FileJobStore
 from toil.test import ToilTest
 
 
@@ -85,3 +87,98 @@ def d(job):
 
 def e():
     return {'a': 'b', 42: 43, 'c': [1, 2, 3]}
+
+
+class PromiseRecordsTest(ToilTest):
+    """
+    Tests keeping the values promised by a job in one record.
+    """
+
+    def setUp(self):
+        super(PromiseRecordsTest, self).setUp()
+        path = self._getTestJobStorePath()
+        self.jobStore = FileJobStore(path)
+        self.config = Config()
+        self.config.jobStore = 'file:%s' % path
+        self.config.promiseRecords = True
+        self.jobStore.initialize(self.config)
+        self.readRecordIDs = []
+        readPromiseRecords = self.jobStore.readPromiseRecords
+
+        def countingReadPromiseRecords(recordIDs):
+            self.readRecordIDs.append(sorted(recordIDs))
+            return readPromiseRecords(recordIDs)
+
+        self.jobStore.readPromiseRecords = countingReadPromiseRecords
+        Promise._jobstore = self.jobStore
+
+    def tearDown(self):
+        Promise._jobstore = None
+        Promise.records.clear()
+        super(PromiseRecordsTest, self).tearDown()
+
+    def _serialise(self, job):
+        jobGraph = job._createEmptyJobGraphForJob(self.jobStore)
+        job._serialiseJob(self.jobStore, {job: jobGraph}, jobGraph)
+        return jobGraph
+
+    def test(self):
+        producers = [Job(), Job()]
+        for producer in producers:
+            producer.prepareForPromiseRegistration(self.jobStore)
+        consumer = ValuesJob([producer.rv(i) for producer in producers for i in range(100)])
+        consumerJobGraph = self._serialise(consumer)
+        # One record was created for each producer
+        recordIDs = sorted(producer._promiseRecordID for producer in producers)
+        self.assertEquals(2, len(set(recordIDs)))
+        for i, producer in enumerate(producers):
+            producer._fulfillPromises(list(range(i * 100, i * 100 + 100)), self.jobStore)
+        # Values written by this process are not read again
+        consumer = Job._loadJob(consumerJobGraph.command, self.jobStore)
+        self.assertEquals(list(range(200)), consumer.values)
+        self.assertEquals([], self.readRecordIDs)
+        # The records are read together before the job is unpickled
+        Promise.records.clear()
+        consumer = Job._loadJob(consumerJobGraph.command, self.jobStore)
+        self.assertEquals(list(range(200)), consumer.values)
+        self.assertEquals([recordIDs], self.readRecordIDs)
+
+    def testUnfulfilled(self):
+        producer = Job()
+        producer.prepareForPromiseRegistration(self.jobStore)
+        consumerJobGraph = self._serialise(ValuesJob(producer.rv()))
+        self.assertRaises(RuntimeError, Job._loadJob, consumerJobGraph.command, self.jobStore)
+
+
+class PromiseRecordsWorkflowTest(ToilTest):
+    """
+    Tests resolving promises from records in a workflow whose jobs are not chained, so that
+    promises passed on by a job are resolved after the job has been deleted.
+    """
+
+    def test(self):
+        options = Job.Runner.getDefaultOptions(self._getTestJobStorePath())
+        options.logLevel = 'INFO'
+        options.disableChaining = True
+        options.promiseRecords = True
+        root = Job.wrapJobFn(passOn)
+        self.assertEquals(Job.Runner.startToil(root, options), (42, 42 * 1024 * 1024))
+
+
+def passOn(job):
+    # The promise of a is passed on from the grandchild of a. The job wrapping consume for its
+    # promised requirement passes on the promise of the job that runs consume.
+    promise = job.addChildJobFn(a).rv()
+    return job.addFollowOnJobFn(consume, promise,
+                                memory=PromisedRequirement(lambda x: x * 1024 * 1024,
+                                                           promise)).rv()
+
+
+def consume(job, value):
+    return value, job.memory
+
+
+class ValuesJob(Job):
+    def __init__(self, values):
+        Job.__init__(self)
+        self.values = values
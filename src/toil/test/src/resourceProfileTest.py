@@ -0,0 +1,87 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import os
+
+from toil.job import JobNode
+from toil.lib.expando import Expando
+from toil.resourceProfile import ResourceProfile
+from toil.test import ToilTest
+
+
+class ResourceProfileTest(ToilTest):
+    """Tests sizing the requirements of jobs from the usage of previous jobs of the same name."""
+
+    def _jobNode(self, jobName, jobStoreID, memory=1000, cores=4, disk=1000):
+        return JobNode(requirements=dict(memory=memory, cores=cores, disk=disk, preemptable=False),
+                       jobName=jobName, unitName=None, jobStoreID=jobStoreID, command=None)
+
+    def _addJobs(self, profile, jobName, count, memory=100, cores=0.5, disk=10):
+        for _ in range(count):
+            profile.addJobStats(Expando(job_name=jobName, time='1', clock='1', memory='1',
+                                        peak_memory=memory, average_cores=cores, peak_disk=disk))
+
+    def testSize(self):
+        profile = ResourceProfile(percentile=95, headroom=1.2, maxMemory=10000)
+        jobNode = self._jobNode('a', '1')
+        self._addJobs(profile, 'a', ResourceProfile.minSamples - 1)
+        # Too few jobs have completed
+        self.assertIs(profile.size(jobNode), jobNode)
+        self._addJobs(profile, 'a', 1)
+        sized = profile.size(jobNode)
+        self.assertEqual((sized.memory, sized.cores, sized.disk), (120, 0.6, 12))
+        # The job itself is left alone, as it may be in the stack of its predecessor
+        self.assertEqual((jobNode.memory, jobNode.cores, jobNode.disk), (1000, 4, 1000))
+        # Jobs are never grown beyond what they requested
+        small = self._jobNode('a', '2', memory=50, cores=0.1, disk=5)
+        self.assertIs(profile.size(small), small)
+        # Jobs without samples fall back on the usage of their worker
+        profile.addJobStats(Expando(job_name='b', time='2', clock='1', memory='1'))
+        self.assertEqual(profile._usage['b']['memory'][0], 1024)
+        self.assertEqual(profile._usage['b']['cores'][0], 0.5)
+        # Stats of workers that didn't record job names are ignored
+        profile.addJobStats(Expando(class_name='c', time='1', clock='1', memory='1'))
+        self.assertNotIn('c', profile._usage)
+
+    def testMemoryEscalation(self):
+        profile = ResourceProfile(percentile=95, headroom=1.0, maxMemory=1500)
+        self._addJobs(profile, 'a', ResourceProfile.minSamples, memory=300)
+        jobNode = self._jobNode('a', '1')
+        sized = profile.size(jobNode)
+        self.assertEqual(sized.memory, 300)
+        # The job was issued with less than it requested, so its retry is given back
+        self.assertTrue(profile.memoryExhausted(sized))
+        sized = profile.size(jobNode)
+        self.assertEqual(sized.memory, 600)
+        self.assertTrue(profile.memoryExhausted(sized))
+        # From here on the job has at least what it requested
+        sized = profile.size(jobNode)
+        self.assertEqual(sized.memory, 1200)
+        self.assertFalse(profile.memoryExhausted(sized))
+        # Memory is not escalated beyond the maximum
+        self.assertEqual(profile.size(jobNode).memory, 1500)
+        profile.jobRemoved(jobNode.jobStoreID)
+        self.assertEqual(profile.size(jobNode).memory, 300)
+
+    def testLoadAndSave(self):
+        path = os.path.join(self._createTempDir(), 'profile.json')
+        profile = ResourceProfile(percentile=95, headroom=1.0, maxMemory=10000)
+        # A missing profile is ignored
+        profile.load(path)
+        self._addJobs(profile, 'a', ResourceProfile.minSamples)
+        profile.save(path)
+        loaded = ResourceProfile(percentile=95, headroom=1.0, maxMemory=10000)
+        loaded.load(path)
+        self.assertEqual(loaded.size(self._jobNode('a', '1')).memory, 100)
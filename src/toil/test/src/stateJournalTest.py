@@ -0,0 +1,257 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from builtins import range
+
+import threading
+
+from toil.common import Config, safeUnpickleFromStream
+from toil.job import JobNode, ServiceJobNode
+from toil.jobGraphCache import JobGraphCache
+from toil.jobStores.fileJobStore import FileJobStore
+from toil.lib.threading import KeyedThreadPool
+from toil.stateJournal import StateJournal
+from toil.test import ToilTest
+
+
+class StateJournalTest(ToilTest):
+    """Tests recovering the jobs in a job store from the leader's snapshot and journal."""
+    def setUp(self):
+        super(StateJournalTest, self).setUp()
+        path = self._getTestJobStorePath()
+        self.jobStore = FileJobStore(path)
+        self.config = Config()
+        self.config.jobStore = 'file:%s' % path
+        self.jobStore.initialize(self.config)
+
+    def tearDown(self):
+        self.jobStore.destroy()
+        super(StateJournalTest, self).tearDown()
+
+    def _createJobGraph(self):
+        jobNode = JobNode(requirements=dict(memory=1, cores=1, disk=1, preemptable=False),
+                          jobName='test', unitName=None, jobStoreID=None, command='foo')
+        return self.jobStore.create(jobNode)
+
+    def _runJob(self, jobGraph, numSuccessors):
+        """Do what a worker does to a job that creates successors and return them."""
+        successors = [self._createJobGraph() for _ in range(numSuccessors)]
+        jobGraph.command = None
+        jobGraph.stack.append([JobNode.fromJobGraph(successor) for successor in successors])
+        self.jobStore.update(jobGraph)
+        return successors
+
+    def _startJournal(self, jobGraphs, snapshotInterval=100):
+        journal = StateJournal(self.jobStore, snapshotInterval)
+        journal.start({jobGraph.jobStoreID: jobGraph for jobGraph in jobGraphs})
+        return journal
+
+    def _recover(self, touched=False):
+        recovered = StateJournal(self.jobStore, snapshotInterval=100).recover()
+        if recovered is None:
+            return None
+        jobs, touchedJobStoreIDs = recovered
+        return touchedJobStoreIDs if touched else jobs
+
+    def testNoSnapshot(self):
+        self.assertIsNone(self._recover())
+
+    def testUntouchedJobsComeFromSnapshot(self):
+        jobGraphs = [self._createJobGraph() for _ in range(3)]
+        self._startJournal(jobGraphs)
+        # Untouched jobs are not read from the job store at all, as changes the leader doesn't
+        # know about can only be made by workers running issued jobs
+        self.jobStore.delete(jobGraphs[0].jobStoreID)
+        self.assertEqual(set(self._recover()), set(j.jobStoreID for j in jobGraphs))
+
+    def testIssuedJobsAreReloaded(self):
+        parent, other = self._createJobGraph(), self._createJobGraph()
+        journal = self._startJournal([parent, other])
+        journal.record(StateJournal.issued, [parent.jobStoreID])
+        journal.flush()
+        # The leader dies while the job runs, after it created successors
+        successors = self._runJob(parent, 2)
+        grandchildren = self._runJob(successors[0], 1)
+        jobs = self._recover()
+        self.assertEqual(set(jobs), set(j.jobStoreID for j in
+                                        [parent, other] + successors + grandchildren))
+        self.assertIsNone(jobs[parent.jobStoreID].command)
+        self.assertIsNone(jobs[successors[0].jobStoreID].command)
+
+    def testDeletedJobs(self):
+        parent = self._createJobGraph()
+        successors = self._runJob(parent, 2)
+        journal = self._startJournal([parent] + successors)
+        journal.record(StateJournal.issued, [successors[0].jobStoreID])
+        journal.flush()
+        self.jobStore.delete(successors[0].jobStoreID)
+        journal.record(StateJournal.deleted, [successors[0].jobStoreID])
+        journal.flush()
+        self.assertEqual(set(self._recover()), {parent.jobStoreID, successors[1].jobStoreID})
+        # A deleted job is dropped even if the leader never learnt of its deletion
+        journal.record(StateJournal.issued, [successors[1].jobStoreID])
+        journal.flush()
+        self.jobStore.delete(successors[1].jobStoreID)
+        self.assertEqual(set(self._recover()), {parent.jobStoreID})
+
+    def testSnapshotKeepsRunningJobsTouched(self):
+        finished, running = self._createJobGraph(), self._createJobGraph()
+        journal = self._startJournal([finished, running], snapshotInterval=2)
+        journal.record(StateJournal.issued, [finished.jobStoreID, running.jobStoreID])
+        journal.flush()
+        successors = self._runJob(finished, 1)
+        journal.record(StateJournal.finished, [finished.jobStoreID])
+        journal.record(StateJournal.successorsAdded, [successors[0].jobStoreID])
+        generation = journal.generation
+        journal.snapshotIfNeeded()
+        self.assertEqual(journal.generation, generation + 1)
+        self.assertEqual(journal.records, [])
+        journal.shutdown()
+        # The running job finishes its work after the snapshot, and the journal of the previous
+        # generation must be ignored
+        runningSuccessors = self._runJob(running, 1)
+        jobs = self._recover()
+        self.assertEqual(set(jobs), set(j.jobStoreID for j in
+                                        [finished, running] + successors + runningSuccessors))
+        self.assertIsNone(jobs[running.jobStoreID].command)
+
+    def testSnapshotKeepsJobsWithPendingWritesTouched(self):
+        jobGraph = self._createJobGraph()
+        jobGraphCache = JobGraphCache(self.jobStore, 10, numIOThreads=1)
+        journal = StateJournal(self.jobStore, snapshotInterval=2, jobGraphCache=jobGraphCache)
+        journal.start({jobGraph.jobStoreID: jobGraph})
+        journal.record(StateJournal.issued, [jobGraph.jobStoreID])
+        journal.flush()
+        self._runJob(jobGraph, 0)
+        journal.record(StateJournal.finished, [jobGraph.jobStoreID])
+        # The leader's update of the finished job is still being written while the snapshot is
+        # folded, which therefore holds the job as the worker left it
+        blocker = threading.Event()
+        jobGraphCache._io.submit(jobGraph.jobStoreID, blocker.wait)
+        jobGraph.remainingRetryCount = 5
+        jobGraphCache.update(jobGraph)
+        journal.snapshotIfNeeded()
+        journal.shutdown()
+        blocker.set()
+        jobGraphCache.shutdown()
+        self.assertEqual(self._recover()[jobGraph.jobStoreID].remainingRetryCount, 5)
+
+    def testScheduledServicesStayTouched(self):
+        service, other = self._createJobGraph(), self._createJobGraph()
+        journal = self._startJournal([service, other], snapshotInterval=2)
+        journal.record(StateJournal.issued, [other.jobStoreID])
+        journal.record(StateJournal.servicesScheduled, [service.jobStoreID])
+        journal.record(StateJournal.finished, [other.jobStoreID])
+        journal.snapshotIfNeeded()
+        journal.shutdown()
+        # The flag files of a scheduled service may be deleted at any time until it is deleted
+        self.assertEqual(self._recover(touched=True), {service.jobStoreID})
+        journal.record(StateJournal.deleted, [service.jobStoreID])
+        journal.record(StateJournal.finished, [other.jobStoreID])
+        journal.snapshotIfNeeded()
+        journal.shutdown()
+        self.assertEqual(self._recover(touched=True), set())
+
+    def testCleanOnlyChecksFlagsOfTouchedServices(self):
+        parent = self._createJobGraph()
+        services = [self._createJobGraph() for _ in range(2)]
+        flags = {}
+        for service in services:
+            flags[service.jobStoreID] = [self.jobStore.getEmptyFileStoreID() for _ in range(3)]
+            service.startJobStoreID, service.terminateJobStoreID, service.errorJobStoreID = \
+                flags[service.jobStoreID]
+            self.jobStore.update(service)
+        parent.services = [[ServiceJobNode(jobStoreID=service.jobStoreID, memory=1, cores=1,
+                                           disk=1, preemptable=False,
+                                           startJobStoreID=service.startJobStoreID,
+                                           terminateJobStoreID=service.terminateJobStoreID,
+                                           errorJobStoreID=service.errorJobStoreID,
+                                           unitName=None, jobName='service', command='foo',
+                                           predecessorNumber=1)
+                            for service in services]]
+        self.jobStore.update(parent)
+        self.jobStore.setRootJob(parent.jobStoreID)
+        for service in services:
+            self.jobStore.deleteFile(service.startJobStoreID)
+        touched, untouched = services
+        jobCache = {j.jobStoreID: self.jobStore.load(j.jobStoreID) for j in [parent] + services}
+        self.jobStore.clean(jobCache=jobCache, jobCacheIsComplete=True,
+                            touchedJobStoreIDs={touched.jobStoreID})
+        # Only the touched service can have lost its flag files since the snapshot
+        touchedFlags = self.jobStore.load(touched.jobStoreID).startJobStoreID
+        self.assertNotEqual(touchedFlags, flags[touched.jobStoreID][0])
+        self.assertTrue(self.jobStore.fileExists(touchedFlags))
+        self.assertEqual(self.jobStore.load(untouched.jobStoreID).startJobStoreID,
+                         flags[untouched.jobStoreID][0])
+
+    def testJournalIsAppended(self):
+        jobGraphs = [self._createJobGraph() for _ in range(3)]
+        journal = self._startJournal(jobGraphs)
+        for jobGraph in jobGraphs:
+            journal.record(StateJournal.issued, [jobGraph.jobStoreID])
+            journal.flush()
+        # Each flush writes only the records made since the last one
+        self.assertEqual(journal._readJournal(journal.generation),
+                         [(StateJournal.issued, [jobGraph.jobStoreID]) for jobGraph in jobGraphs])
+        fileName = journal.journalFileName % (journal.generation % 2, 2)
+        with self.jobStore.readSharedFileStream(fileName) as f:
+            self.assertEqual(safeUnpickleFromStream(f),
+                             (journal.generation, [(StateJournal.issued,
+                                                    [jobGraphs[2].jobStoreID])]))
+
+    def testRecoverWhileSnapshotIsWritten(self):
+        parent = self._createJobGraph()
+        journal = self._startJournal([parent], snapshotInterval=1)
+        journal.record(StateJournal.finished, [parent.jobStoreID])
+        # The snapshot is written in the background, while the next generation's journal is
+        # written, which must be replayed on top of the previous snapshot until it is done
+        journal._snapshotPool = KeyedThreadPool(1)
+        blocker = threading.Event()
+        journal._snapshotPool.submit(None, blocker.wait)
+        journal.snapshotIfNeeded()
+        journal.record(StateJournal.issued, [parent.jobStoreID])
+        journal.flush()
+        successors = self._runJob(parent, 1)
+        expected = set(j.jobStoreID for j in [parent] + successors)
+        try:
+            self.assertEqual(set(self._recover()), expected)
+        finally:
+            blocker.set()
+        journal.shutdown()
+        self.assertEqual(set(self._recover()), expected)
+
+    def testRestartIgnoresStaleJournal(self):
+        parent = self._createJobGraph()
+        journal = self._startJournal([parent])
+        journal.record(StateJournal.issued, [parent.jobStoreID])
+        journal.flush()
+        journal.record(StateJournal.deleted, [parent.jobStoreID])
+        journal.flush()
+        # A restarted leader starts a new snapshot and journal, the files of the earlier run are
+        # ignored even where they aren't overwritten
+        journal = self._startJournal([parent])
+        journal.record(StateJournal.issued, [parent.jobStoreID])
+        journal.flush()
+        self.assertEqual(set(self._recover()), {parent.jobStoreID})
+
+    def testDisabled(self):
+        jobGraph = self._createJobGraph()
+        self._startJournal([jobGraph])
+        journal = StateJournal(self.jobStore, snapshotInterval=0)
+        journal.start({jobGraph.jobStoreID: jobGraph})
+        journal.record(StateJournal.issued, [jobGraph.jobStoreID])
+        self.assertEqual(journal.records, [])
+        # An outdated snapshot must not be used by a later restart with the journal enabled
+        self.assertIsNone(self._recover())
@@ -0,0 +1,98 @@
+# Copyright (C) 2015-2018 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from builtins import range
+import sys
+
+from toil.common import Config
+from toil.job import JobNode
+from toil.jobStores.fileJobStore import FileJobStore
+from toil.test import ToilTest
+from toil.toilState import ToilState
+
+
+class ToilStateTest(ToilTest):
+    """Tests building the leader's view of the jobs in a job store."""
+    def setUp(self):
+        super(ToilStateTest, self).setUp()
+        path = self._getTestJobStorePath()
+        self.jobStore = FileJobStore(path)
+        self.config = Config()
+        self.config.jobStore = 'file:%s' % path
+        self.jobStore.initialize(self.config)
+
+    def tearDown(self):
+        self.jobStore.destroy()
+        super(ToilStateTest, self).tearDown()
+
+    def _createJobGraph(self, predecessorNumber=1):
+        jobNode = JobNode(requirements=dict(memory=1, cores=1, disk=1, preemptable=False),
+                          jobName='test', unitName=None, jobStoreID=None, command='foo',
+                          predecessorNumber=predecessorNumber)
+        return self.jobStore.create(jobNode)
+
+    def _addSuccessors(self, jobGraph, successors):
+        """Make the given job graph wait on the given successors."""
+        jobGraph.command = None
+        jobGraph.stack.append([JobNode.fromJobGraph(successor) for successor in successors])
+        self.jobStore.update(jobGraph)
+
+    def _updatedJobStoreIDs(self, toilState):
+        return set(jobGraph.jobStoreID for jobGraph, _ in toilState.updatedJobs)
+
+    def testDeepChain(self):
+        """Chains longer than the recursion limit must not exhaust the stack."""
+        chain = [self._createJobGraph() for _ in range(sys.getrecursionlimit() + 100)]
+        for predecessor, successor in reversed(list(zip(chain, chain[1:]))):
+            self._addSuccessors(predecessor, [successor])
+        for jobCache in (None, {jobGraph.jobStoreID: jobGraph for jobGraph in chain}):
+            toilState = ToilState(self.jobStore, chain[0], jobCache=jobCache, numLoadThreads=4)
+            self.assertEqual(self._updatedJobStoreIDs(toilState), {chain[-1].jobStoreID})
+            self.assertEqual(len(toilState.successorCounts), len(chain) - 1)
+            self.assertEqual(toilState.successorJobStoreIDToPredecessorJobs[chain[-1].jobStoreID],
+                             [chain[-2]])
+
+    def testMultiplePredecessors(self):
+        """A successor of several jobs is only ready once all of its predecessors are."""
+        # root -> (a, b), a -> (c, d), b -> d, d has two predecessors
+        root, a, b, c = [self._createJobGraph() for _ in range(4)]
+        d = self._createJobGraph(predecessorNumber=2)
+        self._addSuccessors(a, [c, d])
+        self._addSuccessors(b, [d])
+        self._addSuccessors(root, [a, b])
+        toilState = ToilState(self.jobStore, self.jobStore.load(root.jobStoreID))
+        self.assertEqual(self._updatedJobStoreIDs(toilState), {c.jobStoreID, d.jobStoreID})
+        self.assertEqual(toilState.jobsToBeScheduledWithMultiplePredecessors, {})
+        self.assertEqual(sorted(p.jobStoreID for p in
+                                toilState.successorJobStoreIDToPredecessorJobs[d.jobStoreID]),
+                         sorted([a.jobStoreID, b.jobStoreID]))
+        self.assertEqual(toilState.successorCounts,
+                         {root.jobStoreID: 2, a.jobStoreID: 2, b.jobStoreID: 1})
+
+    def testUnfinishedPredecessor(self):
+        """A successor of a job that is still waiting on other successors is not ready."""
+        # root -> (a, b), a -> d, b -> d and then e, d has two predecessors
+        root, a, b, e = [self._createJobGraph() for _ in range(4)]
+        d = self._createJobGraph(predecessorNumber=2)
+        self._addSuccessors(b, [d])
+        self._addSuccessors(b, [e])
+        self._addSuccessors(a, [d])
+        self._addSuccessors(root, [a, b])
+        toilState = ToilState(self.jobStore, self.jobStore.load(root.jobStoreID))
+        self.assertEqual(self._updatedJobStoreIDs(toilState), {e.jobStoreID})
+        self.assertEqual(list(toilState.jobsToBeScheduledWithMultiplePredecessors),
+                         [d.jobStoreID])
+        self.assertEqual(toilState.jobsToBeScheduledWithMultiplePredecessors[d.jobStoreID]
+                         .predecessorsFinished, {a.jobStoreID})
@@ -11,14 +11,18 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import os
 import pickle
 
 from toil.common import Config
-from toil.job import Job
+from toil.lib.expando import MagicExpando
+from toil.fileStore import FileStore
+from toil.job import Job, Promise
 from toil.jobGraph import JobGraph
 from toil.jobStores.fileJobStore import FileJobStore
 from toil.test import ToilTest
-from toil.worker import nextChainableJobGraph
+from toil.worker import (chainableSuccessors, nextChainableJobGraph, parseArguments,
+                         PrefetchedJob, runSuccessorsInProcess)
 
 class WorkerTests(ToilTest):
     """Test miscellaneous units of the worker."""
@@ -31,25 +35,27 @@ class WorkerTests(ToilTest):
         self.jobStore.initialize(self.config)
         self.jobGraphNumber = 0
 
+    def _createJobGraph(self, memory, cores, disk, preemptable, checkpoint):
+        """Create a fake-ish Job and JobGraph pair, and return the
+        jobGraph."""
+        name = 'jobGraph%d' % self.jobGraphNumber
+        self.jobGraphNumber += 1
+
+        job = Job()
+        job.checkpoint = checkpoint
+        with self.jobStore.writeFileStream() as (f, fileStoreID):
+            pickle.dump(job, f, pickle.HIGHEST_PROTOCOL)
+        command = '_toil %s fooCommand toil True' % fileStoreID
+        jobGraph = JobGraph(command=command, memory=memory, cores=cores,
+                            disk=disk, unitName=name,
+                            jobName=name, preemptable=preemptable,
+                            jobStoreID=name, remainingRetryCount=1,
+                            predecessorNumber=1)
+        return self.jobStore.create(jobGraph)
+
     def testNextChainableJobGraph(self):
         """Make sure chainable/non-chainable jobs are identified correctly."""
-        def createJobGraph(memory, cores, disk, preemptable, checkpoint):
-            """Create a fake-ish Job and JobGraph pair, and return the
-            jobGraph."""
-            name = 'jobGraph%d' % self.jobGraphNumber
-            self.jobGraphNumber += 1
-
-            job = Job()
-            job.checkpoint = checkpoint
-            with self.jobStore.writeFileStream() as (f, fileStoreID):
-                pickle.dump(job, f, pickle.HIGHEST_PROTOCOL)
-            command = '_toil %s fooCommand toil True' % fileStoreID
-            jobGraph = JobGraph(command=command, memory=memory, cores=cores,
-                                disk=disk, unitName=name,
-                                jobName=name, preemptable=preemptable,
-                                jobStoreID=name, remainingRetryCount=1,
-                                predecessorNumber=1)
-            return self.jobStore.create(jobGraph)
+        createJobGraph = self._createJobGraph
 
         # Identical non-checkpoint jobs should be chainable.
         jobGraph1 = createJobGraph(1, 2, 3, True, False)
@@ -89,3 +95,174 @@ class WorkerTests(ToilTest):
         jobGraph2 = createJobGraph(1, 2, 3, False, True)
         jobGraph1.stack = [[jobGraph2]]
         self.assertEquals(None, nextChainableJobGraph(jobGraph1, self.jobStore))
+
+        # The resources the job was issued with bound the chained job, rather than its
+        # requirements, which are left alone.
+        jobGraph1 = createJobGraph(1, 2, 3, True, False)
+        jobGraph2 = createJobGraph(2, 2, 3, True, False)
+        jobGraph1.stack = [[jobGraph2]]
+        self.assertEquals(jobGraph2, nextChainableJobGraph(jobGraph1, self.jobStore,
+                                                           resources=(2, 2, 3)))
+        self.assertEquals(None, nextChainableJobGraph(jobGraph1, self.jobStore,
+                                                      resources=(1, 1, 3)))
+        self.assertEquals((1, 2, 3), (jobGraph1.memory, jobGraph1.cores, jobGraph1.disk))
+
+    def testChainableSuccessors(self):
+        """Make sure levels of successors that fit into the worker are identified correctly."""
+        def createJobGraph(memory=1, cores=2, disk=3, preemptable=True, predecessorNumber=1):
+            name = 'jobGraph%d' % self.jobGraphNumber
+            self.jobGraphNumber += 1
+            return JobGraph(command='fooCommand', memory=memory, cores=cores, disk=disk,
+                            unitName=name, jobName=name, preemptable=preemptable,
+                            jobStoreID=name, remainingRetryCount=1,
+                            predecessorNumber=predecessorNumber)
+
+        # A level of identical successors should be run in the worker.
+        jobGraph1 = createJobGraph()
+        successors = [createJobGraph(), createJobGraph(memory=0)]
+        jobGraph1.stack = [[createJobGraph()], successors]
+        self.assertEquals(successors, chainableSuccessors(jobGraph1, 2))
+
+        # Unless there are more of them than allowed, or only one.
+        self.assertEquals(None, chainableSuccessors(jobGraph1, 1))
+        jobGraph1.stack = [successors[:1]]
+        self.assertEquals(None, chainableSuccessors(jobGraph1, 2))
+
+        # Or the job has services or is a checkpoint.
+        jobGraph1.stack = [successors]
+        jobGraph1.services = [[createJobGraph()]]
+        self.assertEquals(None, chainableSuccessors(jobGraph1, 2))
+        jobGraph1.services = []
+        jobGraph1.checkpoint = 'fooCommand'
+        self.assertEquals(None, chainableSuccessors(jobGraph1, 2))
+
+        # Or any successor needs more resources, a different preemptability or waits for
+        # other predecessors.
+        for successor in (createJobGraph(memory=2), createJobGraph(cores=3),
+                          createJobGraph(disk=4), createJobGraph(preemptable=False),
+                          createJobGraph(predecessorNumber=2)):
+            jobGraph1 = createJobGraph()
+            jobGraph1.stack = [[createJobGraph(), successor]]
+            self.assertEquals(None, chainableSuccessors(jobGraph1, 2))
+
+        # Unless the job was issued with enough resources for them.
+        jobGraph1 = createJobGraph()
+        successors = [createJobGraph(), createJobGraph(memory=2)]
+        jobGraph1.stack = [successors]
+        self.assertEquals(successors, chainableSuccessors(jobGraph1, 2, resources=(2, 2, 3)))
+        self.assertEquals(None, chainableSuccessors(jobGraph1, 2, resources=(2, 1, 3)))
+
+    def testParseArguments(self):
+        """Make sure worker commands for one job, for bundles of jobs and with the resources
+        the jobs were issued with are parsed."""
+        self.assertEquals(('file:/tmp/js', [('Foo', 'a')], None),
+                          parseArguments(['_toil_worker', 'Foo', 'file:/tmp/js', 'a']))
+        self.assertEquals(('file:/tmp/js', [('Foo', 'a'), ('Bar', 'b'), ('Foo', 'c')], None),
+                          parseArguments(['_toil_worker', 'Foo', 'file:/tmp/js', 'a',
+                                          'Bar', 'b', 'Foo', 'c']))
+        self.assertEquals(('file:/tmp/js', [('Foo', 'a')], (1024, 0.5, 2048)),
+                          parseArguments(['_toil_worker', '--resources=1024,0.5,2048', 'Foo',
+                                          'file:/tmp/js', 'a']))
+
+    def testPrefetchedJob(self):
+        """Make sure a prefetched successor is used if it is chained and ignored otherwise."""
+        jobGraph1 = self._createJobGraph(1, 2, 3, True, False)
+        jobGraph2 = self._createJobGraph(1, 2, 3, True, False)
+        jobGraph1.stack = [[jobGraph2]]
+        prefetchedJob = PrefetchedJob.start(jobGraph1, self.jobStore)
+        self.assertEquals(jobGraph2.jobStoreID, prefetchedJob.jobStoreID)
+        successorJobGraph, pickledJob = prefetchedJob.get()
+        self.assertEquals(jobGraph2, successorJobGraph)
+        self.assertEquals(Job, type(pickle.loads(pickledJob)))
+        # The job no longer needs to be loaded from the job store
+        self.jobStore.delete(jobGraph2.jobStoreID)
+        self.assertEquals(jobGraph2, nextChainableJobGraph(jobGraph1, self.jobStore, prefetchedJob))
+
+        # If the job adds a child, the prefetched successor is not chained.
+        jobGraph3 = self._createJobGraph(1, 2, 3, True, False)
+        jobGraph1.stack.append([jobGraph3])
+        self.assertEquals(jobGraph3, nextChainableJobGraph(jobGraph1, self.jobStore, prefetchedJob))
+
+        # Nothing is prefetched if there is no chainable successor.
+        jobGraph1.stack.append([jobGraph2, jobGraph3])
+        self.assertEquals(None, PrefetchedJob.start(jobGraph1, self.jobStore))
+
+    def testInlineJob(self):
+        """Make sure small jobs are stored in their job graph and loaded from it."""
+        self.jobStore.config.maxInlineJobSize = 10000
+        job = Job()
+        jobGraph = job._createEmptyJobGraphForJob(self.jobStore)
+        job._serialiseJob(self.jobStore, {job: jobGraph}, jobGraph)
+        self.assertTrue(jobGraph.command.startswith('_toil inline '))
+        loadedJobGraph = self.jobStore.load(jobGraph.jobStoreID)
+        self.assertEquals(jobGraph.pickledJob, loadedJobGraph.pickledJob)
+        self.assertEquals(loadedJobGraph.pickledJob,
+                          Job._readPickledJob(loadedJobGraph, self.jobStore))
+        self.assertEquals(Job, type(Job._loadJob(loadedJobGraph.command, self.jobStore,
+                                                 pickledJob=loadedJobGraph.pickledJob)))
+        self.assertRaises(RuntimeError, Job._loadJob, loadedJobGraph.command, self.jobStore)
+        # Larger jobs are written to a file of their own
+        self.jobStore.config.maxInlineJobSize = 10
+        job = Job()
+        jobGraph = job._createEmptyJobGraphForJob(self.jobStore)
+        job._serialiseJob(self.jobStore, {job: jobGraph}, jobGraph)
+        self.assertEquals(None, jobGraph.pickledJob)
+        self.assertEquals(Job, type(Job._loadJob(jobGraph.command, self.jobStore)))
+
+    def testFulfilledPromises(self):
+        """Make sure small promised values are resolved from memory by chained successors."""
+        self.jobStore.config.maxInlineJobSize = 10000
+        job = Job()
+        with self.jobStore.writeFileStream() as (f, fileStoreID):
+            pass
+        job._rvs[()].append(fileStoreID)
+        try:
+            job._fulfillPromises(42, self.jobStore)
+            with self.jobStore.readFileStream(fileStoreID) as f:
+                self.assertEquals(42, pickle.load(f))
+            # The job store need not be read
+            self.jobStore.deleteFile(fileStoreID)
+            self.assertEquals(42, Promise._resolve(self.config.jobStore, fileStoreID))
+        finally:
+            Promise.fulfilledValues.clear()
+            Promise.filesToDelete.clear()
+
+    def testFailingSuccessorInProcess(self):
+        """Make sure a successor that fails while running in the worker of its predecessor is
+        retried on its own, without failing the predecessor or the other successors."""
+        job = Job()
+        job.addChild(Job())
+        failing = job.addChild(FailingJob())
+        jobGraph = job._serialiseFirstJob(self.jobStore)
+        logPath = os.path.join(self._createTempDir(), 'worker_log.txt')
+        with open(logPath, 'w') as f:
+            f.write('Some worker output')
+        statsDict = MagicExpando()
+        statsDict.workers.logsToMaster = []
+        jobNodes = jobGraph.stack[-1]
+        self.assertEquals(2, len(jobNodes))
+        retries = jobGraph.remainingRetryCount
+        jobGraph, blockFn = runSuccessorsInProcess(jobGraph, jobNodes, self.jobStore,
+                                                   self.config, self._createTempDir(),
+                                                   lambda: True, statsDict, [], logPath=logPath)
+        blockFn()
+        self.assertFalse(FileStore._terminateEvent.isSet())
+        # The succeeding successor is done, the failing one is left to the leader
+        failingID, = [jobNode.jobStoreID for jobNode in jobNodes
+                      if jobNode.jobName == failing.jobName]
+        jobGraph = self.jobStore.load(jobGraph.jobStoreID)
+        self.assertEquals([failingID], [jobNode.jobStoreID for jobNode in jobGraph.stack[-1]])
+        self.assertEquals(1, len([jobNode for jobNode in jobNodes
+                                  if not self.jobStore.exists(jobNode.jobStoreID)]))
+        # The failure counts against the retries of the successor, not its predecessor
+        self.assertEquals(retries, jobGraph.remainingRetryCount)
+        failed = self.jobStore.load(failingID)
+        self.assertEquals(retries - 1, failed.remainingRetryCount)
+        self.assertNotEquals(None, failed.command)
+        with failed.getLogFileHandle(self.jobStore) as f:
+            self.assertIn(b'Some worker output', f.read())
+
+
+class FailingJob(Job):
+    def run(self, fileStore):
+        raise RuntimeError('Failing on purpose')
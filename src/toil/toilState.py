@@ -15,7 +15,10 @@
 from __future__ import absolute_import
 
 from builtins import object
+from builtins import range
+from multiprocessing.pool import ThreadPool
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -23,7 +26,13 @@ class ToilState(object):
     """
     Represents a snapshot of the jobs in the jobStore. Used by the leader to manage the batch.
     """
-    def __init__( self, jobStore, rootJob, jobCache=None):
+    # The number of job graphs requested from the job store at once when building the state
+    loadChunkSize = 100
+
+    # The minimum number of seconds between progress reports while building the state
+    progressInterval = 60
+
+    def __init__( self, jobStore, rootJob, jobCache=None, numLoadThreads=8):
         """
         Loads the state from the jobStore, using the rootJob 
         as the source of the job graph.
@@ -33,7 +42,11 @@ class ToilState(object):
 
         :param toil.jobStores.abstractJobStore.AbstractJobStore jobStore 
         :param toil.jobWrapper.JobGraph rootJob
+        :param int numLoadThreads: the number of threads loading job graphs that are not in
+               the jobCache from the job store concurrently
         """
+        self.numLoadThreads = numLoadThreads
+
         # This is a hash of jobs, referenced by jobStoreID, to their predecessor jobs.
         self.successorJobStoreIDToPredecessorJobs = { }
         
@@ -71,27 +84,86 @@ class ToilState(object):
         ##Algorithm to build this information
         self._buildToilState(rootJob, jobStore, jobCache)
 
-    def _buildToilState(self, jobGraph, jobStore, jobCache=None):
+    def _buildToilState(self, rootJob, jobStore, jobCache=None):
         """
-        Traverses tree of jobs from the root jobGraph (rootJob) building the
+        Traverses the graph of jobs from the root jobGraph (rootJob) building the
         ToilState class.
 
+        The graph is traversed breadth first. Only the current frontier of the traversal is
+        held, and the job graphs of the next frontier are loaded together, see _loadJobs.
+
         If jobCache is passed, it must be a dict from job ID to JobGraph
         object. Jobs will be loaded from the cache (which can be downloaded from
-        the jobStore in a batch) instead of piecemeal when recursed into.
+        the jobStore in a batch) instead of from the job store.
 
-        :param jobGraph: Object representing a job.
+        :param rootJob: Object representing the root job.
         :param jobStore: Object inheriting toil.jobStores.abstractJobStore.AbstractJobStore.
         :param jobCache:
         :return:
         """
+        pool = None
+        try:
+            frontier = [rootJob]
+            jobsSeen = 0
+            lastReport = time.time()
+            while frontier:
+                # Successors with one predecessor, by jobStoreID, to load for the next frontier
+                successorsToLoad = []
+                # Successors with multiple predecessors, seen for the first time
+                multiplePredecessorSuccessorsToLoad = []
+                # Pairs of (predecessor, successor) jobStoreIDs, for successors with multiple
+                # predecessors, recording that the predecessor has finished
+                predecessorsFinished = []
+
+                for jobGraph in frontier:
+                    self._processJob(jobGraph, successorsToLoad,
+                                     multiplePredecessorSuccessorsToLoad, predecessorsFinished)
+                jobsSeen += len(frontier)
+
+                if pool is None and (successorsToLoad or multiplePredecessorSuccessorsToLoad):
+                    pool = ThreadPool(self.numLoadThreads)
+                frontier = self._loadJobs(successorsToLoad, jobStore, jobCache, pool)
+                for successorJobGraph in self._loadJobs(multiplePredecessorSuccessorsToLoad,
+                                                        jobStore, jobCache, pool):
+                    # We put the successor job in the cache of successor jobs with multiple predecessors
+                    assert successorJobGraph.jobStoreID not in self.jobsToBeScheduledWithMultiplePredecessors
+                    self.jobsToBeScheduledWithMultiplePredecessors[successorJobGraph.jobStoreID] = successorJobGraph
+
+                for predecessorJobStoreID, successorJobStoreID in predecessorsFinished:
+                    successorJobGraph = self.jobsToBeScheduledWithMultiplePredecessors.get(successorJobStoreID)
+                    if successorJobGraph is None:
+                        # The successor has already been found to be ready
+                        continue
 
-        def getJob(jobId):
-            if jobCache is not None:
-                if jobId in jobCache:
-                    return jobCache[jobId]
-            return jobStore.load(jobId)
-
+                    # Update the sucessor's status to mark the predecessor complete
+                    successorJobGraph.predecessorsFinished.add(predecessorJobStoreID)
+
+                    # If the successor has no predecessors to finish
+                    assert len(successorJobGraph.predecessorsFinished) <= successorJobGraph.predecessorNumber
+                    if len(successorJobGraph.predecessorsFinished) == successorJobGraph.predecessorNumber:
+
+                        # It is ready to be run, so remove it from the cache
+                        self.jobsToBeScheduledWithMultiplePredecessors.pop(successorJobStoreID)
+
+                        # Consider the successor in the next frontier
+                        frontier.append(successorJobGraph)
+
+                if time.time() - lastReport >= self.progressInterval:
+                    lastReport = time.time()
+                    logger.info("Building the workflow state: %i jobs processed, %i in the next "
+                                "round", jobsSeen, len(frontier))
+            logger.debug("Built the workflow state from %i jobs", jobsSeen)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def _processJob(self, jobGraph, successorsToLoad, multiplePredecessorSuccessorsToLoad,
+                    predecessorsFinished):
+        """
+        Adds a single job to the state, recording which of its successors need to be considered
+        in the next frontier of _buildToilState.
+        """
         # If the jobGraph has a command, is a checkpoint, has services or is ready to be
         # deleted it is ready to be processed
         if jobGraph.command is not None or jobGraph.checkpoint is not None or jobGraph.services or not jobGraph.stack:
@@ -106,68 +178,60 @@ class ToilState(object):
 
         else: # There exist successors
             logger.debug("Adding job: %s to the state with %s successors" % (jobGraph.jobStoreID, len(jobGraph.stack[-1])))
-            
+
             # Record the number of successors
             self.successorCounts[jobGraph.jobStoreID] = len(jobGraph.stack[-1])
-            
-            def processSuccessorWithMultiplePredecessors(successorJobGraph):
-                # If jobGraph is not reported as complete by the successor
-                if jobGraph.jobStoreID not in successorJobGraph.predecessorsFinished:
-                    
-                    # Update the sucessor's status to mark the predecessor complete
-                    successorJobGraph.predecessorsFinished.add(jobGraph.jobStoreID)
-            
-                # If the successor has no predecessors to finish
-                assert len(successorJobGraph.predecessorsFinished) <= successorJobGraph.predecessorNumber
-                if len(successorJobGraph.predecessorsFinished) == successorJobGraph.predecessorNumber:
-                    
-                    # It is ready to be run, so remove it from the cache
-                    self.jobsToBeScheduledWithMultiplePredecessors.pop(successorJobStoreID)
-                    
-                    # Recursively consider the successor
-                    self._buildToilState(successorJobGraph, jobStore, jobCache=jobCache)
-            
+
             # For each successor
             for successorJobNode in jobGraph.stack[-1]:
                 successorJobStoreID = successorJobNode.jobStoreID
-                
+
                 # If the successor jobGraph does not yet point back at a
                 # predecessor we have not yet considered it
                 if successorJobStoreID not in self.successorJobStoreIDToPredecessorJobs:
 
                     # Add the job as a predecessor
                     self.successorJobStoreIDToPredecessorJobs[successorJobStoreID] = [jobGraph]
-                    
+
                     # If predecessor number > 1 then the successor has multiple predecessors
                     if successorJobNode.predecessorNumber > 1:
-                        
-                        # We load the successor job
-                        successorJobGraph =  getJob(successorJobStoreID)
-                        
-                        # We put the successor job in the cache of successor jobs with multiple predecessors
-                        assert successorJobStoreID not in self.jobsToBeScheduledWithMultiplePredecessors
-                        self.jobsToBeScheduledWithMultiplePredecessors[successorJobStoreID] = successorJobGraph
-                        
-                        # Process successor
-                        processSuccessorWithMultiplePredecessors(successorJobGraph)
-                            
+                        # The successor is loaded before the next frontier and marked as having
+                        # this job as a finished predecessor
+                        multiplePredecessorSuccessorsToLoad.append(successorJobStoreID)
+                        predecessorsFinished.append((jobGraph.jobStoreID, successorJobStoreID))
                     else:
                         # The successor has only the jobGraph as a predecessor so
-                        # recursively consider the successor
-                        self._buildToilState(getJob(successorJobStoreID), jobStore, jobCache=jobCache)
-                
+                        # consider it in the next frontier
+                        successorsToLoad.append(successorJobStoreID)
+
                 else:
                     # We've already seen the successor
-                    
+
                     # Add the job as a predecessor
                     assert jobGraph not in self.successorJobStoreIDToPredecessorJobs[successorJobStoreID]
                     self.successorJobStoreIDToPredecessorJobs[successorJobStoreID].append(jobGraph)
-                    
+
                     # If the successor has multiple predecessors
-                    if successorJobStoreID in self.jobsToBeScheduledWithMultiplePredecessors:
-                        
-                        # Get the successor from cache
-                        successorJobGraph = self.jobsToBeScheduledWithMultiplePredecessors[successorJobStoreID]
-                        
-                        # Process successor
-                        processSuccessorWithMultiplePredecessors(successorJobGraph)
\ No newline at end of file
+                    if successorJobNode.predecessorNumber > 1:
+                        predecessorsFinished.append((jobGraph.jobStoreID, successorJobStoreID))
+
+    def _loadJobs(self, jobStoreIDs, jobStore, jobCache, pool):
+        """
+        Returns the job graphs with the given IDs, taking them from the jobCache if possible and
+        otherwise loading them from the job store in chunks, several chunks at a time.
+
+        :rtype: list[toil.jobGraph.JobGraph]
+        """
+        jobGraphs = {}
+        if jobCache is not None:
+            for jobStoreID in jobStoreIDs:
+                if jobStoreID in jobCache:
+                    jobGraphs[jobStoreID] = jobCache[jobStoreID]
+        missing = [jobStoreID for jobStoreID in jobStoreIDs if jobStoreID not in jobGraphs]
+        if missing:
+            chunks = [missing[i:i + self.loadChunkSize]
+                      for i in range(0, len(missing), self.loadChunkSize)]
+            for chunk in pool.map(jobStore.loadMany, chunks):
+                for jobGraph in chunk:
+                    jobGraphs[jobGraph.jobStoreID] = jobGraph
+        return [jobGraphs[jobStoreID] for jobStoreID in jobStoreIDs]
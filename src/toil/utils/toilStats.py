@@ -405,6 +405,10 @@ def reportPrettyData(root, worker, job, job_types, options):
     for t in job_types:
         out_str += " %s\n" % t.name
         out_str += sprintTag(t.name, t, options, columnWidths=columnWidths)
+    if root.get("resource_usage"):
+        out_str += sprintResourceUsage(root.resource_usage, options)
+    if "leader" in root:
+        out_str += sprintLeader(root.leader, options)
     return out_str
 
 def computeColumnWidths(job_types, worker, job, options):
@@ -572,9 +576,137 @@ def processData(config, stats):
     for jobName in jobNames:
         jobTypes = [ job for job in jobs if job.class_name == jobName ]
         buildElement(jobTypesTag, jobTypes, jobName)
+    collatedStatsTag.resource_usage = collateResourceUsage(jobs)
+    if stats.get("leader", None) is not None:
+        collatedStatsTag.leader = collateLeaderStats(stats.leader)
     collatedStatsTag.name = "collatedStatsTag"
     return collatedStatsTag
 
+def collateResourceUsage(jobs):
+    """ Compare the resources requested by the jobs of each name to the resources they used,
+    see toil.lib.resourceSampler. Without samples, the used memory is the peak RSS of the
+    worker and the used cores are the CPU time over the wall time of each job.
+    """
+    usage = Expando()
+    for job in jobs:
+        if "requested_memory" not in job:
+            continue  # Recorded before requests were recorded
+        total = usage.setdefault(job.class_name, Expando(
+            count=0, requested_memory=0, peak_memory=0, average_memory=0.0,
+            requested_cores=0.0, average_cores=0.0, peak_cores=0.0,
+            requested_disk=0, peak_disk=0, jobstore_read=0, jobstore_written=0))
+        total.count += 1
+        total.requested_memory = max(total.requested_memory, job.requested_memory)
+        total.requested_cores = max(total.requested_cores, job.requested_cores)
+        total.requested_disk = max(total.requested_disk, job.requested_disk)
+        total.jobstore_read += job.jobstore_read
+        total.jobstore_written += job.jobstore_written
+        if "peak_memory" in job:
+            total.peak_memory = max(total.peak_memory, job.peak_memory)
+            total.average_memory += job.average_memory
+            total.average_cores += job.average_cores
+            total.peak_cores = max(total.peak_cores, job.peak_cores)
+            total.peak_disk = max(total.peak_disk, job.peak_disk)
+        else:
+            # ru_maxrss is in kilobytes
+            memory = float(job.memory) * 1024
+            wallTime = float(job.time)
+            cores = old_div(float(job.clock), wallTime) if wallTime > 0 else 0.0
+            total.peak_memory = max(total.peak_memory, memory)
+            total.average_memory += memory
+            total.average_cores += cores
+            total.peak_cores = max(total.peak_cores, cores)
+    for total in usage.values():
+        total.average_memory = old_div(total.average_memory, total.count)
+        total.average_cores = old_div(total.average_cores, total.count)
+    return usage
+
+def sprintResourceUsage(usage, options):
+    """ Generate a pretty-print ready string comparing the resources requested by and used by the
+    jobs of each name.
+    """
+    out_str = "Requested vs used\n"
+    out_str += " %-24s | %6s | %10s %10s %10s | %6s %6s %6s | %10s %10s | %10s %10s\n" % (
+        "Job", "count", "mem req", "mem peak", "mem ave", "cores", "ave", "peak",
+        "disk req", "disk peak", "read", "written")
+    for name, total in sorted(usage.items()):
+        out_str += " %-24s | %s | %s %s %s | %s %s %s | %s %s | %s %s\n" % (
+            name, reportNumber(total.count, options, field=6),
+            reportMemory(total.requested_memory, options, field=10, isBytes=True),
+            reportMemory(total.peak_memory, options, field=10, isBytes=True),
+            reportMemory(total.average_memory, options, field=10, isBytes=True),
+            reportNumber(round(total.requested_cores, 2), options, field=6),
+            reportNumber(round(total.average_cores, 2), options, field=6),
+            reportNumber(round(total.peak_cores, 2), options, field=6),
+            reportMemory(total.requested_disk, options, field=10, isBytes=True),
+            reportMemory(total.peak_disk, options, field=10, isBytes=True),
+            reportMemory(total.jobstore_read, options, field=10, isBytes=True),
+            reportMemory(total.jobstore_written, options, field=10, isBytes=True))
+    return out_str
+
+def collateLeaderStats(reports):
+    """ Sum up the periodic reports of the leader's main loop, see
+    toil.statsAndLogging.LeaderStats.
+    """
+    leader = Expando(time=0.0, iterations=0, phases=Expando(), latency=None,
+                     queues=Expando(), counters=Expando())
+    for report in reports:
+        leader.time += report.time
+        leader.iterations += report.iterations
+        for name, phase in report.phases.items():
+            total = leader.phases.setdefault(name, Expando(time=0.0, count=0))
+            total.time += phase.time
+            total.count += phase.count
+        if leader.latency is None:
+            leader.latency = Expando(buckets=report.latency.buckets,
+                                     counts=[0] * len(report.latency.counts))
+        leader.latency.counts = [a + b for a, b in zip(leader.latency.counts,
+                                                       report.latency.counts)]
+        for name, queue in report.queues.items():
+            total = leader.queues.setdefault(name, Expando(max=0, total=0))
+            total.max = max(total.max, queue.max)
+            total.total += queue.total
+        for name, value in report.counters.items():
+            leader.counters[name] = leader.counters.get(name, 0) + value
+    for queue in leader.queues.values():
+        queue.average = old_div(float(queue.total), leader.iterations) if leader.iterations else 0.0
+    return leader
+
+def sprintLeader(leader, options):
+    """ Generate a pretty-print ready string from the collated stats of the leader.
+    """
+    out_str = "Leader\n"
+    out_str += "  Iterations: %s  Time: %s\n" % (reportNumber(leader.iterations, options),
+                                                reportTime(leader.time, options))
+    out_str += " %-24s | %10s %10s %10s %7s\n" % ("Phase", "total", "count", "ave", "%")
+    for name, phase in sorted(leader.phases.items(), key=lambda item: -item[1].time):
+        out_str += " %-24s | %s %s %s %s\n" % (
+            name, reportTime(phase.time, options, field=10),
+            reportNumber(phase.count, options, field=10),
+            reportTime(old_div(phase.time, phase.count) if phase.count else 0.0, options, field=10),
+            reportNumber(round(100.0 * phase.time / leader.time, 1) if leader.time else 0.0,
+                         options, field=7))
+    out_str += " %-24s | %10s %10s\n" % ("Queue", "ave", "max")
+    for name, queue in sorted(leader.queues.items()):
+        out_str += " %-24s | %s %s\n" % (name, reportNumber(round(queue.average, 1), options, field=10),
+                                          reportNumber(queue.max, options, field=10))
+    out_str += " %-24s | %10s\n" % ("Counter", "total")
+    for name, value in sorted(leader.counters.items()):
+        out_str += " %-24s | %s\n" % (name, reportNumber(round(value, 2), options, field=10))
+    if leader.counters.get('jobsLaunched') and leader.time:
+        out_str += "  Launch rate: %s jobs/s  Time per launch: %s\n" % (
+            reportNumber(round(leader.counters.jobsLaunched / leader.time, 2), options),
+            reportTime(old_div(leader.counters.get('launchTime', 0.0),
+                               leader.counters.jobsLaunched), options))
+    if leader.latency is not None:
+        out_str += " %-24s |" % "Iteration latency"
+        bounds = ["<=%gs" % bound for bound in leader.latency.buckets] + [">%gs" % leader.latency.buckets[-1]]
+        for bound, count in zip(bounds, leader.latency.counts):
+            if count:
+                out_str += " %s: %d" % (bound, count)
+        out_str += "\n"
+    return out_str
+
 def reportData(tree, options):
     # Now dump it all out to file
     if options.raw:
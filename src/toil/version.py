@@ -0,0 +1,13 @@
+dockerShortTag = '3.17.0a1-e249198-dirty'
+baseVersion = '3.17.0a1'
+dockerTag = '3.17.0a1-e249198ee1f0546b633e0308455c9e9ca0d89d30-dirty'
+dockerName = 'toil'
+buildNumber = None
+cgcloudVersion = '1.6.0a1.dev393'
+version = '3.17.0a1-e249198ee1f0546b633e0308455c9e9ca0d89d30-dirty'
+dirty = True
+shortVersion = '3.17.0a1-e249198-dirty'
+currentCommit = 'e249198ee1f0546b633e0308455c9e9ca0d89d30'
+dockerMinimalTag = '3.17.0a1'
+distVersion = '3.17.0a1'
+dockerRegistry = 'quay.io/ucsc_cgl'
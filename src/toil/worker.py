@@ -43,7 +43,7 @@ from toil.lib.expando import MagicExpando
 from toil.common import Toil, safeUnpickleFromStream
 from toil.fileStore import FileStore
 from toil import logProcessContext
-from toil.job import Job
+from toil.job import Job, Promise
 from toil.lib.bioio import setLogLevel
 from toil.lib.bioio import getTotalCpuTime
 from toil.lib.bioio import getTotalCpuTimeAndMemoryUsage
@@ -51,9 +51,18 @@ import signal
 
 logger = logging.getLogger(__name__)
 
-def nextChainableJobGraph(jobGraph, jobStore):
-    """Returns the next chainable jobGraph after this jobGraph if one
-    exists, or None if the chain must terminate.
+def _resourceBound(jobGraph, resources):
+    """Returns the (memory, cores, disk) that successors must fit into to be
+    run within the worker: the resources the jobGraph was issued with, if
+    given, otherwise its requirements.
+    """
+    if resources is not None:
+        return resources
+    return jobGraph.memory, jobGraph.cores, jobGraph.disk
+
+def _chainableJobNode(jobGraph, resources=None):
+    """Returns the jobNode of the single successor that could run next within
+    the worker, judging by the jobGraph alone, or None.
     """
     #If no more jobs to run or services not finished, quit
     if len(jobGraph.stack) == 0 or len(jobGraph.services) > 0 or jobGraph.checkpoint != None:
@@ -74,13 +83,14 @@ def nextChainableJobGraph(jobGraph, jobStore):
     #We check the requirements of the jobGraph to see if we can run it
     #within the current worker
     successorJobNode = jobs[0]
-    if successorJobNode.memory > jobGraph.memory:
+    memory, cores, disk = _resourceBound(jobGraph, resources)
+    if successorJobNode.memory > memory:
         logger.debug("We need more memory for the next job, so finishing")
         return None
-    if successorJobNode.cores > jobGraph.cores:
+    if successorJobNode.cores > cores:
         logger.debug("We need more cores for the next job, so finishing")
         return None
-    if successorJobNode.disk > jobGraph.disk:
+    if successorJobNode.disk > disk:
         logger.debug("We need more disk for the next job, so finishing")
         return None
     if successorJobNode.preemptable != jobGraph.preemptable:
@@ -89,15 +99,33 @@ def nextChainableJobGraph(jobGraph, jobStore):
     if successorJobNode.predecessorNumber > 1:
         logger.debug("The jobGraph has multiple predecessors, we must return to the leader.")
         return None
+    return successorJobNode
+
+def nextChainableJobGraph(jobGraph, jobStore, prefetchedJob=None, resources=None):
+    """Returns the next chainable jobGraph after this jobGraph if one
+    exists, or None if the chain must terminate. The successor is taken from
+    the prefetchedJob if that is for the same successor.
+
+    :param tuple resources: the (memory, cores, disk) the jobGraph was issued
+           with, if they differ from its requirements
+    """
+    successorJobNode = _chainableJobNode(jobGraph, resources)
+    if successorJobNode is None:
+        return None
 
     # Load the successor jobGraph
-    successorJobGraph = jobStore.load(successorJobNode.jobStoreID)
+    pickledJob = None
+    if prefetchedJob is not None and prefetchedJob.jobStoreID == successorJobNode.jobStoreID:
+        successorJobGraph, pickledJob = prefetchedJob.get()
+    if pickledJob is None:
+        successorJobGraph = jobStore.load(successorJobNode.jobStoreID)
 
     # Somewhat ugly, but check if job is a checkpoint job and quit if
     # so
     if successorJobGraph.command.startswith( "_toil " ):
         #Load the job
-        successorJob = Job._loadJob(successorJobGraph.command, jobStore)
+        successorJob = Job._loadJob(successorJobGraph.command, jobStore,
+                                    pickledJob=pickledJob or successorJobGraph.pickledJob)
 
         # Check it is not a checkpoint
         if successorJob.checkpoint:
@@ -107,7 +135,183 @@ def nextChainableJobGraph(jobGraph, jobStore):
     # Made it through! This job is chainable.
     return successorJobGraph
 
-def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=True):
+class PrefetchedJob(object):
+    """
+    The jobGraph and pickled job of the successor that would be chained after
+    the job the worker is about to run, loaded in a background thread while
+    that job runs. The job is only unpickled once it is known to be chained,
+    so that any promises it depends on are resolved after they were fulfilled.
+    """
+    def __init__(self, jobStoreID, jobStore):
+        self.jobStoreID = jobStoreID
+        self._jobStore = jobStore
+        self._jobGraph = None
+        self._pickledJob = None
+        self._thread = Thread(target=self._load)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @classmethod
+    def start(cls, jobGraph, jobStore, resources=None):
+        """Starts prefetching the successor of the jobGraph that is chainable
+        as the stack stands, or returns None if there is none. If the job adds
+        successors of its own, the prefetched successor is never used.
+        """
+        successorJobNode = _chainableJobNode(jobGraph, resources)
+        if successorJobNode is None:
+            return None
+        return cls(successorJobNode.jobStoreID, jobStore)
+
+    def _load(self):
+        try:
+            jobGraph = self._jobStore.load(self.jobStoreID)
+            if jobGraph.command is not None and jobGraph.command.startswith("_toil "):
+                self._pickledJob = Job._readPickledJob(jobGraph, self._jobStore)
+                self._jobGraph = jobGraph
+        except:
+            # The successor is loaded again if it is chained
+            logger.debug("Failed to prefetch job %s", self.jobStoreID, exc_info=True)
+
+    def get(self):
+        """Waits for the successor to be loaded.
+
+        :return: the jobGraph and the pickled job of the successor, or (None, None) if it
+                 could not be loaded
+        :rtype: tuple(toil.jobGraph.JobGraph,bytes)
+        """
+        self._thread.join()
+        return self._jobGraph, self._pickledJob
+
+def chainableSuccessors(jobGraph, maxSuccessors, resources=None):
+    """Returns the successors in the next level of the jobGraph's stack if the
+    worker can run all of them itself, one after another, or None if they
+    must be returned to the leader. A single successor is left to
+    nextChainableJobGraph.
+
+    :param tuple resources: the (memory, cores, disk) the jobGraph was issued
+           with, if they differ from its requirements
+    """
+    if len(jobGraph.stack) == 0 or len(jobGraph.services) > 0 or jobGraph.checkpoint != None:
+        return None
+    jobNodes = jobGraph.stack[-1]
+    if len(jobNodes) < 2 or len(jobNodes) > maxSuccessors:
+        return None
+    memory, cores, disk = _resourceBound(jobGraph, resources)
+    for jobNode in jobNodes:
+        if (jobNode.memory > memory or jobNode.cores > cores or jobNode.disk > disk or
+                jobNode.preemptable != jobGraph.preemptable or jobNode.predecessorNumber > 1):
+            logger.debug("Successor %s does not fit into this worker, returning the successors "
+                         "to the leader", jobNode)
+            return None
+    return jobNodes
+
+def _writeLogFile(jobStore, jobGraph, logPath, logFileByteReportLimit):
+    """Copies the worker log, or as much of it as logFileByteReportLimit
+    allows, to a new log file of the jobGraph in the jobStore. The jobGraph
+    must be updated for the leader to find it.
+    """
+    jobGraph.logJobStoreFileID = jobStore.getEmptyFileStoreID(jobGraph.jobStoreID)
+    with jobStore.updateFileStream(jobGraph.logJobStoreFileID) as w:
+        with open(logPath, "r") as f:
+            if os.path.getsize(logPath) > logFileByteReportLimit !=0:
+                if logFileByteReportLimit > 0:
+                    f.seek(-logFileByteReportLimit, 2)  # seek to last tooBig bytes of file
+                elif logFileByteReportLimit < 0:
+                    f.seek(logFileByteReportLimit, 0)  # seek to first tooBig bytes of file
+            w.write(f.read().encode('utf-8')) # TODO load file using a buffer
+
+def _failSuccessor(jobStoreID, jobStore, config, logPath):
+    """Sets up a successor that failed while running in the worker of its
+    predecessor to be retried, as the worker of a failed job would. The
+    successor is left on its predecessor's stack, so the leader issues it.
+    """
+    jobGraph = jobStore.load(jobStoreID)
+    jobGraph.setupJobAfterFailure(config)
+    oldLogFile = jobGraph.logJobStoreFileID
+    if logPath is not None:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        _writeLogFile(jobStore, jobGraph, logPath, config.maxLogFileSize)
+        jobGraph.chainedJobs = [str(jobGraph)]
+    jobStore.update(jobGraph)
+    if oldLogFile is not None and oldLogFile != jobGraph.logJobStoreFileID:
+        jobStore.deleteFile(oldLogFile)
+
+def runSuccessorsInProcess(jobGraph, jobNodes, jobStore, config, localWorkerTempDir, blockFn,
+                           statsDict, listOfJobs, logPath=None):
+    """Runs the given successors of the jobGraph one after another in this
+    worker. Successors that finish without adding successors of their own are
+    deleted and dropped from the jobGraph's stack, so that the leader only sees
+    the update of the jobGraph. The others are left to the leader, as are
+    successors that fail, which are set up to be retried on their own, see
+    _failSuccessor.
+
+    :param str logPath: the worker log to copy to the log file of failed
+           successors, if the worker's output is redirected to one
+    :return: the updated jobGraph and the next block function
+    """
+    # The jobGraph must be in the job store before any of its successors
+    # change, so that a failure leaves them to the leader
+    blockFn()
+    if FileStore._terminateEvent.isSet():
+        raise RuntimeError("The termination flag is set")
+    finishedJobStoreIDs = set()
+    for jobNode in jobNodes:
+        successorJobGraph = jobStore.load(jobNode.jobStoreID)
+        if successorJobGraph.command is None:
+            continue
+        successorJob = Job._loadJob(successorJobGraph.command, jobStore,
+                                    pickledJob=successorJobGraph.pickledJob)
+        if successorJob.checkpoint:
+            continue
+        logger.debug("Running successor %s in this worker", successorJobGraph)
+        listOfJobs.append(str(successorJobGraph))
+        fileStore = FileStore.createFileStore(jobStore, successorJobGraph, localWorkerTempDir,
+                                              blockFn, caching=not config.disableCaching)
+        try:
+            with successorJob._executor(jobGraph=successorJobGraph,
+                                        stats=statsDict if (config.stats or
+                                                            config.rightSizeResources) else None,
+                                        fileStore=fileStore):
+                with fileStore.open(successorJob):
+                    successorJob._runner(jobGraph=successorJobGraph, jobStore=jobStore,
+                                         fileStore=fileStore)
+            # Wait for the update of the successor, so that its failure is not mistaken for
+            # that of the jobGraph or the next successor
+            fileStore._blockFn()
+            if FileStore._terminateEvent.isSet():
+                raise RuntimeError("The termination flag is set")
+        except:
+            traceback.print_exc()
+            logger.error("Successor %s failed in this worker, leaving it to the leader",
+                         successorJobGraph)
+            # All the updates have finished, the jobGraph and the other successors are intact
+            FileStore._terminateEvent.clear()
+            blockFn = lambda : True
+            _failSuccessor(successorJobGraph.jobStoreID, jobStore, config, logPath)
+            continue
+        blockFn = fileStore._blockFn
+        statsDict.workers.logsToMaster += fileStore.loggingMessages
+        if len(successorJobGraph.stack) == 0 and len(successorJobGraph.services) == 0:
+            finishedJobStoreIDs.add(successorJobGraph.jobStoreID)
+    if not finishedJobStoreIDs:
+        return jobGraph, blockFn
+
+    # Clone the jobGraph, as an earlier update of it may still be in progress
+    jobGraph = copy.deepcopy(jobGraph)
+    jobGraph.stack[-1] = [jobNode for jobNode in jobGraph.stack[-1]
+                          if jobNode.jobStoreID not in finishedJobStoreIDs]
+    if len(jobGraph.stack[-1]) == 0:
+        jobGraph.stack.pop()
+    # Delete the finished successors once they and the jobGraph have been updated
+    fileStore = FileStore.createFileStore(jobStore, jobGraph, localWorkerTempDir, blockFn,
+                                          caching=not config.disableCaching)
+    fileStore.jobsToDelete.update(finishedJobStoreIDs)
+    fileStore._updateJobWhenDone()
+    return copy.deepcopy(jobGraph), fileStore._blockFn
+
+def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=True,
+                 resources=None):
     """
     Worker process script, runs a job. 
     
@@ -115,6 +319,8 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
     :param str jobStoreLocator: Specifies the job store to use
     :param str jobStoreID: The job store ID of the job to be run
     :param bool redirectOutputToLogFile: Redirect standard out and standard error to a log file
+    :param tuple resources: the (memory, cores, disk) the leader issued the job with, if they
+           differ from its requirements. They bound the jobs that may be chained to it.
     """
     logging.basicConfig()
     setLogLevel(config.logLevel)
@@ -251,9 +457,18 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
         #have been left if the job is being retried after a job failure.
         oldLogFile = jobGraph.logJobStoreFileID
         if oldLogFile != None:
+            # A job that failed in the worker of its predecessor, see runSuccessorsInProcess,
+            # is issued by the leader even if it has no retries left, unlike other failed jobs
+            exhausted = jobGraph.command is not None and jobGraph.remainingRetryCount == 0
+            if exhausted:
+                with jobGraph.getLogFileHandle(jobStore) as logFileStream:
+                    logger.error("Log of the failed job:\n%s",
+                                 logFileStream.read().decode('utf-8', 'replace'))
             jobGraph.logJobStoreFileID = None
             jobStore.update(jobGraph) #Update first, before deleting any files
             jobStore.deleteFile(oldLogFile)
+            if exhausted:
+                raise RuntimeError("Job %s failed before and has no retries left" % jobGraph)
 
         ##########################################
         # If a checkpoint exists, restart from the checkpoint
@@ -283,10 +498,14 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
         #Setup the stats, if requested
         ##########################################
         
-        if config.stats:
+        # The leader right-sizes jobs from the stats of previous jobs
+        recordStats = config.stats or config.rightSizeResources
+        if recordStats:
             startClock = getTotalCpuTime()
 
         startTime = time.time()
+        # The pickled job of the jobGraph about to run, if it was prefetched
+        pickledJob = None
         while True:
             ##########################################
             #Run the jobGraph, if there is one
@@ -296,16 +515,23 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
                 assert jobGraph.command.startswith( "_toil " )
                 logger.debug("Got a command to run: %s" % jobGraph.command)
                 #Load the job
-                job = Job._loadJob(jobGraph.command, jobStore)
+                job = Job._loadJob(jobGraph.command, jobStore,
+                                   pickledJob=pickledJob or jobGraph.pickledJob)
+                pickledJob = None
                 # If it is a checkpoint job, save the command
                 if job.checkpoint:
                     jobGraph.checkpoint = jobGraph.command
 
+                # Load the successor that may be chained while the job runs
+                prefetchedJob = None
+                if config.prefetchChainedJobs and not config.disableChaining:
+                    prefetchedJob = PrefetchedJob.start(jobGraph, jobStore, resources)
+
                 # Create a fileStore object for the job
                 fileStore = FileStore.createFileStore(jobStore, jobGraph, localWorkerTempDir, blockFn,
                                                       caching=not config.disableCaching)
                 with job._executor(jobGraph=jobGraph,
-                                   stats=statsDict if config.stats else None,
+                                   stats=statsDict if recordStats else None,
                                    fileStore=fileStore):
                     with fileStore.open(job):
                         # Get the next block function and list that will contain any messages
@@ -326,13 +552,28 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
             if FileStore._terminateEvent.isSet():
                 raise RuntimeError("The termination flag is set")
 
+            ##########################################
+            #Run a level of successors within the worker, if they all fit
+            ##########################################
+            if not config.disableChaining and config.maxChainedSuccessors > 1:
+                jobNodes = chainableSuccessors(jobGraph, config.maxChainedSuccessors,
+                                               resources)
+                if jobNodes is not None:
+                    jobGraph, blockFn = runSuccessorsInProcess(
+                        jobGraph, jobNodes, jobStore, config, localWorkerTempDir, blockFn,
+                        statsDict, listOfJobs,
+                        logPath=tempWorkerLogPath if redirectOutputToLogFile else None)
+
             ##########################################
             #Establish if we can run another jobGraph within the worker
             ##########################################
-            successorJobGraph = nextChainableJobGraph(jobGraph, jobStore)
+            successorJobGraph = nextChainableJobGraph(jobGraph, jobStore, prefetchedJob,
+                                                      resources)
             if successorJobGraph is None or config.disableChaining:
                 # Can't chain any more jobs.
                 break
+            if prefetchedJob is not None and prefetchedJob.jobStoreID == successorJobGraph.jobStoreID:
+                pickledJob = prefetchedJob.get()[1]
 
             ##########################################
             #We have a single successor job that is not a checkpoint job.
@@ -354,13 +595,15 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
 
             #Transplant the command and stack to the current jobGraph
             jobGraph.command = successorJobGraph.command
+            jobGraph.pickledJob = successorJobGraph.pickledJob
             jobGraph.stack += successorJobGraph.stack
             # include some attributes for better identification of chained jobs in
             # logging output
             jobGraph.unitName = successorJobGraph.unitName
             jobGraph.jobName = successorJobGraph.jobName
-            assert jobGraph.memory >= successorJobGraph.memory
-            assert jobGraph.cores >= successorJobGraph.cores
+            memory, cores, _ = _resourceBound(jobGraph, resources)
+            assert memory >= successorJobGraph.memory
+            assert cores >= successorJobGraph.cores
             
             #Build a fileStore to update the job
             fileStore = FileStore.createFileStore(jobStore, jobGraph, localWorkerTempDir, blockFn,
@@ -384,7 +627,7 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
         ##########################################
         #Finish up the stats
         ##########################################
-        if config.stats:
+        if recordStats:
             totalCPUTime, totalMemoryUsage = getTotalCpuTimeAndMemoryUsage()
             statsDict.workers.time = str(time.time() - startTime)
             statsDict.workers.clock = str(totalCPUTime - startClock)
@@ -424,6 +667,10 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
     #Cleanup
     ##########################################
 
+    # Warm workers run more jobs in this process
+    Promise.fulfilledValues.clear()
+    Promise.records.clear()
+
     # Close the worker logging
     # Flush at the Python level
     sys.stdout.flush()
@@ -452,16 +699,8 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
 
     #Copy back the log file to the global dir, if needed
     if workerFailed:
-        jobGraph.logJobStoreFileID = jobStore.getEmptyFileStoreID(jobGraph.jobStoreID)
+        _writeLogFile(jobStore, jobGraph, tempWorkerLogPath, logFileByteReportLimit)
         jobGraph.chainedJobs = listOfJobs
-        with jobStore.updateFileStream(jobGraph.logJobStoreFileID) as w:
-            with open(tempWorkerLogPath, "r") as f:
-                if os.path.getsize(tempWorkerLogPath) > logFileByteReportLimit !=0:
-                    if logFileByteReportLimit > 0:
-                        f.seek(-logFileByteReportLimit, 2)  # seek to last tooBig bytes of file
-                    elif logFileByteReportLimit < 0:
-                        f.seek(logFileByteReportLimit, 0)  # seek to first tooBig bytes of file
-                w.write(f.read().encode('utf-8')) # TODO load file using a buffer
         jobStore.update(jobGraph)
 
     elif debugging and redirectOutputToLogFile:  # write log messages
@@ -475,7 +714,7 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
         statsDict.logs.names = listOfJobs
         statsDict.logs.messages = logMessages
 
-    if (debugging or config.stats or statsDict.workers.logsToMaster) and not workerFailed:  # We have stats/logging to report back
+    if (debugging or config.stats or config.rightSizeResources or statsDict.workers.logsToMaster) and not workerFailed:  # We have stats/logging to report back
         jobStore.writeStatsAndLogging(json.dumps(statsDict, ensure_ascii=True))
 
     #Remove the temp dir
@@ -488,14 +727,50 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
         # We can now safely get rid of the jobGraph
         jobStore.delete(jobGraph.jobStoreID)
 
+def parseArguments(argv):
+    """
+    Parses the arguments of a worker command of the form '_toil_worker
+    [--resources=memory,cores,disk] jobName jobStoreLocator jobStoreID [jobName jobStoreID ...]'.
+    The leader issues several jobs in one command to run them in one worker when it bundles
+    jobs, and passes the resources it issued them with when it right-sizes jobs.
+
+    :return: the job store locator, a list of (jobName, jobStoreID) tuples and the
+             (memory, cores, disk) the jobs were issued with or None
+    :rtype: tuple(str,list,tuple)
+    """
+    resources = None
+    if argv[1].startswith('--resources='):
+        memory, cores, disk = argv[1][len('--resources='):].split(',')
+        resources = (int(memory), float(cores), int(disk))
+        argv = argv[:1] + argv[2:]
+    jobStoreLocator = argv[2]
+    jobs = [(argv[1], argv[3])] + list(zip(argv[4::2], argv[5::2]))
+    return jobStoreLocator, jobs, resources
+
+def runJobs(jobStore, config, jobs, redirectOutputToLogFile=True, resources=None):
+    """
+    Runs the given jobs one after another, stopping at the first that fails. The jobs that were
+    not run are left untouched in the job store, so the leader issues them again.
+
+    :param list jobs: (jobName, jobStoreID) tuples, see :func:`parseArguments`
+    :param tuple resources: the (memory, cores, disk) the jobs were issued with, see
+           :func:`parseArguments`
+    """
+    for i, (jobName, jobStoreID) in enumerate(jobs):
+        workerScript(jobStore, config, jobName, jobStoreID,
+                     redirectOutputToLogFile=redirectOutputToLogFile, resources=resources)
+        if FileStore._terminateEvent.isSet():
+            if i + 1 < len(jobs):
+                logger.warn("Not running the remaining %i jobs of the bundle after a failed job",
+                            len(jobs) - i - 1)
+            break
+
 def main(argv=None):
     if argv is None:
         argv = sys.argv
 
     # Parse input args
-    jobName = argv[1]
-    jobStoreLocator = argv[2]
-    jobStoreID = argv[3]
+    jobStoreLocator, jobs, resources = parseArguments(argv)
 
     ##########################################
     #Load the jobStore/config file
@@ -515,4 +790,4 @@ def main(argv=None):
     config = jobStore.config
 
     # Call the worker
-    workerScript(jobStore, config, jobName, jobStoreID)
+    runJobs(jobStore, config, jobs, resources=resources)